@@ -0,0 +1,197 @@
+"""Concurrent connection load test for the gunicorn serving modes.
+
+For each worker class, starts gunicorn with ``gunicorn.conf.py``, opens
+``--connections`` server-sent event streams to the market data endpoint and
+holds them, while a probe client times a short request on the side. Reports
+how many streams each mode established and what the held streams did to
+ordinary request latency.
+
+    python benchmarks/connection_load.py --connections 500
+    python benchmarks/connection_load.py --modes sync gevent --workers 2 --hold 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+STREAM_PATH = '/api/market-data/ESZ6/stream?heartbeat=1'
+PROBE_PATH = '/api/market-data/contracts/ESZ6'
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, workers, threads, port, data_dir):
+    # gunicorn silently turns sync workers into gthread when threads > 1
+    threads = threads if mode == 'gthread' else 1
+    env = dict(os.environ, WORKER_CLASS=mode, WEB_CONCURRENCY=str(workers), THREADS=str(threads),
+               BIND=f'127.0.0.1:{port}', DATABASE_URL=f"sqlite:///{os.path.join(data_dir, 'load.db')}",
+               MARKET_DATA_DIR=os.path.join(data_dir, 'market_data'),
+               RESPONSE_CACHE_PATH=os.path.join(data_dir, 'response_cache.db'))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'src.main:app'],
+        cwd=ROOT_DIR, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({mode}) did not start')
+
+
+async def open_stream(port, timeout, established):
+    """Open one SSE stream; returns ``(writer, drain task)`` or ``(None, None)`` on failure"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None, None
+    try:
+        writer.write(f'GET {STREAM_PATH} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+
+        async def first_event():
+            status = await reader.readline()
+            if b' 200 ' not in status:
+                return False
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return False
+                if line.startswith(b'event: snapshot'):
+                    return True
+
+        if not await asyncio.wait_for(first_event(), timeout):
+            writer.close()
+            return None, None
+    except (OSError, asyncio.TimeoutError):
+        writer.close()
+        return None, None
+
+    latency = time.perf_counter() - started
+    established.append(latency)
+
+    async def drain():
+        # Keep reading heartbeats so the server never blocks on a full socket
+        try:
+            while await reader.read(4096):
+                pass
+        except OSError:
+            pass
+
+    return writer, asyncio.ensure_future(drain())
+
+
+async def probe(port, stop, latencies, errors, timeout):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(f'GET {PROBE_PATH} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            await asyncio.wait_for(reader.read(), timeout)
+            writer.close()
+            latencies.append(time.perf_counter() - started)
+        except (OSError, asyncio.TimeoutError):
+            errors.append(time.perf_counter() - started)
+        await asyncio.sleep(0.1)
+
+
+async def load(port, connections, hold, timeout, ramp):
+    established, probe_latencies, probe_errors = [], [], []
+    stop = asyncio.Event()
+    probe_task = asyncio.ensure_future(probe(port, stop, probe_latencies, probe_errors, timeout))
+
+    semaphore = asyncio.Semaphore(ramp)
+
+    async def limited():
+        async with semaphore:
+            return await open_stream(port, timeout, established)
+
+    opened = await asyncio.gather(*(limited() for _ in range(connections)))
+    await asyncio.sleep(hold)
+    stop.set()
+    await probe_task
+
+    for writer, reader_task in opened:
+        if writer is not None:
+            reader_task.cancel()
+            writer.close()
+
+    return {
+        'connections': connections,
+        'established': len(established),
+        'failed': connections - len(established),
+        'first_event_p50_ms': (percentile(established, 0.5) or 0) * 1000,
+        'first_event_p99_ms': (percentile(established, 0.99) or 0) * 1000,
+        'probe_requests': len(probe_latencies),
+        'probe_errors': len(probe_errors),
+        'probe_p50_ms': (percentile(probe_latencies, 0.5) or 0) * 1000,
+        'probe_p99_ms': (percentile(probe_latencies, 0.99) or 0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--connections', type=int, default=500, help='concurrent streams to open')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker in gthread mode')
+    parser.add_argument('--hold', type=float, default=5.0, help='seconds to hold the streams open')
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds to wait for a stream or probe')
+    parser.add_argument('--ramp', type=int, default=100, help='streams being opened at once')
+    args = parser.parse_args()
+
+    # Each stream needs a descriptor on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    results = {}
+    for mode in args.modes:
+        port = free_port()
+        data_dir = tempfile.mkdtemp(prefix=f'load-{mode}-')
+        server = start_server(mode, args.workers, args.threads, port, data_dir)
+        try:
+            results[mode] = asyncio.run(load(port, args.connections, args.hold, args.timeout, args.ramp))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        result = results[mode]
+        print(f"{mode:<8} streams {result['established']:>6}/{result['connections']:<6} "
+              f"first event p50 {result['first_event_p50_ms']:>8.1f} ms  "
+              f"probe p50 {result['probe_p50_ms']:>8.1f} ms  p99 {result['probe_p99_ms']:>8.1f} ms  "
+              f"probe errors {result['probe_errors']}")
+
+    results_dir = os.path.join(BENCH_DIR, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"connections-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w') as handle:
+        json.dump({'options': vars(args), 'results': results}, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
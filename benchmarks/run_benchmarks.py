@@ -0,0 +1,213 @@
+"""API benchmark suite.
+
+Starts the Flask app from ``src/main.py`` on a local port against a freshly
+seeded SQLite database, with stub Tradovate and TopStep servers standing in
+for the brokers, then measures throughput and latency percentiles for each
+scenario.
+
+    python benchmarks/run_benchmarks.py                  # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # record a new baseline
+    python benchmarks/run_benchmarks.py --only trading --requests 500
+
+Results are written to ``benchmarks/results/``. A scenario is flagged as a
+regression when its p50 or p99 latency grows, or its throughput drops, by
+more than ``--threshold`` relative to the baseline; the exit status is 1 if
+any scenario regressed.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stub_brokers import StubBroker, tradovate_routes, topstep_routes  # noqa: E402
+from synthetic_data import generate, SYNTHETIC_PASSWORD  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def seed_database(app, users=20, orders_per_account=200):
+    """Seed synthetic data and pick a user with both Tradovate and TopStep accounts"""
+    from src.models.user import BrokerAccount
+
+    generate(app, users=users, accounts_per_user=(2, 3), orders_per_account=orders_per_account,
+             distribution='constant')
+
+    with app.app_context():
+        accounts = BrokerAccount.query.order_by(BrokerAccount.id).all()
+        by_user = {}
+        for account in accounts:
+            by_user.setdefault(account.user_id, {}).setdefault(account.broker_type, []).append(account.id)
+        for user_id, account_ids in by_user.items():
+            if 'tradovate' in account_ids and 'topstep' in account_ids:
+                return user_id, f'user{user_id}@synthetic.example', account_ids
+    raise RuntimeError('Seeded data has no user with accounts at both brokers')
+
+
+def build_scenarios(user_id, email, account_ids):
+    tradovate_id = account_ids['tradovate'][0]
+    topstep_id = account_ids['topstep'][0]
+    order = {'user_id': user_id, 'broker_account_id': tradovate_id, 'symbol': 'ESZ6', 'side': 'buy',
+             'quantity': 1, 'order_type': 'limit', 'price': 4000.25}
+    return [
+        ('auth.login', 'POST', '/api/auth/login', {'email': email, 'password': SYNTHETIC_PASSWORD}),
+        ('trading.positions', 'GET', f'/api/trading/positions?user_id={user_id}', None),
+        ('trading.orders', 'GET', f'/api/trading/orders?user_id={user_id}', None),
+        ('trading.trades', 'GET', f'/api/trading/trades?user_id={user_id}', None),
+        ('brokers.accounts', 'GET', f'/api/brokers/accounts?user_id={user_id}', None),
+        ('brokers.connect', 'POST', '/api/brokers/connect',
+         {'user_id': user_id, 'broker_type': 'topstep', 'credentials': {'api_token': 'bench-token'}}),
+        ('brokers.sync.tradovate', 'POST', f'/api/brokers/accounts/{tradovate_id}/sync', None),
+        ('brokers.sync.topstep', 'POST', f'/api/brokers/accounts/{topstep_id}/sync', None),
+        ('trading.place_order', 'POST', '/api/trading/orders', order),
+    ]
+
+
+def run_scenario(base_url, method, path, body, total, concurrency, warmup=5):
+    sessions = threading.local()
+
+    def call():
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        started = time.perf_counter()
+        response = session.request(method, base_url + path, json=body, timeout=60)
+        return time.perf_counter() - started, response.status_code < 400
+
+    for _ in range(warmup):
+        call()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: call(), range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': total / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return ``(scenario, reason)`` pairs for results that regressed"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, f'{metric} {previous[metric]:.2f} -> {current[metric]:.2f}'))
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append((name, 'throughput_rps {:.1f} -> {:.1f}'.format(
+                previous['throughput_rps'], current['throughput_rps'])))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--login-requests', type=int, default=40, help='requests for the bcrypt-bound login scenario')
+    parser.add_argument('--users', type=int, default=20, help='synthetic users to seed')
+    parser.add_argument('--orders-per-account', type=int, default=200, help='synthetic orders per account')
+    parser.add_argument('--broker-delay-ms', type=float, default=0.0, help='latency added by the stub brokers')
+    parser.add_argument('--only', action='append', help='run scenarios whose name contains this text')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'results', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    args = parser.parse_args()
+
+    tradovate = StubBroker(tradovate_routes(), delay=args.broker_delay_ms / 1000).start()
+    topstep = StubBroker(topstep_routes(), delay=args.broker_delay_ms / 1000).start()
+
+    database_dir = tempfile.mkdtemp(prefix='bench-db-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(database_dir, 'bench.db')}"
+    os.environ['RESPONSE_CACHE_PATH'] = os.path.join(database_dir, 'response_cache.db')
+    os.environ['CONTRACT_SNAPSHOT_PATH'] = os.path.join(database_dir, 'contracts.json')
+    os.environ['TRADOVATE_DEMO_URL'] = tradovate.base_url
+    os.environ['TOPSTEP_BASE_URL'] = topstep.base_url
+    # Measure our own overhead, not the production broker rate limits
+    os.environ.setdefault('BROKER_RATE_LIMITS', 'off')
+
+    from werkzeug.serving import make_server
+    from src.main import app
+
+    user_id, email, account_ids = seed_database(app, args.users, args.orders_per_account)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    try:
+        for name, method, path, body in build_scenarios(user_id, email, account_ids):
+            if args.only and not any(text in name for text in args.only):
+                continue
+            total = args.login_requests if name == 'auth.login' else args.requests
+            results[name] = run_scenario(base_url, method, path, body, total, args.concurrency)
+            result = results[name]
+            print(f"{name:<26} {result['throughput_rps']:>9.1f} rps  p50 {result['p50_ms']:>8.2f} ms  "
+                  f"p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}")
+    finally:
+        server.shutdown()
+        tradovate.stop()
+        topstep.stop()
+
+    run = {
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'options': {'requests': args.requests, 'concurrency': args.concurrency,
+                    'users': args.users, 'orders_per_account': args.orders_per_account,
+                    'broker_delay_ms': args.broker_delay_ms},
+        'results': results,
+    }
+    results_dir = os.path.join(BENCH_DIR, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"run-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"), 'w') as handle:
+        json.dump(run, handle, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as handle:
+            json.dump(run, handle, indent=2)
+        print(f'Saved baseline to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found; run with --save-baseline to record one')
+        return 0
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)['results']
+    regressions = compare(results, baseline, args.threshold)
+    for name, reason in regressions:
+        print(f'REGRESSION {name}: {reason}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Cold-start benchmark for the Flask app.
+
+Imports ``src.main`` in fresh interpreters, the same work a gunicorn worker
+does on boot or recycle, and reports the wall time and the app's own
+``STARTUP_SECONDS`` measurement.
+
+    python benchmarks/startup_time.py --runs 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+PROBE = 'import json, src.main as m; print(json.dumps({"app": m.app.config["STARTUP_SECONDS"]}))'
+
+
+def measure(runs, env):
+    wall, app = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT_DIR, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        wall.append(time.perf_counter() - started)
+        app.append(json.loads(output.strip().splitlines()[-1])['app'])
+    return wall, app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='startup-'), 'app.db')}")
+
+    # One unmeasured run warms the filesystem cache and bytecode
+    measure(1, env)
+    wall, app = measure(args.runs, env)
+
+    print(f'process wall time  median {statistics.median(wall) * 1000:8.1f} ms  '
+          f'min {min(wall) * 1000:8.1f} ms')
+    print(f'app STARTUP_SECONDS median {statistics.median(app) * 1000:8.1f} ms  '
+          f'min {min(app) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Local stand-ins for the Tradovate and TopStep REST APIs.
+
+Each stub answers the endpoints the services call with canned JSON after an
+optional fixed delay, so benchmarks exercise the real request path without
+depending on the network or broker sandboxes.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+TRADOVATE_ACCOUNTS = [
+    {'id': 1001 + i, 'name': f'TV-DEMO-{i}', 'cashBalance': 50000.0, 'netLiquidationValue': 50250.0,
+     'marginUsed': 1200.0, 'marginAvailable': 48800.0}
+    for i in range(3)
+]
+
+TOPSTEP_ACCOUNTS = [
+    {'id': 2001 + i, 'name': f'TS-EVAL-{i}', 'balance': 50000.0, 'equity': 49875.0,
+     'margin_used': 800.0, 'margin_available': 49200.0}
+    for i in range(3)
+]
+
+
+def _positions(count, tradovate):
+    positions = []
+    for i in range(count):
+        symbol = ('ESZ6', 'NQZ6', 'CLZ6', 'GCZ6')[i % 4]
+        qty = (i % 3) + 1
+        # Spread across the login's accounts like the real list endpoints do
+        if tradovate:
+            positions.append({'accountId': TRADOVATE_ACCOUNTS[i % 3]['id'], 'contractName': symbol,
+                              'netPos': qty if i % 2 else -qty, 'price': 4000.25 + i,
+                              'unrealizedPnL': 12.5 * i})
+        else:
+            positions.append({'account_id': TOPSTEP_ACCOUNTS[i % 3]['id'], 'symbol': symbol,
+                              'quantity': qty if i % 2 else -qty, 'entry_price': 4000.25 + i,
+                              'current_price': 4001.0 + i, 'unrealized_pnl': 12.5 * i})
+    return positions
+
+
+def _orders(count, tradovate):
+    orders = []
+    for i in range(count):
+        if tradovate:
+            orders.append({'id': 5000 + i, 'accountId': TRADOVATE_ACCOUNTS[i % 3]['id'], 'contractName': 'ESZ6',
+                           'action': 'Buy', 'qty': 1, 'price': 3990.0 + i, 'orderStatus': 'Working'})
+        else:
+            orders.append({'id': 6000 + i, 'account_id': TOPSTEP_ACCOUNTS[i % 3]['id'], 'symbol': 'ESZ6',
+                           'side': 'buy', 'quantity': 1, 'price': 3990.0 + i, 'status': 'working'})
+    return orders
+
+
+def tradovate_routes(positions=10, orders=5):
+    return {
+        ('POST', '/v1/auth/accesstokenrequest'): lambda body: {
+            'accessToken': 'stub-token', 'mdAccessToken': 'stub-md-token',
+            'expirationTime': '2099-01-01T00:00:00Z', 'userId': 1, 'hasLive': False
+        },
+        ('GET', '/v1/user/me'): lambda body: {'id': 1, 'name': 'stub'},
+        ('GET', '/v1/account/list'): lambda body: TRADOVATE_ACCOUNTS,
+        ('GET', '/v1/position/list'): lambda body: _positions(positions, True),
+        ('GET', '/v1/order/list'): lambda body: _orders(orders, True),
+        ('POST', '/v1/order/placeorder'): lambda body: {'orderId': int(time.time() * 1000) % 10 ** 9},
+        ('POST', '/v1/order/modifyorder'): lambda body: {'commandId': 1},
+        ('POST', '/v1/order/cancelorder'): lambda body: {'commandId': 1},
+    }
+
+
+def topstep_routes(positions=10, orders=5):
+    return {
+        ('GET', '/v1/user/profile'): lambda body: {'id': 1, 'name': 'stub'},
+        ('GET', '/v1/accounts'): lambda body: TOPSTEP_ACCOUNTS,
+        ('GET', '/v1/positions'): lambda body: _positions(positions, False),
+        ('GET', '/v1/orders'): lambda body: _orders(orders, False),
+        ('POST', '/v1/orders'): lambda body: {'id': int(time.time() * 1000) % 10 ** 9, 'status': 'pending'},
+    }
+
+
+class StubBroker:
+    """Threaded HTTP server serving a route table on an ephemeral port"""
+
+    def __init__(self, routes, delay=0.0, host='127.0.0.1', port=0):
+        self.routes = routes
+        self.delay = delay
+        self.request_count = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                path = urlparse(self.path).path
+                route = stub.routes.get((method, path))
+                if route is None and method in ('PUT', 'DELETE'):
+                    # /v1/orders/<id> style resources
+                    route = lambda body: {'status': 'ok'}
+                stub.request_count += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if route is None:
+                    payload, status = {'error': 'not found'}, 404
+                else:
+                    payload, status = route(body), 200
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,294 @@
+"""Synthetic data generator for scale testing.
+
+Fills the database with users, broker accounts, positions, orders and the
+trades that fill them, using bulk inserts in fixed-size chunks. Output is
+deterministic for a given ``--seed``.
+
+    python benchmarks/synthetic_data.py --users 5000 --orders-per-account 400
+    DATABASE_URL=sqlite:////tmp/scale.db python benchmarks/synthetic_data.py --distribution pareto
+
+Every generated user has the password ``SYNTHETIC_PASSWORD`` and every
+account stores the same (encrypted) stub credentials, so the data works
+with the benchmark suite's stub brokers.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+SYNTHETIC_PASSWORD = 'Synthetic0Passw0rd'
+
+# symbol -> (reference price, tick size)
+SYMBOLS = {
+    'ESZ6': (5000.0, 0.25),
+    'NQZ6': (18000.0, 0.25),
+    'MESZ6': (5000.0, 0.25),
+    'MNQZ6': (18000.0, 0.25),
+    'RTYZ6': (2100.0, 0.1),
+    'YMZ6': (39000.0, 1.0),
+    'CLZ6': (75.0, 0.01),
+    'GCZ6': (2400.0, 0.1),
+    'SIZ6': (30.0, 0.005),
+    '6EZ6': (1.08, 0.00005),
+}
+
+BROKER_CREDENTIALS = {
+    'tradovate': {'username': 'synthetic', 'password': 'synthetic', 'secret': 'synthetic'},
+    'topstep': {'api_token': 'synthetic-token'},
+}
+
+ORDER_TYPES = ('market', 'limit', 'stop')
+ORDER_TYPE_WEIGHTS = (0.5, 0.4, 0.1)
+
+
+class ChunkedInserter:
+    """Buffers rows per table and inserts them with one executemany per chunk"""
+
+    def __init__(self, session, chunk_size):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        rows = self.buffers.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        """Insert buffered rows for ``table`` and every table first seen before it.
+
+        Tables are first seen in parent-to-child order, so flushing the
+        earlier buffers too keeps foreign keys satisfied.
+        """
+        tables = list(self.buffers)
+        if table is not None:
+            tables = tables[:tables.index(table) + 1]
+        for name in tables:
+            rows = self.buffers.get(name)
+            if rows:
+                self.session.execute(name.insert(), rows)
+                self.counts[name.name] = self.counts.get(name.name, 0) + len(rows)
+                self.buffers[name] = []
+
+
+def activity_counts(rng, size, mean, distribution):
+    """Per-account row counts with the requested mean.
+
+    ``uniform`` spreads activity evenly; ``pareto`` gives a heavy tail where
+    a few accounts generate most of the orders, as real prop-firm data does.
+    """
+    if size == 0:
+        return np.empty(0, dtype=np.int64)
+    if distribution == 'uniform':
+        return rng.integers(0, 2 * mean + 1, size=size)
+    if distribution == 'pareto':
+        alpha = 1.5
+        weights = rng.pareto(alpha, size=size) + 1
+        return np.floor(weights / weights.mean() * mean).astype(np.int64)
+    if distribution == 'constant':
+        return np.full(size, mean, dtype=np.int64)
+    raise ValueError(f'Unknown distribution: {distribution}')
+
+
+def _next_id(session, model):
+    from sqlalchemy import func
+    return (session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def generate(app, users=1000, accounts_per_user=(1, 3), positions_per_account=4,
+             orders_per_account=100, fill_ratio=0.7, days=365, distribution='pareto',
+             chunk_size=10000, seed=42, verbose=False):
+    """Generate a consistent data set and return the row counts per table"""
+    from src.models.user import db, User, BrokerAccount, Position, Order, Trade
+    from src.models.schema import init_schema
+    from src.utils.encryption import encrypt_data
+
+    rng = np.random.default_rng(seed)
+    symbols = list(SYMBOLS)
+    now = datetime.utcnow().replace(microsecond=0)
+    history_seconds = days * 86400
+    started = time.perf_counter()
+
+    with app.app_context():
+        init_schema(engine=db.engine)
+        session = db.session
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            # Trade durability for speed while bulk loading
+            session.execute(db.text('PRAGMA synchronous=OFF'))
+            session.execute(db.text('PRAGMA journal_mode=WAL'))
+
+        inserter = ChunkedInserter(session, chunk_size)
+
+        # bcrypt is deliberately slow; hash once and share it
+        probe = User(email='', full_name='')
+        probe.set_password(SYNTHETIC_PASSWORD)
+        password_hash = probe.password_hash
+        credentials = {broker: encrypt_data(json.dumps(creds)) for broker, creds in BROKER_CREDENTIALS.items()}
+
+        user_id = _next_id(session, User)
+        account_id = _next_id(session, BrokerAccount)
+        position_id = _next_id(session, Position)
+        order_id = _next_id(session, Order)
+        trade_id = _next_id(session, Trade)
+
+        user_ids = []
+        for _ in range(users):
+            created_at = now - timedelta(seconds=int(rng.integers(0, history_seconds)))
+            inserter.add(User.__table__, {
+                'id': user_id, 'email': f'user{user_id}@synthetic.example', 'password_hash': password_hash,
+                'full_name': f'Synthetic User {user_id}', 'created_at': created_at, 'updated_at': created_at,
+                'is_active': True, 'email_verified': True
+            })
+            user_ids.append(user_id)
+            user_id += 1
+        inserter.flush(User.__table__)
+
+        low, high = accounts_per_user
+        account_counts = rng.integers(low, high + 1, size=len(user_ids))
+        accounts = []
+        for owner, count in zip(user_ids, account_counts.tolist()):
+            for _ in range(count):
+                broker_type = 'tradovate' if rng.random() < 0.5 else 'topstep'
+                balance = float(rng.choice([25000, 50000, 100000, 150000]))
+                equity = round(balance * (1 + rng.normal(0, 0.02)), 2)
+                margin_used = round(float(rng.uniform(0, 0.3)) * balance, 2)
+                inserter.add(BrokerAccount.__table__, {
+                    'id': account_id, 'user_id': owner, 'broker_type': broker_type,
+                    'broker_account_id': f'{broker_type}-{account_id}',
+                    'api_credentials': credentials[broker_type],
+                    'account_name': f'{broker_type.title()} {account_id}', 'account_status': 'active',
+                    'balance': balance, 'equity': equity, 'margin_used': margin_used,
+                    'margin_available': round(equity - margin_used, 2),
+                    'last_sync': now, 'created_at': now, 'updated_at': now
+                })
+                accounts.append(account_id)
+                account_id += 1
+        inserter.flush(BrokerAccount.__table__)
+
+        position_counts = np.minimum(rng.poisson(positions_per_account, size=len(accounts)), len(symbols))
+        order_counts = activity_counts(rng, len(accounts), orders_per_account, distribution)
+
+        for index, account in enumerate(accounts):
+            # Open positions, at most one per symbol
+            for symbol in rng.choice(symbols, size=int(position_counts[index]), replace=False).tolist():
+                reference, tick = SYMBOLS[symbol]
+                entry = round(reference * (1 + rng.normal(0, 0.01)) / tick) * tick
+                current = round(entry * (1 + rng.normal(0, 0.003)) / tick) * tick
+                quantity = int(rng.integers(1, 6))
+                side = 'long' if rng.random() < 0.55 else 'short'
+                sign = 1 if side == 'long' else -1
+                opened_at = now - timedelta(seconds=int(rng.integers(60, 7 * 86400)))
+                inserter.add(Position.__table__, {
+                    'id': position_id, 'broker_account_id': account, 'symbol': symbol, 'side': side,
+                    'quantity': quantity, 'entry_price': entry, 'current_price': current,
+                    'unrealized_pnl': round((current - entry) * quantity * sign, 2), 'realized_pnl': 0,
+                    'opened_at': opened_at, 'updated_at': now
+                })
+                position_id += 1
+
+            # Orders spread over the history window, filled ones with their trades
+            count = int(order_counts[index])
+            if not count:
+                continue
+            offsets = np.sort(rng.integers(0, history_seconds, size=count))[::-1]
+            order_symbols = rng.choice(symbols, size=count).tolist()
+            order_types = rng.choice(ORDER_TYPES, size=count, p=ORDER_TYPE_WEIGHTS).tolist()
+            quantities = rng.integers(1, 11, size=count).tolist()
+            sides = np.where(rng.random(count) < 0.5, 'buy', 'sell').tolist()
+            fills = (rng.random(count) < fill_ratio).tolist()
+            drift = rng.normal(0, 0.02, size=count).tolist()
+
+            for i in range(count):
+                symbol = order_symbols[i]
+                reference, tick = SYMBOLS[symbol]
+                price = round(reference * (1 + drift[i]) / tick) * tick
+                created_at = now - timedelta(seconds=int(offsets[i]))
+                order_type = order_types[i]
+                quantity = quantities[i]
+                if fills[i]:
+                    status, filled_quantity, filled_price = 'filled', quantity, price
+                else:
+                    status = 'cancelled' if offsets[i] > 86400 else 'pending'
+                    filled_quantity, filled_price = 0, None
+                inserter.add(Order.__table__, {
+                    'id': order_id, 'broker_account_id': account, 'broker_order_id': f'syn-{order_id}',
+                    'symbol': symbol, 'side': sides[i], 'order_type': order_type, 'quantity': quantity,
+                    'price': None if order_type == 'market' else price,
+                    'stop_price': price if order_type == 'stop' else None,
+                    'status': status, 'filled_quantity': filled_quantity, 'filled_price': filled_price,
+                    'created_at': created_at, 'updated_at': created_at
+                })
+
+                if fills[i]:
+                    # Split the fill into up to three partial executions
+                    remaining = quantity
+                    executed_at = created_at
+                    while remaining:
+                        part = int(rng.integers(1, remaining + 1)) if remaining > 1 and rng.random() < 0.3 else remaining
+                        executed_at += timedelta(milliseconds=int(rng.integers(5, 2000)))
+                        inserter.add(Trade.__table__, {
+                            'id': trade_id, 'broker_account_id': account, 'order_id': order_id,
+                            'symbol': symbol, 'side': sides[i], 'quantity': part, 'price': price,
+                            'commission': round(0.62 * part, 2), 'executed_at': executed_at,
+                            'created_at': executed_at
+                        })
+                        trade_id += 1
+                        remaining -= part
+                order_id += 1
+
+            if verbose and index and index % 1000 == 0:
+                print(f'  {index}/{len(accounts)} accounts, {time.perf_counter() - started:.1f}s')
+
+        inserter.flush()
+        session.commit()
+
+    counts = dict(inserter.counts)
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--min-accounts', type=int, default=1, help='broker accounts per user, lower bound')
+    parser.add_argument('--max-accounts', type=int, default=3, help='broker accounts per user, upper bound')
+    parser.add_argument('--positions-per-account', type=int, default=4, help='mean open positions per account')
+    parser.add_argument('--orders-per-account', type=int, default=100, help='mean orders per account')
+    parser.add_argument('--fill-ratio', type=float, default=0.7, help='share of orders that are filled')
+    parser.add_argument('--days', type=int, default=365, help='history window for orders and trades')
+    parser.add_argument('--distribution', choices=('pareto', 'uniform', 'constant'), default='pareto',
+                        help='how orders are spread across accounts')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per bulk insert')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from src.main import app
+
+    counts = generate(
+        app,
+        users=args.users,
+        accounts_per_user=(args.min_accounts, args.max_accounts),
+        positions_per_account=args.positions_per_account,
+        orders_per_account=args.orders_per_account,
+        fill_ratio=args.fill_ratio,
+        days=args.days,
+        distribution=args.distribution,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        verbose=True
+    )
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Gunicorn settings: ``gunicorn -c gunicorn.conf.py src.main:app``
+
+``WORKER_CLASS`` picks the serving mode:
+
+- ``sync`` (default): one request per worker process at a time.
+- ``gthread``: ``THREADS`` requests per worker, one OS thread each.
+- ``gevent``: an event loop per worker holding up to ``WORKER_CONNECTIONS``
+  connections. Sockets (including ``requests`` calls to brokers) are
+  monkeypatched to yield, so SSE streams and slow broker I/O share a few
+  processes. Requires the ``gevent`` package.
+
+Each worker keeps its own metrics. Set ``METRICS_DIR`` to a directory local
+to this host so every ``/metrics`` scrape reports all workers together.
+"""
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = os.environ.get('WORKER_CLASS', 'sync')
+threads = int(os.environ.get('THREADS', '8' if worker_class == 'gthread' else '1'))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '1000'))
+# Streaming responses stay open far longer than the sync default allows
+timeout = int(os.environ.get('WORKER_TIMEOUT', '30' if worker_class == 'sync' else '120'))
+keepalive = int(os.environ.get('KEEPALIVE', '5'))
+# Recycle workers periodically; cheap now that startup does no DDL
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', '0'))
+
+
+def on_starting(server):
+    """Create and migrate the schema once in the master, before any worker forks"""
+    from src.models.schema import init_schema
+
+    added = init_schema()
+    server.log.info('Schema ready; added: %s', ', '.join(added) or 'nothing')
+
+    from src.utils.metrics import METRICS_DIR, clear_snapshots
+    if METRICS_DIR:
+        clear_snapshots()
+
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters in the aggregated metrics"""
+    from src.utils.metrics import METRICS_DIR, mark_process_dead
+    if METRICS_DIR:
+        mark_process_dead(worker.pid)
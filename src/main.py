@@ -1,55 +1,166 @@
 import os
 import sys
+import time
 from datetime import timedelta
+
+_started = time.perf_counter()
+
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
+from flask_jwt_extended import JWTManager
 from src.models.user import db
+from src.models.schema import database_uri, init_schema
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.broker import broker_bp
 from src.routes.trading import trading_bp
+from src.routes.market_data import market_data_bp
+from src.routes.strategy import strategy_bp
+from src.routes.metrics import metrics_bp
+from src.routes.jobs import jobs_bp
+from src.utils.metrics import init_metrics, app_startup
+from src.utils.profiling import init_profiling
+from src.utils.response_cache import init_response_cache
+from src.utils.static_assets import init_static_assets
+from src.services.contract_catalog import init_contract_refresh
+
+
+def create_app():
+    """Build and configure the Flask app.
+
+    The schema is not touched here: run ``flask --app src.main init-db`` (or
+    let the gunicorn master do it) once per deploy, or set
+    ``AUTO_CREATE_SCHEMA=1`` for single-process development.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+
+    # JWT tokens issued by the auth blueprint
+    JWTManager(app)
+
+    # Enable CORS for all routes
+    CORS(app, origins="*")
+
+    # Request latency and DB query instrumentation
+    init_metrics(app)
+
+    # Opt-in per-request profiling (PROFILING_ENABLED=1)
+    init_profiling(app)
+
+    # Per-user response cache, invalidated by committed model changes
+    init_response_cache(app)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(broker_bp, url_prefix='/api/brokers')
+    app.register_blueprint(trading_bp, url_prefix='/api/trading')
+    app.register_blueprint(market_data_bp, url_prefix='/api/market-data')
+    app.register_blueprint(strategy_bp, url_prefix='/api/strategies')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(metrics_bp)
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    # Contract specs are refreshed by a queued job ahead of each roll
+    init_contract_refresh(app)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and columns"""
+        added = init_schema(engine=db.engine)
+        print(f"Schema ready; added: {', '.join(added) or 'nothing'}")
+
+    @app.cli.command('archive-history')
+    def archive_history_command():
+        """Move closed orders and trades past ARCHIVE_HORIZON_DAYS to the archive"""
+        from src.services.trade_archive import get_trade_archive
+        moved = get_trade_archive().archive()
+        print(f"Archived {moved['orders']} orders and {moved['trades']} trades")
+
+    @app.cli.command('prune-snapshots')
+    def prune_snapshots_command():
+        """Delete account snapshot rollups past SNAPSHOT_RETENTION_DAYS"""
+        from src.services.account_snapshots import prune_snapshots
+        deleted = prune_snapshots()
+        print('Pruned ' + (', '.join(f'{count} {resolution}' for resolution, count in deleted.items()) or 'nothing'))
+
+    @app.cli.command('jobs-worker')
+    def jobs_worker_command():
+        """Run queued background jobs in a process pool until interrupted"""
+        from src.services.job_queue import get_job_runner
+        runner = get_job_runner(app)
+        print(f'Running jobs with {runner.max_workers} worker processes')
+        try:
+            runner.run()
+        except KeyboardInterrupt:
+            pass
+
+    @app.cli.command('reencrypt-credentials')
+    def reencrypt_credentials_command():
+        """Queue re-encryption of stored credentials under ENCRYPTION_KEY (old key in PREVIOUS_ENCRYPTION_KEY)"""
+        from src.services.job_queue import PRIORITIES, enqueue
+        job, created = enqueue('reencrypt_credentials', priority=PRIORITIES['low'])
+        print(f"{'Queued' if created else 'Already queued as'} job {job.id}; a jobs worker runs it")
+
+    @app.cli.command('compact-journal')
+    def compact_journal_command():
+        """Drop and collapse old change journal entries (also runs automatically)"""
+        from src.models.journal import compact
+        removed = compact(db.engine)
+        print(f'Removed {removed or 0} journal entries')
+
+    if os.environ.get('AUTO_CREATE_SCHEMA') == '1':
+        with app.app_context():
+            init_schema(engine=db.engine)
+
+    # Revalue open positions from local ticks; enable in a single process only
+    if os.environ.get('MARK_TO_MARKET_ENABLED') == '1':
+        from src.services.market_data_store import get_tick_store
+        from src.services.mark_to_market import get_mark_to_market_engine
+        mark_to_market = get_mark_to_market_engine()
+        get_tick_store().subscribe(mark_to_market.on_tick)
+        mark_to_market.start(app)
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    # Run active strategies against local ticks; enable in a single process only
+    if os.environ.get('STRATEGY_RUNTIME_ENABLED') == '1':
+        from src.services.market_data_store import get_tick_store
+        from src.services.strategy_engine import get_strategy_runtime
+        strategy_runtime = get_strategy_runtime()
+        get_tick_store().subscribe(strategy_runtime.publish_tick)
+        strategy_runtime.start(app)
 
-# Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+    # Run background jobs inside this process (single-process setups only: each
+    # gunicorn worker would start its own runner and process pool). Otherwise run
+    # one `flask jobs-worker` process and set JOB_WORKER_EXTERNAL=1 here. With
+    # neither, connects run on a thread.
+    if os.environ.get('JOB_RUNNER_ENABLED') == '1':
+        from src.services.job_queue import get_job_runner
+        get_job_runner(app).start()
 
-# Enable CORS for all routes
-CORS(app, origins="*")
+    # SPA bundle served from an in-memory index built once here
+    init_static_assets(app)
 
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(user_bp, url_prefix='/api/user')
-app.register_blueprint(broker_bp, url_prefix='/api/brokers')
-app.register_blueprint(trading_bp, url_prefix='/api/trading')
+    return app
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
+app = create_app()
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+# Cold-start cost of this process, from first import to a ready app
+app.config['STARTUP_SECONDS'] = time.perf_counter() - _started
+app_startup.set(app.config['STARTUP_SECONDS'])
 
 
 if __name__ == '__main__':
+    with app.app_context():
+        init_schema(engine=db.engine)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models import journal
+from src.models.user import BrokerAccount
+
+# One committed row change. ``account_id`` and ``user_id`` are the broker
+# account and user the row belongs to, when it belongs to one; ``columns``
+# names the columns written, when only those were (None: any).
+ModelChange = namedtuple('ModelChange', 'table op id account_id user_id columns', defaults=(None,))
+
+PENDING_KEY = 'pending_model_changes'
+
+_listeners = []
+
+
+def subscribe(callback):
+    """Register ``callback(changes)``, called with a list of ``ModelChange`` after each commit"""
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _account_owner(session, account_id, owners):
+    if account_id not in owners:
+        # Usually an identity-map hit: syncs and orders load the account first
+        with session.no_autoflush:
+            account = session.get(BrokerAccount, account_id)
+        owners[account_id] = account.user_id if account is not None else None
+    return owners[account_id]
+
+
+def mark_changed(session, table, account_ids, op='update', columns=None):
+    """Record changes made outside the ORM unit of work (bulk UPDATEs, raw SQL).
+
+    They are journaled in the session's transaction and dispatched with
+    its other changes on commit. Pass ``columns`` when an update wrote only
+    those columns, so listeners can ignore changes they do not serve.
+    """
+    journal.record_bulk(session, table, account_ids, op)
+    if not _listeners:
+        return
+    pending = session.info.setdefault(PENDING_KEY, [])
+    owners = {}
+    for account_id in set(account_ids):
+        pending.append(ModelChange(table, op, None, account_id, _account_owner(session, account_id, owners),
+                                   frozenset(columns) if columns else None))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    if not _listeners:
+        return
+    pending = session.info.setdefault(PENDING_KEY, [])
+    owners = {}
+    for op, instances in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for instance in instances:
+            table = getattr(instance, '__tablename__', None)
+            if table is None or (op == 'update' and not session.is_modified(instance)):
+                continue
+            if isinstance(instance, BrokerAccount):
+                account_id, user_id = instance.id, instance.user_id
+            else:
+                account_id = getattr(instance, 'broker_account_id', None)
+                user_id = getattr(instance, 'user_id', None)
+                if user_id is None and account_id is not None:
+                    user_id = _account_owner(session, account_id, owners)
+            pending.append(ModelChange(table, op, getattr(instance, 'id', None), account_id, user_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    changes = session.info.pop(PENDING_KEY, None)
+    if not changes:
+        return
+    for callback in list(_listeners):
+        callback(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(PENDING_KEY, None)
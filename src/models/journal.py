@@ -0,0 +1,131 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from src.models.user import BrokerAccount, ChangeJournal, Order, Position, Trade
+
+JOURNALED = (Position, Order, Trade, BrokerAccount)
+JOURNALED_TABLES = frozenset(model.__tablename__ for model in JOURNALED)
+
+# Entries older than this are dropped behind a truncate marker
+RETENTION_HOURS = float(os.environ.get('JOURNAL_RETENTION_HOURS', '24'))
+# Entries older than this keep only the latest change per row
+COLLAPSE_SECONDS = float(os.environ.get('JOURNAL_COLLAPSE_SECONDS', '300'))
+# Compact after this many entries have been written by this process
+COMPACT_EVERY = int(os.environ.get('JOURNAL_COMPACT_EVERY', '5000'))
+
+LOCKED_KEY = 'change_journal_locked'
+
+_written = 0
+_written_lock = threading.Lock()
+_compacting = threading.Lock()
+
+
+def _write(session, entries):
+    """Insert journal rows on the session's connection, inside its transaction"""
+    if not entries:
+        return
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql' and not session.info.get(LOCKED_KEY):
+        # Serialise journal writers until commit so cursors commit in id order
+        connection.execute(text('LOCK TABLE change_journal IN SHARE ROW EXCLUSIVE MODE'))
+        session.info[LOCKED_KEY] = True
+    connection.execute(insert(ChangeJournal), entries)
+
+    global _written
+    with _written_lock:
+        _written += len(entries)
+        due = _written >= COMPACT_EVERY
+        if due:
+            _written = 0
+    if due:
+        engine = session.get_bind()
+        threading.Thread(target=compact, args=(engine,), name='journal-compact', daemon=True).start()
+
+
+def record_bulk(session, table, account_ids, op='update'):
+    """Journal changes made outside the unit of work as account-wide entries"""
+    if table not in JOURNALED_TABLES:
+        return
+    now = datetime.utcnow()
+    _write(session, [
+        {'table_name': table, 'op': op, 'row_id': None, 'broker_account_id': account_id, 'changed_at': now}
+        for account_id in set(account_ids)
+    ])
+
+
+@event.listens_for(Session, 'after_flush')
+def _journal_flush(session, flush_context):
+    now = datetime.utcnow()
+    entries = []
+    for op, instances in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for instance in instances:
+            if not isinstance(instance, JOURNALED):
+                continue
+            if op == 'update' and not session.is_modified(instance):
+                continue
+            account_id = instance.id if isinstance(instance, BrokerAccount) else instance.broker_account_id
+            entries.append({'table_name': instance.__tablename__, 'op': op, 'row_id': instance.id,
+                            'broker_account_id': account_id, 'changed_at': now})
+    _write(session, entries)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _release_lock_flag(session):
+    session.info.pop(LOCKED_KEY, None)
+
+
+def truncated_through(connection):
+    """Highest cursor whose entries were dropped by retention (0 if none)"""
+    return connection.execute(
+        select(func.coalesce(func.max(ChangeJournal.row_id), 0)).where(ChangeJournal.op == 'truncate')
+    ).scalar()
+
+
+def compact(engine, now=None):
+    """Drop entries past retention and collapse older duplicates.
+
+    Entries older than ``RETENTION_HOURS`` are deleted and replaced by a
+    single ``truncate`` marker holding the highest deleted cursor, so a
+    client behind it knows to resync fully. Among entries older than
+    ``COLLAPSE_SECONDS`` only the newest per row (or per account, for
+    account-wide entries) is kept; a client resuming from any cursor still
+    sees the latest change of every row changed after it. Mark entries
+    collapse separately, so readers ignoring them keep the latest other one.
+    """
+    if not _compacting.acquire(blocking=False):
+        return None
+    try:
+        now = now or datetime.utcnow()
+        with engine.begin() as connection:
+            journal = ChangeJournal.__table__
+            live = journal.c.op != 'truncate'
+            removed = 0
+
+            retention_cutoff = now - timedelta(hours=RETENTION_HOURS)
+            expired_through = connection.execute(
+                select(func.max(journal.c.id)).where(live, journal.c.changed_at < retention_cutoff)
+            ).scalar()
+            if expired_through is not None:
+                removed += connection.execute(delete(journal).where(live, journal.c.id <= expired_through)).rowcount
+                connection.execute(delete(journal).where(journal.c.op == 'truncate'))
+                connection.execute(insert(journal).values(
+                    table_name='*', op='truncate', row_id=expired_through, changed_at=now))
+
+            collapse_cutoff = now - timedelta(seconds=COLLAPSE_SECONDS)
+            collapse_through = connection.execute(
+                select(func.max(journal.c.id)).where(live, journal.c.changed_at < collapse_cutoff)
+            ).scalar()
+            if collapse_through is not None:
+                latest = select(func.max(journal.c.id)).where(live, journal.c.id <= collapse_through).group_by(
+                    journal.c.table_name, journal.c.row_id, journal.c.broker_account_id, journal.c.op == 'mark')
+                removed += connection.execute(delete(journal).where(
+                    live, journal.c.id <= collapse_through, journal.c.id.not_in(latest)
+                )).rowcount
+        return removed
+    finally:
+        _compacting.release()
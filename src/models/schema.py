@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, inspect, text
+
+from src.models.user import db
+
+try:
+    import fcntl
+except ImportError:  # Windows; a single dev server does not race itself
+    fcntl = None
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
+
+
+def database_uri():
+    """Database URI from ``DATABASE_URL``, defaulting to the bundled SQLite file"""
+    return os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(DATABASE_DIR, 'app.db')}")
+
+
+@contextmanager
+def _schema_lock(uri):
+    """Serialise schema changes between processes starting at the same time"""
+    if fcntl is None:
+        yield
+        return
+    name = 'schema-{}.lock'.format(hashlib.sha1(uri.encode()).hexdigest()[:12])
+    with open(os.path.join(tempfile.gettempdir(), name), 'w') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _add_missing_columns(connection):
+    """Add model columns and indexes that existing tables lack.
+
+    ``create_all`` only creates missing tables, so new columns on existing
+    models are added here with ``ALTER TABLE ... ADD COLUMN``. New columns
+    must therefore be nullable or carry a server default.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += ' DEFAULT ' + (default.text if hasattr(default, 'text') else f"'{default}'")
+            connection.execute(text(ddl))
+            added.append(f'{table.name}.{column.name}')
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(connection)
+                added.append(index.name)
+    return added
+
+
+def init_schema(uri=None, engine=None):
+    """Create missing tables and columns; run once per deploy, not per worker.
+
+    Pass ``engine`` to reuse an existing engine (e.g. ``db.engine`` inside an
+    app context), otherwise a short-lived one is built for ``uri``. Returns
+    the ``table.column`` and index names that were added.
+    """
+    if engine is None:
+        uri = uri or database_uri()
+        if uri.startswith('sqlite:///') and uri != 'sqlite:///:memory:':
+            directory = os.path.dirname(uri[len('sqlite:///'):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        owned = engine = create_engine(uri)
+    else:
+        owned = None
+        uri = engine.url.render_as_string(hide_password=False)
+
+    try:
+        with _schema_lock(uri):
+            with engine.begin() as connection:
+                added = _add_missing_columns(connection)
+                db.metadata.create_all(connection)
+    finally:
+        if owned is not None:
+            owned.dispose()
+    return added
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import bcrypt
+import json
 
 db = SQLAlchemy()
 
@@ -66,6 +67,7 @@ class BrokerAccount(db.Model):
     broker_type = db.Column(db.String(50), nullable=False)  # 'tradovate' or 'topstep'
     broker_account_id = db.Column(db.String(255), nullable=False)
     api_credentials = db.Column(db.Text, nullable=False)  # encrypted JSON
+    credential_fingerprint = db.Column(db.String(64), index=True)  # groups accounts sharing one login
     account_name = db.Column(db.String(255))
     account_status = db.Column(db.String(50), default='active')
     balance = db.Column(db.Numeric(15, 2))
@@ -166,6 +168,7 @@ class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     broker_account_id = db.Column(db.Integer, db.ForeignKey('broker_accounts.id'), nullable=False)
     broker_order_id = db.Column(db.String(255), nullable=False)
+    strategy_id = db.Column(db.Integer, db.ForeignKey('trading_strategies.id'), index=True)  # placed by a strategy
     symbol = db.Column(db.String(50), nullable=False)
     side = db.Column(db.String(10), nullable=False)  # 'buy' or 'sell'
     order_type = db.Column(db.String(20), nullable=False)  # 'market', 'limit', 'stop'
@@ -230,3 +233,114 @@ class Trade(db.Model):
             'executed_at': self.executed_at.isoformat() if self.executed_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+
+class AccountSnapshot(db.Model):
+    __tablename__ = 'account_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('broker_account_id', 'resolution', 'bucket_start', name='uq_account_snapshot_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    broker_account_id = db.Column(db.Integer, db.ForeignKey('broker_accounts.id'), nullable=False)
+    resolution = db.Column(db.String(4), nullable=False)  # '1m', '1h' or '1d'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    balance = db.Column(db.Numeric(15, 2))
+    equity_open = db.Column(db.Numeric(15, 2))
+    equity_high = db.Column(db.Numeric(15, 2))
+    equity_low = db.Column(db.Numeric(15, 2))
+    equity = db.Column(db.Numeric(15, 2))  # last sample in the bucket
+    margin_used = db.Column(db.Numeric(15, 2))
+    margin_used_max = db.Column(db.Numeric(15, 2))
+    samples = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<AccountSnapshot {self.broker_account_id}:{self.resolution}:{self.bucket_start}>'
+
+    def to_dict(self):
+        return {
+            'time': self.bucket_start.isoformat(),
+            'balance': float(self.balance) if self.balance is not None else None,
+            'equity_open': float(self.equity_open) if self.equity_open is not None else None,
+            'equity_high': float(self.equity_high) if self.equity_high is not None else None,
+            'equity_low': float(self.equity_low) if self.equity_low is not None else None,
+            'equity': float(self.equity) if self.equity is not None else None,
+            'margin_used': float(self.margin_used) if self.margin_used is not None else None,
+            'margin_used_max': float(self.margin_used_max) if self.margin_used_max is not None else None,
+            'samples': self.samples
+        }
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claim', 'status', 'priority', 'run_after'),
+        # At most one queued job per (type, account); running ones may have a follow-up queued
+        db.Index('uq_jobs_queued_dedupe', 'dedupe_key', unique=True,
+                 sqlite_where=db.text("status = 'queued'"), postgresql_where=db.text("status = 'queued'")),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    broker_account_id = db.Column(db.Integer, db.ForeignKey('broker_accounts.id'))
+    dedupe_key = db.Column(db.String(100), nullable=False)  # '<job_type>:<broker_account_id>'
+    priority = db.Column(db.Integer, nullable=False, default=5)  # lower runs first
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    payload = db.Column(db.Text)  # JSON
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    progress = db.Column(db.Float, default=0.0)
+    progress_message = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id}:{self.job_type}:{self.status}>'
+
+    def to_dict(self):
+        payload = json.loads(self.payload) if self.payload else None
+        if payload and self.job_type == 'connect':
+            payload.pop('credentials', None)  # encrypted, but never sent to clients
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'broker_account_id': self.broker_account_id,
+            'priority': self.priority,
+            'status': self.status,
+            'payload': payload,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'progress': self.progress,
+            'progress_message': self.progress_message,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ChangeJournal(db.Model):
+    __tablename__ = 'change_journal'
+    __table_args__ = (
+        db.Index('ix_change_journal_account', 'broker_account_id', 'table_name', 'id'),
+        # Never reuse ids of compacted entries: they are client cursors
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)  # the change cursor
+    table_name = db.Column(db.String(50), nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # 'insert', 'update', 'delete', 'mark' (prices only) or 'truncate'
+    row_id = db.Column(db.Integer)  # NULL: any rows of the account may have changed
+    broker_account_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ChangeJournal {self.id}:{self.op}:{self.table_name}:{self.row_id}>'
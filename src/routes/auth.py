@@ -1,52 +1,23 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from src.models.user import db, User, UserSession
+from src.utils.validation import LOGIN_SCHEMA, REGISTER_SCHEMA
 from datetime import datetime, timedelta
-import re
 
 auth_bp = Blueprint('auth', __name__)
 
-def validate_email(email):
-    """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def validate_password(password):
-    """Validate password strength"""
-    if len(password) < 8:
-        return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
-        return False, "Password must contain at least one uppercase letter"
-    if not re.search(r'[a-z]', password):
-        return False, "Password must contain at least one lowercase letter"
-    if not re.search(r'\d', password):
-        return False, "Password must contain at least one number"
-    return True, "Password is valid"
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """User registration endpoint"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['email', 'password', 'full_name']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'{field} is required'}), 400
+        # Validate fields, email format and password strength
+        values, error = REGISTER_SCHEMA.validate(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
         
-        email = data['email'].lower().strip()
-        password = data['password']
-        full_name = data['full_name'].strip()
-        
-        # Validate email format
-        if not validate_email(email):
-            return jsonify({'error': 'Invalid email format'}), 400
-        
-        # Validate password strength
-        is_valid, message = validate_password(password)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        email = values['email']
+        password = values['password']
+        full_name = values['full_name']
         
         # Check if user already exists
         existing_user = User.query.filter_by(email=email).first()
@@ -82,14 +53,13 @@ def register():
 def login():
     """User login endpoint"""
     try:
-        data = request.get_json()
-        
         # Validate required fields
-        if not data.get('email') or not data.get('password'):
-            return jsonify({'error': 'Email and password are required'}), 400
+        values, error = LOGIN_SCHEMA.validate(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
         
-        email = data['email'].lower().strip()
-        password = data['password']
+        email = values['email']
+        password = values['password']
         
         # Find user by email
         user = User.query.filter_by(email=email).first()
@@ -1,82 +1,179 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db, User, BrokerAccount
-from src.services.tradovate_service import TradovateService
-from src.services.topstep_service import TopStepService
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from src.models.user import db, User, BrokerAccount, Job
+from src.services.account_snapshots import RESOLUTIONS, equity_curve
+from src.services.account_sync import login_accounts, login_fingerprint
+from src.services.broker_registry import get_broker_service, load_credentials
+from src.services.job_queue import PRIORITIES, enqueue, run_in_thread, runner_configured
 from src.utils.encryption import encrypt_data, decrypt_data
+from src.utils.response_cache import cache_per_user
+from src.utils.validation import CONNECT_SCHEMA
 from datetime import datetime
 import json
+import os
+import threading
+import time
 
 broker_bp = Blueprint('broker', __name__)
 
+# Connection status streams poll the database until the connect job settles.
+# Each one holds a worker while it is open, so streams are short (EventSource
+# reconnects on its own) and few per process; past the limit clients are
+# sent to the polling endpoint.
+CONNECTION_POLL_SECONDS = 0.5
+CONNECTION_STREAM_TIMEOUT = 20.0
+CONNECTION_STREAM_LIMIT = int(os.environ.get('CONNECTION_STREAM_LIMIT', '4'))
+_connection_streams = threading.BoundedSemaphore(CONNECTION_STREAM_LIMIT)
+
 @broker_bp.route('/connect', methods=['POST'])
 def connect_broker():
-    """Connect a new broker account"""
+    """Connect a broker login; the connection test and account discovery run as a job"""
     try:
+        # Validate broker type and credentials before touching the database
+        values, error = CONNECT_SCHEMA.validate(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        broker_type = values['broker_type']
+        credentials = values['credentials']
+        
         # For now, we'll use a simple user lookup since JWT is not implemented
         # In production, you'd want proper authentication
-        data = request.get_json()
-        
-        # Get user_id from request or use default for demo
-        user_id = data.get('user_id', 1)  # Default to user 1 for demo
-        user = User.query.get(user_id)
+        user = User.query.get(values['user_id'])
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Validate required fields
-        required_fields = ['broker_type', 'credentials']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'{field} is required'}), 400
-        
-        broker_type = data['broker_type'].lower()
-        credentials = data['credentials']
+        # Reconnecting a login re-tests its existing accounts instead of adding
+        # duplicates. The credentials given (the password may have changed)
+        # replace the stored ones only once the job's connection test passes.
+        existing = login_accounts(user.id, broker_type, credentials)
+        encrypted = encrypt_data(json.dumps(credentials))
+        broker_account = existing[0] if existing else None
         
-        # Validate broker type
-        if broker_type not in ['tradovate', 'topstep']:
-            return jsonify({'error': 'Invalid broker type. Must be "tradovate" or "topstep"'}), 400
-        
-        # For demo purposes, we'll skip the actual API connection test
-        # In production, you'd test the connection here
-        account_info = {
-            'account_id': f'{broker_type}_demo_account',
-            'account_name': f'{broker_type.title()} Demo Account',
-            'balance': 10000.00,
-            'equity': 10000.00,
-            'margin_used': 0.00,
-            'margin_available': 10000.00
-        }
-        
-        # Encrypt credentials before storing
-        encrypted_credentials = encrypt_data(json.dumps(credentials))
-        
-        # Create broker account record
-        broker_account = BrokerAccount(
-            user_id=user.id,
-            broker_type=broker_type,
-            broker_account_id=account_info.get('account_id', ''),
-            api_credentials=encrypted_credentials,
-            account_name=account_info.get('account_name', ''),
-            balance=account_info.get('balance', 0),
-            equity=account_info.get('equity', 0),
-            margin_used=account_info.get('margin_used', 0),
-            margin_available=account_info.get('margin_available', 0),
-            last_sync=datetime.utcnow()
-        )
-        
-        db.session.add(broker_account)
+        if broker_account is None:
+            # Placeholder until the job learns the broker's account ids
+            broker_account = BrokerAccount(
+                user_id=user.id,
+                broker_type=broker_type,
+                broker_account_id='',
+                api_credentials=encrypted,
+                credential_fingerprint=login_fingerprint(broker_type, credentials),
+                account_name=f'{broker_type.title()} Account',
+                account_status='pending'
+            )
+            db.session.add(broker_account)
+        elif broker_account.account_status == 'failed':
+            broker_account.account_status = 'pending'
         db.session.commit()
         
+        job, _ = enqueue('connect', broker_account_id=broker_account.id, user_id=user.id,
+                         payload={'credentials': encrypted}, priority=PRIORITIES['high'], max_attempts=1)
+        if not runner_configured():
+            # Nothing else would ever pick the job up
+            run_in_thread(current_app._get_current_object(), job)
+        
         return jsonify({
-            'message': f'{broker_type.title()} account connected successfully',
-            'broker_account': broker_account.to_dict()
-        }), 201
+            'message': f'Connecting {broker_type.title()} account',
+            'broker_account': broker_account.to_dict(),
+            'job': job.to_dict(),
+            'status_url': url_for('broker.get_connection_status', account_id=broker_account.id)
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to connect broker account', 'details': str(e)}), 500
 
+def _connection_state(broker_account):
+    """Connection status of an account: its row plus the latest connect job"""
+    job = Job.query.filter_by(job_type='connect', broker_account_id=broker_account.id).order_by(
+        Job.id.desc()).first()
+    status = broker_account.account_status
+    error = None
+    if job is not None:
+        if job.status in ('queued', 'running'):
+            status = 'pending'
+        elif job.status in ('failed', 'cancelled'):
+            status = 'failed'
+            error = job.error or 'Connection cancelled'
+    accounts = []
+    if job is not None and job.status == 'succeeded' and job.result:
+        account_ids = json.loads(job.result).get('accounts', [])
+        accounts = [account.to_dict() for account in
+                    BrokerAccount.query.filter(BrokerAccount.id.in_(account_ids)).order_by(BrokerAccount.id)]
+    return {
+        'status': status,
+        'error': error,
+        'progress': job.progress if job is not None else None,
+        'message': job.progress_message if job is not None else None,
+        'broker_account': broker_account.to_dict(),
+        'accounts': accounts,
+        'job_id': job.id if job is not None else None
+    }
+
+@broker_bp.route('/accounts/<int:account_id>/connection', methods=['GET'])
+def get_connection_status(account_id):
+    """Poll the status of a broker connection started by /connect"""
+    try:
+        broker_account = BrokerAccount.query.get(account_id)
+
+        if not broker_account:
+            return jsonify({'error': 'Broker account not found'}), 404
+
+        return jsonify(_connection_state(broker_account)), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve connection status', 'details': str(e)}), 500
+
+@broker_bp.route('/accounts/<int:account_id>/connection/stream', methods=['GET'])
+def stream_connection_status(account_id):
+    """Stream a broker connection's status as server-sent events until it settles"""
+    try:
+        if not BrokerAccount.query.get(account_id):
+            return jsonify({'error': 'Broker account not found'}), 404
+
+        interval = max(request.args.get('interval', CONNECTION_POLL_SECONDS, type=float), CONNECTION_POLL_SECONDS)
+        timeout = min(request.args.get('timeout', CONNECTION_STREAM_TIMEOUT, type=float), CONNECTION_STREAM_TIMEOUT)
+
+        if not _connection_streams.acquire(blocking=False):
+            response = jsonify({
+                'error': 'Too many open connection streams',
+                'status_url': url_for('broker.get_connection_status', account_id=account_id)
+            })
+            response.headers['Retry-After'] = '2'
+            return response, 503
+
+        def events():
+            yield 'retry: 2000\n\n'
+            last = None
+            deadline = time.monotonic() + timeout
+            while True:
+                # End the read transaction so the next poll sees the job's commits
+                db.session.rollback()
+                broker_account = db.session.get(BrokerAccount, account_id)
+                if broker_account is None:
+                    yield 'event: error\ndata: {"error": "Broker account not found"}\n\n'
+                    return
+                state = _connection_state(broker_account)
+                if state != last:
+                    yield f"event: status\ndata: {json.dumps(state)}\n\n"
+                    last = state
+                if state['status'] != 'pending' or time.monotonic() >= deadline:
+                    return
+                time.sleep(interval)
+
+        response = Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # Released when the server closes the response, even if it never started streaming
+        response.call_on_close(_connection_streams.release)
+        return response
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to open stream', 'details': str(e)}), 500
+
 @broker_bp.route('/accounts', methods=['GET'])
+@cache_per_user
 def get_broker_accounts():
     """Get all broker accounts for the current user"""
     try:
@@ -95,3 +192,65 @@ def get_broker_accounts():
         
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve broker accounts', 'details': str(e)}), 500
+
+@broker_bp.route('/accounts/<int:account_id>/sync', methods=['POST'])
+def sync_broker_account(account_id):
+    """Pull the latest balances, positions and orders from the broker"""
+    try:
+        broker_account = BrokerAccount.query.get(account_id)
+
+        if not broker_account:
+            return jsonify({'error': 'Broker account not found'}), 404
+
+        # ?background=1 hands the sync to the job workers and returns at once
+        if request.args.get('background') == '1':
+            job, _ = enqueue('sync', broker_account_id=broker_account.id, user_id=broker_account.user_id,
+                             priority=PRIORITIES['high'])
+            return jsonify({'message': 'Sync queued', 'job': job.to_dict()}), 202
+
+        service = get_broker_service(broker_account.broker_type)
+        result = service.sync_account_data(load_credentials(broker_account), broker_account)
+
+        if not result['success']:
+            return jsonify({'error': 'Sync failed', 'details': result['error']}), 502
+
+        return jsonify({
+            'message': 'Broker account synced successfully',
+            'broker_account': broker_account.to_dict(),
+            'positions': result['data']['positions'],
+            'orders': result['data']['orders']
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to sync broker account', 'details': str(e)}), 500
+
+@broker_bp.route('/accounts/<int:account_id>/equity-curve', methods=['GET'])
+def get_equity_curve(account_id):
+    """Get the account's balance, equity and margin series at a rollup resolution"""
+    try:
+        broker_account = BrokerAccount.query.get(account_id)
+
+        if not broker_account:
+            return jsonify({'error': 'Broker account not found'}), 404
+
+        resolution = request.args.get('resolution', '1h')
+        if resolution not in RESOLUTIONS:
+            return jsonify({'error': f'resolution must be one of {", ".join(RESOLUTIONS)}'}), 400
+
+        try:
+            start = request.args.get('start')
+            end = request.args.get('end')
+            start = datetime.fromisoformat(start) if start else None
+            end = datetime.fromisoformat(end) if end else None
+        except ValueError as e:
+            return jsonify({'error': 'Invalid time range', 'details': str(e)}), 400
+
+        return jsonify({
+            'broker_account_id': broker_account.id,
+            'resolution': resolution,
+            'points': equity_curve(broker_account.id, resolution, start, end)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve equity curve', 'details': str(e)}), 500
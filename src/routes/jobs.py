@@ -0,0 +1,136 @@
+from flask import Blueprint, request, jsonify, send_file
+from src.models.user import db, User, BrokerAccount, Job
+from src.services.job_queue import PRIORITIES, cancel, enqueue
+import hashlib
+import json
+import os
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Job types users may queue; maintenance jobs are queued by operators via the CLI
+USER_JOBS = ('sync', 'export_history')
+# Job types that act on one broker account and need its id
+ACCOUNT_JOBS = {'sync'}
+
+def _user_job(job_id, user_id):
+    """The job if it belongs to the user; other users' jobs are reported as missing"""
+    return Job.query.filter_by(id=job_id, user_id=user_id).first()
+
+@jobs_bp.route('', methods=['POST'])
+def create_job():
+    """Queue a background job (deduplicated per job type and account)"""
+    try:
+        data = request.get_json()
+
+        job_type = data.get('job_type')
+        if job_type not in USER_JOBS:
+            return jsonify({'error': f'job_type must be one of {", ".join(USER_JOBS)}'}), 400
+
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        broker_account_id = data.get('broker_account_id')
+        if job_type in ACCOUNT_JOBS or broker_account_id:
+            broker_account = BrokerAccount.query.filter_by(id=broker_account_id, user_id=user.id).first()
+            if not broker_account:
+                return jsonify({'error': 'Broker account not found'}), 404
+
+        priority = data.get('priority', 'normal')
+        priority = PRIORITIES.get(priority, priority)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            return jsonify({'error': f'priority must be an integer or one of {", ".join(PRIORITIES)}'}), 400
+        # Keep user jobs within the named range so they cannot jump ahead of operator jobs
+        priority = min(max(priority, min(PRIORITIES.values())), max(PRIORITIES.values()))
+
+        payload = data.get('payload') or {}
+        dedupe_key = None
+        if job_type == 'export_history':
+            # Exports differ by user and range rather than by account
+            digest = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:12]
+            dedupe_key = f'{job_type}:{user.id}:{digest}'
+
+        job, created = enqueue(job_type, broker_account_id=broker_account_id, user_id=user.id, payload=payload,
+                               priority=priority, dedupe_key=dedupe_key)
+
+        return jsonify({
+            'message': 'Job queued' if created else 'An identical job is already queued',
+            'job': job.to_dict()
+        }), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to queue job', 'details': str(e)}), 500
+
+@jobs_bp.route('', methods=['GET'])
+def get_jobs():
+    """Get the current user's most recent jobs"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        query = Job.query.filter_by(user_id=user_id)
+        status = request.args.get('status')
+        if status:
+            query = query.filter_by(status=status)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        jobs = query.order_by(Job.id.desc()).limit(limit).all()
+
+        return jsonify({
+            'jobs': [job.to_dict() for job in jobs]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve jobs', 'details': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's status, progress and result"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        job = _user_job(job_id, user_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        return jsonify({'job': job.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve job', 'details': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        data = request.get_json(silent=True) or {}
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        job = _user_job(job_id, user_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        if not cancel(job):
+            return jsonify({'error': f'Job already {job.status}'}), 409
+
+        return jsonify({'message': 'Job cancelled', 'job': job.to_dict()}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to cancel job', 'details': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>/download', methods=['GET'])
+def download_job_result(job_id):
+    """Download the file written by a finished export job"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        job = _user_job(job_id, user_id)
+        if not job or job.job_type != 'export_history':
+            return jsonify({'error': 'Export job not found'}), 404
+        if job.status != 'succeeded':
+            return jsonify({'error': f'Export is {job.status}'}), 409
+
+        path = json.loads(job.result)['path']
+        if not os.path.exists(path):
+            return jsonify({'error': 'Export file no longer exists'}), 410
+
+        return send_file(path, mimetype='text/csv', as_attachment=True, download_name=os.path.basename(path))
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to download export', 'details': str(e)}), 500
@@ -0,0 +1,148 @@
+from flask import Blueprint, Response, request, jsonify
+from src.models.user import BrokerAccount
+from src.services.contract_catalog import get_contract_catalog, tradovate_loader
+from src.services.broker_registry import get_broker_service, load_credentials
+import json
+
+market_data_bp = Blueprint('market_data', __name__)
+
+# Streams hold a connection open; run them under an event-loop worker
+# (WORKER_CLASS=gevent) so idle clients do not each pin a thread
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_BUFFER_SIZE = 256
+
+@market_data_bp.route('/<symbol>/bars', methods=['GET'])
+def get_bars(symbol):
+    """Get OHLCV bars aggregated from stored trades"""
+    try:
+        # NumPy-backed; imported on first use to keep app startup light
+        from src.services.market_data_store import get_tick_store, bars_to_dicts
+
+        interval = request.args.get('interval', 60, type=int)
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
+
+        if interval <= 0:
+            return jsonify({'error': 'interval must be a positive number of seconds'}), 400
+
+        bars = get_tick_store().bars(symbol, interval_seconds=interval, start=start, end=end)
+
+        return jsonify({
+            'symbol': symbol,
+            'interval': interval,
+            'bars': bars_to_dicts(bars)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve bars', 'details': str(e)}), 500
+
+@market_data_bp.route('/<symbol>/last', methods=['GET'])
+def get_last_price(symbol):
+    """Get the latest locally stored price for a symbol"""
+    try:
+        from src.services.market_data_store import get_tick_store
+
+        price = get_tick_store().last_price(symbol)
+
+        if price is None:
+            return jsonify({'error': 'No market data for symbol'}), 404
+
+        return jsonify({
+            'symbol': symbol,
+            'price': price
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve price', 'details': str(e)}), 500
+
+@market_data_bp.route('/<symbol>/stream', methods=['GET'])
+def stream_ticks(symbol):
+    """Stream ticks for a symbol as server-sent events"""
+    try:
+        from src.services.market_data_store import get_tick_store
+        from src.services.subscriptions import get_subscription_manager
+
+        heartbeat = request.args.get('heartbeat', STREAM_HEARTBEAT_SECONDS, type=float)
+
+        # ?broker_account_id= also holds the symbol on that broker's upstream feed,
+        # shared with every other stream and strategy watching it
+        broker_type = credentials = None
+        broker_account_id = request.args.get('broker_account_id', type=int)
+        if broker_account_id:
+            # For demo, get user_id from query params or use default
+            user_id = request.args.get('user_id', 1, type=int)
+            broker_account = BrokerAccount.query.filter_by(id=broker_account_id, user_id=user_id).first()
+            if not broker_account:
+                return jsonify({'error': 'Broker account not found'}), 404
+            broker_type = broker_account.broker_type
+            credentials = load_credentials(broker_account)
+
+        last = get_tick_store().last_price(symbol)
+        # A slow client gets the latest price per tick kind rather than a backlog
+        subscription = get_subscription_manager().subscribe(
+            [symbol], broker_type=broker_type, credentials=credentials, capacity=STREAM_BUFFER_SIZE)
+
+        def events():
+            try:
+                yield 'retry: 2000\n\n'
+                yield f"event: snapshot\ndata: {json.dumps({'symbol': symbol, 'price': last})}\n\n"
+                while True:
+                    ticks = subscription.get(timeout=heartbeat)
+                    if not ticks:
+                        yield ': keepalive\n\n'
+                        continue
+                    for _, kind, ts, price in ticks:
+                        yield f"event: {kind}\ndata: {json.dumps({'symbol': symbol, 'ts': ts, 'price': price})}\n\n"
+            finally:
+                subscription.close()
+
+        return Response(events(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to open stream', 'details': str(e)}), 500
+
+@market_data_bp.route('/subscriptions', methods=['GET'])
+def get_subscriptions():
+    """Get this process's open subscriptions and upstream feed symbols"""
+    try:
+        from src.services.subscriptions import get_subscription_manager
+
+        return jsonify(get_subscription_manager().stats()), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve subscriptions', 'details': str(e)}), 500
+
+@market_data_bp.route('/contracts/<symbol>', methods=['GET'])
+def get_contract(symbol):
+    """Get tick size, point value and expiry for a contract"""
+    try:
+        spec = get_contract_catalog().get(symbol.upper())
+
+        if spec is None:
+            return jsonify({'error': 'Unknown contract'}), 404
+
+        return jsonify({'contract': spec.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve contract', 'details': str(e)}), 500
+
+@market_data_bp.route('/contracts/refresh', methods=['POST'])
+def refresh_contracts():
+    """Refresh the contract catalog from Tradovate in the background"""
+    try:
+        data = request.get_json() or {}
+
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        broker_account = BrokerAccount.query.filter_by(id=data.get('broker_account_id'), user_id=user_id).first()
+        if not broker_account or broker_account.broker_type != 'tradovate':
+            return jsonify({'error': 'A Tradovate broker account is required'}), 400
+
+        get_contract_catalog().refresh_in_background(tradovate_loader(load_credentials(broker_account)))
+
+        return jsonify({'message': 'Contract refresh started'}), 202
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to refresh contracts', 'details': str(e)}), 500
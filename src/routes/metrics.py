@@ -0,0 +1,41 @@
+from flask import Blueprint, Response, request, abort
+from src.models.user import db, BrokerAccount
+from src.utils.metrics import render_metrics, sync_lag
+from datetime import datetime
+import hmac
+import os
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def _collect_sync_lag():
+    """Refresh the per-account sync lag gauge from the database"""
+    now = datetime.utcnow()
+    rows = db.session.query(BrokerAccount.id, BrokerAccount.broker_type, BrokerAccount.last_sync).all()
+    sync_lag.clear()
+    for account_id, broker_type, last_sync in rows:
+        if last_sync:
+            sync_lag.set((now - last_sync).total_seconds(), account_id=account_id, broker=broker_type)
+
+def _authorized():
+    token = os.environ.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint.
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>``; without a token set
+    every scrape is refused. Under gunicorn, set ``METRICS_DIR`` so a scrape
+    of any worker reports all of them (see ``src.utils.metrics``).
+    """
+    if not _authorized():
+        abort(403)
+
+    try:
+        _collect_sync_lag()
+    except Exception:
+        # Still expose the in-process metrics if the database is unavailable
+        db.session.rollback()
+
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
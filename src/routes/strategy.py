@@ -0,0 +1,196 @@
+from flask import Blueprint, request, jsonify
+from src.models.user import db, User, BrokerAccount, TradingStrategy
+from src.services.strategies import create_strategy, parse_config
+import hashlib
+import json
+import os
+
+strategy_bp = Blueprint('strategy', __name__)
+
+# Sweeps with more parameter combinations than this run as a background job
+SWEEP_INLINE_CASES = int(os.environ.get('SWEEP_INLINE_CASES', '16'))
+
+@strategy_bp.route('', methods=['GET'])
+def get_strategies():
+    """Get all trading strategies for the current user"""
+    try:
+        # For demo, get user_id from query params or use default
+        user_id = request.args.get('user_id', 1, type=int)
+        user = User.query.get(user_id)
+
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        strategies = TradingStrategy.query.filter_by(user_id=user.id).all()
+
+        return jsonify({
+            'strategies': [strategy.to_dict() for strategy in strategies]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve strategies', 'details': str(e)}), 500
+
+@strategy_bp.route('', methods=['POST'])
+def create_trading_strategy():
+    """Create a new (inactive) trading strategy"""
+    try:
+        data = request.get_json()
+
+        # Validate required fields
+        required_fields = ['broker_account_id', 'strategy_name', 'strategy_config']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        broker_account = BrokerAccount.query.filter_by(id=data['broker_account_id'], user_id=user_id).first()
+        if not broker_account:
+            return jsonify({'error': 'Broker account not found'}), 404
+
+        # Make sure the config builds a strategy before storing it
+        config = data['strategy_config']
+        try:
+            create_strategy(config)
+        except Exception as e:
+            return jsonify({'error': 'Invalid strategy config', 'details': str(e)}), 400
+
+        strategy = TradingStrategy(
+            user_id=user_id,
+            broker_account_id=broker_account.id,
+            strategy_name=data['strategy_name'],
+            strategy_config=config if isinstance(config, str) else json.dumps(config),
+            is_active=False
+        )
+
+        db.session.add(strategy)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Strategy created successfully',
+            'strategy': strategy.to_dict()
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create strategy', 'details': str(e)}), 500
+
+@strategy_bp.route('/<int:strategy_id>/activate', methods=['POST'])
+def activate_strategy(strategy_id):
+    """Start running a strategy"""
+    return _set_active(strategy_id, True)
+
+@strategy_bp.route('/<int:strategy_id>/deactivate', methods=['POST'])
+def deactivate_strategy(strategy_id):
+    """Stop running a strategy"""
+    return _set_active(strategy_id, False)
+
+def _set_active(strategy_id, is_active):
+    try:
+        strategy = TradingStrategy.query.get(strategy_id)
+
+        if not strategy:
+            return jsonify({'error': 'Strategy not found'}), 404
+
+        strategy.is_active = is_active
+        db.session.commit()
+
+        # The runtime polls for the change; one in this process looks now
+        from src.services.strategy_engine import current_strategy_runtime
+        runtime = current_strategy_runtime()
+        if runtime is not None:
+            runtime.wake()
+
+        return jsonify({
+            'message': f"Strategy {'activated' if is_active else 'deactivated'}",
+            'strategy': strategy.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update strategy', 'details': str(e)}), 500
+
+@strategy_bp.route('/runtime', methods=['GET'])
+def get_runtime_stats():
+    """Get event, order and latency statistics for running strategies"""
+    try:
+        from src.services.strategy_engine import get_strategy_runtime
+        return jsonify(get_strategy_runtime().stats()), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve runtime stats', 'details': str(e)}), 500
+
+@strategy_bp.route('/<int:strategy_id>/backtest', methods=['POST'])
+def backtest_strategy(strategy_id):
+    """Backtest a stored strategy against locally stored market data"""
+    try:
+        # The backtester loads on first use to keep app startup light
+        from src.services.backtest_engine import (
+            Backtest, merged_store_bars, parameter_grid, replay_bars, run_sweep, store_bar_chunks
+        )
+        from src.services.market_data_store import to_ns
+
+        strategy = TradingStrategy.query.get(strategy_id)
+
+        if not strategy:
+            return jsonify({'error': 'Strategy not found'}), 404
+
+        data = request.get_json() or {}
+        config = parse_config(strategy.strategy_config)
+        if data.get('params'):
+            config['params'] = dict(config.get('params', {}), **data['params'])
+
+        symbols = data.get('symbols') or config.get('symbols')
+        if not symbols:
+            return jsonify({'error': 'symbols are required'}), 400
+
+        start, end, interval = to_ns(data.get('start')), to_ns(data.get('end')), data.get('interval', 60)
+        options = {
+            'initial_capital': data.get('initial_capital', 100000.0),
+            'slippage_ticks': data.get('slippage_ticks', 1),
+            'commission': data.get('commission', 0.0)
+        }
+
+        if 'param_grid' in data:
+            cases = len(parameter_grid(data['param_grid']))
+            if cases > SWEEP_INLINE_CASES:
+                return _queue_sweep(strategy, data, symbols, start, end, interval, options)
+            # Sweeps run on one merged data set shipped to every worker
+            bars = merged_store_bars(symbols, start, end, interval)
+            results = run_sweep(config, data['param_grid'], bars, **options)
+            return jsonify({'strategy_id': strategy.id, 'sweep': results}), 200
+
+        result = Backtest(config, **options).run(replay_bars(store_bar_chunks(symbols, start, end, interval)))
+
+        return jsonify(dict(result.to_dict(), strategy_id=strategy.id)), 200
+
+    except ValueError as e:
+        return jsonify({'error': 'Invalid backtest request', 'details': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Backtest failed', 'details': str(e)}), 500
+
+def _queue_sweep(strategy, data, symbols, start, end, interval, options):
+    """Queue a large sweep as a ``backtest_sweep`` job; its result holds the sweep"""
+    from flask import current_app
+    from src.services.job_queue import enqueue, run_in_thread, runner_configured
+
+    payload = {
+        'strategy_id': strategy.id,
+        'params': data.get('params'),
+        'param_grid': data['param_grid'],
+        'symbols': symbols,
+        'start': start,
+        'end': end,
+        'interval': interval,
+        'options': options
+    }
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:12]
+    job, created = enqueue('backtest_sweep', user_id=strategy.user_id, payload=payload,
+                           dedupe_key=f'backtest_sweep:{strategy.id}:{digest}', max_attempts=1)
+    if created and not runner_configured():
+        run_in_thread(current_app._get_current_object(), job)
+    return jsonify({
+        'message': 'Sweep queued' if created else 'An identical sweep is already queued',
+        'strategy_id': strategy.id,
+        'job': job.to_dict(),
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
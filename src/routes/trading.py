@@ -1,11 +1,33 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from src.models.user import db, User, BrokerAccount, Position, Order, Trade
+from src.services.change_feed import changes_since, current_cursor
+from src.services.order_service import place_order
+from src.services.position_book import get_position_book
+from src.services.trade_archive import KINDS, get_trade_archive, iter_csv
+from src.utils.response_cache import cache_per_user
+from src.utils.validation import ORDER_SCHEMA
 from datetime import datetime
 import json
 
 trading_bp = Blueprint('trading', __name__)
 
+def _changes_response(key, model, user, since):
+    """Delta response for ``?since=<cursor>``, or None when the cursor is too old"""
+    account_ids = [account.id for account in BrokerAccount.query.filter_by(user_id=user.id).all()]
+    changes = changes_since(model, account_ids, since)
+    if changes is None:
+        return None
+    cursor, upserted, deleted, reset_accounts = changes
+    return jsonify({
+        key: [row.to_dict() for row in upserted],
+        'deleted': deleted,
+        'reset_accounts': reset_accounts,
+        'cursor': cursor,
+        'full': False
+    }), 200
+
 @trading_bp.route('/positions', methods=['GET'])
+@cache_per_user(marks=True)
 def get_positions():
     """Get all positions for the current user"""
     try:
@@ -16,20 +38,38 @@ def get_positions():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get positions for all user's broker accounts
-        broker_accounts = BrokerAccount.query.filter_by(user_id=user.id).all()
-        account_ids = [account.id for account in broker_accounts]
+        # ?since=<cursor> returns only what changed after that cursor
+        since = request.args.get('since', type=int)
+        if since is not None:
+            delta = _changes_response('positions', Position, user, since)
+            if delta is not None:
+                return delta
+        book = get_position_book()
+        if book is not None:
+            # The cursor the book was loaded at, which may be older than the journal's head
+            positions, cursor = book.positions_at(user.id)
+        else:
+            # Read before the rows, so they are at least as new as the cursor
+            cursor = current_cursor()
+            # Get positions for all user's broker accounts
+            broker_accounts = BrokerAccount.query.filter_by(user_id=user.id).all()
+            account_ids = [account.id for account in broker_accounts]
+            
+            positions = Position.query.filter(Position.broker_account_id.in_(account_ids)).all()
         
-        positions = Position.query.filter(Position.broker_account_id.in_(account_ids)).all()
-        
-        return jsonify({
-            'positions': [position.to_dict() for position in positions]
-        }), 200
+        response = {
+            'positions': [position.to_dict() for position in positions],
+            'cursor': cursor
+        }
+        if since is not None:
+            response['full'] = True
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve positions', 'details': str(e)}), 500
 
 @trading_bp.route('/orders', methods=['GET'])
+@cache_per_user
 def get_orders():
     """Get all orders for the current user"""
     try:
@@ -40,20 +80,38 @@ def get_orders():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get orders for all user's broker accounts
-        broker_accounts = BrokerAccount.query.filter_by(user_id=user.id).all()
-        account_ids = [account.id for account in broker_accounts]
+        # ?since=<cursor> returns only what changed after that cursor
+        since = request.args.get('since', type=int)
+        if since is not None:
+            delta = _changes_response('orders', Order, user, since)
+            if delta is not None:
+                return delta
+        book = get_position_book()
+        if book is not None:
+            # The cursor the book was loaded at, which may be older than the journal's head
+            orders, cursor = book.orders_at(user.id)
+        else:
+            # Read before the rows, so they are at least as new as the cursor
+            cursor = current_cursor()
+            # Get orders for all user's broker accounts
+            broker_accounts = BrokerAccount.query.filter_by(user_id=user.id).all()
+            account_ids = [account.id for account in broker_accounts]
+            
+            orders = Order.query.filter(Order.broker_account_id.in_(account_ids)).all()
         
-        orders = Order.query.filter(Order.broker_account_id.in_(account_ids)).all()
-        
-        return jsonify({
-            'orders': [order.to_dict() for order in orders]
-        }), 200
+        response = {
+            'orders': [order.to_dict() for order in orders],
+            'cursor': cursor
+        }
+        if since is not None:
+            response['full'] = True
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve orders', 'details': str(e)}), 500
 
 @trading_bp.route('/trades', methods=['GET'])
+@cache_per_user
 def get_trades():
     """Get all trades for the current user"""
     try:
@@ -64,16 +122,135 @@ def get_trades():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
+        # ?since=<cursor> returns only what changed after that cursor
+        since = request.args.get('since', type=int)
+        if since is not None:
+            delta = _changes_response('trades', Trade, user, since)
+            if delta is not None:
+                return delta
+        cursor = current_cursor()
+        
         # Get trades for all user's broker accounts
         broker_accounts = BrokerAccount.query.filter_by(user_id=user.id).all()
         account_ids = [account.id for account in broker_accounts]
         
         trades = Trade.query.filter(Trade.broker_account_id.in_(account_ids)).all()
         
-        return jsonify({
-            'trades': [trade.to_dict() for trade in trades]
-        }), 200
+        response = {
+            'trades': [trade.to_dict() for trade in trades],
+            'cursor': cursor
+        }
+        if since is not None:
+            response['full'] = True
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve trades', 'details': str(e)}), 500
 
+@trading_bp.route('/book/check', methods=['GET'])
+def check_position_book():
+    """Compare this worker's in-memory position book with the database"""
+    try:
+        book = get_position_book()
+        if book is None:
+            return jsonify({'error': 'Position book is disabled'}), 404
+        
+        problems = book.verify()
+        
+        return jsonify({
+            'consistent': not problems,
+            'problems': {str(user_id): messages for user_id, messages in problems.items()}
+        }), 200 if not problems else 409
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to check position book', 'details': str(e)}), 500
+
+def _history_args():
+    """``(kind, start, end)`` from the query string; raises ValueError on bad input"""
+    kind = request.args.get('kind', 'trades')
+    if kind not in KINDS:
+        raise ValueError('kind must be "orders" or "trades"')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return (kind,
+            datetime.fromisoformat(start) if start else None,
+            datetime.fromisoformat(end) if end else None)
+
+@trading_bp.route('/history', methods=['GET'])
+def get_history():
+    """Get orders or trades across live and archived history"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        try:
+            kind, start, end = _history_args()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid history query', 'details': str(e)}), 400
+        
+        account_ids = [account.id for account in BrokerAccount.query.filter_by(user_id=user.id).all()]
+        records = get_trade_archive().history(kind, account_ids, start, end)
+        
+        return jsonify({kind: records}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to retrieve history', 'details': str(e)}), 500
+
+@trading_bp.route('/history/export', methods=['GET'])
+def export_history():
+    """Export orders or trades across live and archived history as CSV"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        try:
+            kind, start, end = _history_args()
+        except ValueError as e:
+            return jsonify({'error': 'Invalid history query', 'details': str(e)}), 400
+        
+        account_ids = [account.id for account in BrokerAccount.query.filter_by(user_id=user.id).all()]
+        records = get_trade_archive().history(kind, account_ids, start, end)
+        
+        return Response(iter_csv(records), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={kind}.csv'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to export history', 'details': str(e)}), 500
+
+
+@trading_bp.route('/orders', methods=['POST'])
+def create_order():
+    """Place an order on one of the user's broker accounts"""
+    try:
+        # Validate fields, prices and tick sizes before any database or broker I/O
+        data = request.get_json(silent=True)
+        values, error = ORDER_SCHEMA.validate(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        user_id = data.get('user_id', 1)  # Default to user 1 for demo
+        broker_account = BrokerAccount.query.filter_by(id=values.pop('broker_account_id'), user_id=user_id).first()
+        if not broker_account:
+            return jsonify({'error': 'Broker account not found'}), 404
+        
+        order_data = values
+        
+        result = place_order(broker_account, order_data)
+        if not result['success']:
+            return jsonify({'error': 'Order rejected', 'details': result['error']}), 502
+        
+        return jsonify({
+            'message': 'Order placed successfully',
+            'order': result['order'].to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to place order', 'details': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+from datetime import datetime, timedelta
+
+from src.models.user import db, AccountSnapshot
+
+# Rollup width in seconds
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Days each rollup is kept; None keeps it forever
+DEFAULT_RETENTION_DAYS = {'1m': 2, '1h': 90, '1d': None}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(moment, resolution):
+    """Start of the ``resolution`` bucket containing the naive-UTC ``moment``"""
+    seconds = RESOLUTIONS[resolution]
+    elapsed = int((moment - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def retention_days():
+    """Retention per rollup, overridable with ``SNAPSHOT_RETENTION_DAYS=1m:2,1h:90,1d:0`` (0 keeps forever)"""
+    retention = dict(DEFAULT_RETENTION_DAYS)
+    for item in filter(None, os.environ.get('SNAPSHOT_RETENTION_DAYS', '').split(',')):
+        resolution, _, days = item.partition(':')
+        if resolution.strip() in RESOLUTIONS:
+            retention[resolution.strip()] = int(days) or None
+    return retention
+
+
+def record_snapshots(accounts, now=None):
+    """Fold the accounts' current balances into their minute, hour and day rollups.
+
+    Adds to the caller's session without committing, so sync writes the
+    snapshot in the same transaction as the balances it samples. Each call
+    touches at most one row per account and resolution.
+    """
+    accounts = [account for account in accounts if account.equity is not None or account.balance is not None]
+    if not accounts:
+        return
+    now = now or datetime.utcnow()
+    db.session.flush()  # assign ids to accounts created by this sync
+
+    buckets = {resolution: bucket_start(now, resolution) for resolution in RESOLUTIONS}
+    existing = {}
+    rows = AccountSnapshot.query.filter(
+        AccountSnapshot.broker_account_id.in_([account.id for account in accounts]),
+        db.or_(*(
+            db.and_(AccountSnapshot.resolution == resolution, AccountSnapshot.bucket_start == start)
+            for resolution, start in buckets.items()
+        ))
+    ).all()
+    for row in rows:
+        existing[(row.broker_account_id, row.resolution)] = row
+
+    for account in accounts:
+        equity = account.equity if account.equity is not None else account.balance
+        margin_used = account.margin_used or 0
+        for resolution, start in buckets.items():
+            row = existing.get((account.id, resolution))
+            if row is None:
+                db.session.add(AccountSnapshot(
+                    broker_account_id=account.id,
+                    resolution=resolution,
+                    bucket_start=start,
+                    balance=account.balance,
+                    equity_open=equity,
+                    equity_high=equity,
+                    equity_low=equity,
+                    equity=equity,
+                    margin_used=margin_used,
+                    margin_used_max=margin_used,
+                    samples=1
+                ))
+                continue
+            row.balance = account.balance
+            row.equity = equity
+            row.equity_high = max(row.equity_high, equity)
+            row.equity_low = min(row.equity_low, equity)
+            row.margin_used = margin_used
+            row.margin_used_max = max(row.margin_used_max or 0, margin_used)
+            row.samples = (row.samples or 0) + 1
+
+
+def prune_snapshots(now=None):
+    """Delete rollups past their retention; returns rows deleted per resolution"""
+    now = now or datetime.utcnow()
+    deleted = {}
+    for resolution, days in retention_days().items():
+        if days is None:
+            continue
+        deleted[resolution] = AccountSnapshot.query.filter(
+            AccountSnapshot.resolution == resolution,
+            AccountSnapshot.bucket_start < now - timedelta(days=days)
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def equity_curve(broker_account_id, resolution='1h', start=None, end=None):
+    """Precomputed snapshot series for one account, oldest first"""
+    query = AccountSnapshot.query.filter_by(broker_account_id=broker_account_id, resolution=resolution)
+    if start is not None:
+        query = query.filter(AccountSnapshot.bucket_start >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.filter(AccountSnapshot.bucket_start < end)
+    return [row.to_dict() for row in query.order_by(AccountSnapshot.bucket_start).all()]
@@ -0,0 +1,232 @@
+import hashlib
+import os
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+from src.models.user import db, BrokerAccount, Order, Position
+from src.services.account_snapshots import record_snapshots
+from src.services.broker_registry import load_credentials
+from src.services.order_service import notify_fills, record_fill
+
+ACCOUNT_FIELDS = ('balance', 'equity', 'margin_used', 'margin_available')
+
+# Longest a sync waits for the write buffer to commit its results
+SYNC_WRITE_TIMEOUT = float(os.environ.get('SYNC_WRITE_TIMEOUT', '30'))
+
+# Marks fingerprints made by the current scheme; others are recomputed
+FINGERPRINT_PREFIX = 'u1:'
+
+
+def login_fingerprint(broker_type, credentials):
+    """Identify a broker login by broker type and username.
+
+    A password or API secret change keeps the fingerprint, so reconnecting
+    finds the login's existing accounts. Token-only logins (TopStep) have
+    no username and are identified by their token.
+    """
+    identity = credentials.get('username') or credentials.get('api_token') or ''
+    digest = hashlib.sha256(f'{broker_type}:{identity}'.encode()).hexdigest()[:16]
+    return FINGERPRINT_PREFIX + digest
+
+
+def login_accounts(user_id, broker_type, credentials):
+    """Stored accounts of a user that belong to the login these credentials sign in as.
+
+    Rows without a current fingerprint (created before fingerprints or
+    under an older scheme) are fingerprinted from their stored
+    credentials on the way.
+    """
+    fingerprint = login_fingerprint(broker_type, credentials)
+    accounts = []
+    candidates = BrokerAccount.query.filter_by(
+        user_id=user_id, broker_type=broker_type
+    ).order_by(BrokerAccount.id).all()
+    for candidate in candidates:
+        if not (candidate.credential_fingerprint or '').startswith(FINGERPRINT_PREFIX):
+            try:
+                candidate.credential_fingerprint = login_fingerprint(broker_type, load_credentials(candidate))
+            except Exception:
+                continue
+        if candidate.credential_fingerprint == fingerprint:
+            accounts.append(candidate)
+    return accounts
+
+
+def credential_accounts(broker_account, credentials):
+    """Stored accounts of the same user and broker that share this login.
+
+    The requested account comes first.
+    """
+    if not (broker_account.credential_fingerprint or '').startswith(FINGERPRINT_PREFIX):
+        broker_account.credential_fingerprint = login_fingerprint(broker_account.broker_type, credentials)
+    accounts = login_accounts(broker_account.user_id, broker_account.broker_type, credentials)
+    if broker_account not in accounts:
+        accounts.append(broker_account)
+    accounts.sort(key=lambda account: account.id != broker_account.id)
+    return accounts
+
+
+def stage_sync(broker_account, credentials, remote_accounts, positions, orders, now=None):
+    """Add one credential's accounts, positions and orders to the session.
+
+    ``remote_accounts``, ``positions`` and ``orders`` are the broker's list
+    responses normalised by the service: accounts carry ``account_id``,
+    ``account_name`` and balance fields; positions carry ``account_id``,
+    ``symbol``, signed ``net_quantity`` and prices; orders carry
+    ``account_id`` plus the fields returned to clients, and fills of
+    orders placed here are recorded on their Order rows. Remote accounts are
+    matched to stored rows by broker account id; placeholders created on
+    connect (no broker account id yet) adopt unmatched remote accounts in
+    order, and any remaining remote accounts get new rows. Stored rows the
+    broker no longer lists are left alone, never re-pointed at another
+    account. Items without an ``account_id`` belong to ``broker_account``.
+
+    Nothing is committed, so several syncs can share one transaction.
+    Returns ``{row: {'positions': [...], 'orders': [...]}}`` and the synced
+    rows.
+    """
+    stored = credential_accounts(broker_account, credentials)
+    by_remote_id = {account.broker_account_id: account for account in stored if account.broker_account_id}
+    unmatched = [account for account in stored if not account.broker_account_id]
+
+    rows = {}
+    for remote in remote_accounts:
+        account = by_remote_id.get(remote['account_id'])
+        if account is None and unmatched:
+            account = unmatched.pop(0)
+            account.broker_account_id = remote['account_id']
+        if account is None:
+            account = BrokerAccount(
+                user_id=broker_account.user_id,
+                broker_type=broker_account.broker_type,
+                broker_account_id=remote['account_id'],
+                api_credentials=broker_account.api_credentials,
+                credential_fingerprint=broker_account.credential_fingerprint
+            )
+            db.session.add(account)
+        if remote.get('account_name'):
+            account.account_name = remote['account_name']
+        for field in ACCOUNT_FIELDS:
+            if remote.get(field) is not None:
+                setattr(account, field, remote[field])
+        rows[remote['account_id']] = account
+
+    synced = list(rows.values()) or [broker_account]
+    default = rows.get(broker_account.broker_account_id, broker_account)
+
+    # One query for every existing position instead of one per remote position
+    existing = {}
+    account_ids = [account.id for account in synced if account.id is not None]
+    if account_ids:
+        for position in Position.query.filter(Position.broker_account_id.in_(account_ids)).all():
+            existing[(position.broker_account_id, position.symbol)] = position
+
+    now = now or datetime.utcnow()
+    results = {}
+    for pos_data in positions:
+        net_quantity = pos_data.get('net_quantity', 0)
+        if not net_quantity:  # Only active positions
+            continue
+        account = rows.get(pos_data.get('account_id'), default)
+        side = 'long' if net_quantity > 0 else 'short'
+        position = existing.get((account.id, pos_data['symbol'])) if account.id is not None else None
+        if position:
+            position.quantity = abs(net_quantity)
+            position.side = side
+            position.current_price = pos_data.get('current_price', 0)
+            position.unrealized_pnl = pos_data.get('unrealized_pnl', 0)
+            position.updated_at = now
+        else:
+            db.session.add(Position(
+                broker_account=account,
+                symbol=pos_data['symbol'],
+                side=side,
+                quantity=abs(net_quantity),
+                entry_price=pos_data.get('entry_price', 0),
+                current_price=pos_data.get('current_price', 0),
+                unrealized_pnl=pos_data.get('unrealized_pnl', 0),
+                opened_at=now
+            ))
+        results.setdefault(account, {'positions': [], 'orders': []})['positions'].append({
+            'symbol': pos_data['symbol'],
+            'side': side,
+            'quantity': abs(net_quantity),
+            'unrealized_pnl': pos_data.get('unrealized_pnl', 0)
+        })
+
+    for order_data in orders:
+        account = rows.get(order_data.get('account_id'), default)
+        order = {key: value for key, value in order_data.items() if key != 'account_id'}
+        results.setdefault(account, {'positions': [], 'orders': []})['orders'].append(order)
+
+    record_remote_fills(account_ids, orders)
+
+    for account in synced:
+        account.last_sync = now
+    record_snapshots(synced, now)
+    return results, synced
+
+
+def record_remote_fills(account_ids, orders):
+    """Record fills the broker reports for orders we placed (strategies are told after commit)"""
+    filled = {str(order['id']): order for order in orders
+              if order.get('status') == 'filled' and order.get('id') is not None}
+    if not filled or not account_ids:
+        return
+    for order in Order.query.filter(Order.broker_account_id.in_(account_ids),
+                                    Order.broker_order_id.in_(list(filled))).all():
+        remote = filled[order.broker_order_id]
+        record_fill(order, remote.get('filled_quantity') or remote.get('quantity'),
+                    remote.get('filled_price') or remote.get('price'))
+
+
+def refresh_valuations(accounts):
+    """Apply committed position changes to in-memory valuations now rather than at the engine's next pass"""
+    from src.services.mark_to_market import get_mark_to_market_engine
+    get_mark_to_market_engine().poll_positions()
+
+
+def apply_sync(broker_account, credentials, remote_accounts, positions, orders):
+    """Stage and commit one sync on its own; returns the ``sync_result`` data"""
+    results, synced = stage_sync(broker_account, credentials, remote_accounts, positions, orders)
+    db.session.flush()
+    data = sync_result(broker_account, results, synced)
+    db.session.commit()
+    refresh_valuations(synced)
+    notify_fills()
+    return data
+
+
+def sync_accounts(broker_account, credentials, remote_accounts, positions, orders):
+    """Write a sync's results, batched with concurrent syncs unless ``SYNC_WRITE_BUFFER=off``.
+
+    Returns the ``data`` payload of the sync for ``broker_account``.
+    """
+    from src.services.sync_writer import get_sync_writer
+    writer = get_sync_writer()
+    if writer is None:
+        return apply_sync(broker_account, credentials, remote_accounts, positions, orders)
+    # Release this session's connection so the flush is not blocked by it
+    account_id = broker_account.id
+    db.session.rollback()
+    future = writer.submit(account_id, credentials, remote_accounts, positions, orders)
+    try:
+        data = future.result(timeout=SYNC_WRITE_TIMEOUT)
+    except FutureTimeout:
+        raise TimeoutError(f'Sync results not written within {SYNC_WRITE_TIMEOUT:g}s') from None
+    db.session.expire_all()
+    return data
+
+
+def sync_result(broker_account, results, synced):
+    """The ``data`` payload of a sync for the requested account (needs flushed rows)"""
+    data = results.get(broker_account, {'positions': [], 'orders': []})
+    return {
+        'account': {
+            field: float(getattr(broker_account, field)) if getattr(broker_account, field) else 0
+            for field in ACCOUNT_FIELDS
+        },
+        'positions': data['positions'],
+        'orders': data['orders'],
+        'accounts': [account.to_dict() for account in synced]
+    }
@@ -0,0 +1,335 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.services.contract_catalog import get_contract_catalog
+from src.services.market_data_store import NS_PER_SECOND, NS_PER_DAY, get_tick_store
+from src.services.strategies import create_strategy, parse_config
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def store_bar_chunks(symbols, start=None, end=None, interval_seconds=60, store=None):
+    """Yield ``{symbol: bars}`` one UTC day at a time from the tick store"""
+    store = store or get_tick_store()
+    days = sorted(set(day for symbol in symbols for day in store.days(symbol)))
+    for day in days:
+        day_start = int(datetime.strptime(day, '%Y%m%d').replace(tzinfo=timezone.utc).timestamp()) * NS_PER_SECOND
+        lo = max(day_start, start) if start is not None else day_start
+        hi = min(day_start + NS_PER_DAY, end) if end is not None else day_start + NS_PER_DAY
+        if lo >= hi:
+            continue
+        chunk = {}
+        for symbol in symbols:
+            bars = store.bars(symbol, interval_seconds, lo, hi)
+            if len(bars['ts']):
+                chunk[symbol] = bars
+        if chunk:
+            yield chunk
+
+
+def merged_store_bars(symbols, start=None, end=None, interval_seconds=60, store=None):
+    """``{symbol: bars}`` over the whole range, as one data set for a sweep"""
+    parts = {}
+    for chunk in store_bar_chunks(symbols, start, end, interval_seconds, store):
+        for symbol, chunk_bars in chunk.items():
+            parts.setdefault(symbol, []).append(chunk_bars)
+    return {
+        symbol: {name: np.concatenate([part[name] for part in chunks]) for name in chunks[0]}
+        for symbol, chunks in parts.items()
+    }
+
+
+def replay_bars(chunks):
+    """Merge per-symbol bar arrays into one time-ordered stream of bar events"""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        symbols = list(chunk)
+        ts = np.concatenate([chunk[symbol]['ts'] for symbol in symbols])
+        owner = np.concatenate([np.full(len(chunk[symbol]['ts']), index) for index, symbol in enumerate(symbols)])
+        fields = {name: np.concatenate([chunk[symbol][name] for symbol in symbols]) for name in BAR_FIELDS}
+        order = np.argsort(ts, kind='stable')
+
+        # Convert to Python lists once; indexing NumPy scalars per bar is slow
+        ts = ts[order].tolist()
+        owner = owner[order].tolist()
+        columns = [fields[name][order].tolist() for name in BAR_FIELDS]
+        for i, (bar_ts, index) in enumerate(zip(ts, owner)):
+            yield {
+                'type': 'bar',
+                'symbol': symbols[index],
+                'ts': bar_ts,
+                'open': columns[0][i],
+                'high': columns[1][i],
+                'low': columns[2][i],
+                'close': columns[3][i],
+                'volume': columns[4][i],
+            }
+
+
+class SimulatedBroker:
+    """Fill model for backtests.
+
+    Orders decided on a bar are filled on the next bar of the same symbol:
+    market orders at its open, limit and stop orders when the bar trades
+    through the price. Market and stop fills pay ``slippage_ticks`` against
+    the order side. Commission is charged per contract.
+    """
+
+    def __init__(self, slippage_ticks=1, commission=0.0, catalog=None):
+        self.slippage_ticks = slippage_ticks
+        self.commission = commission
+        self.catalog = catalog or get_contract_catalog()
+        self.working = {}
+        self._specs = {}
+        self._next_order_id = 1
+
+    def spec(self, symbol):
+        spec = self._specs.get(symbol)
+        if spec is None:
+            catalog_spec = self.catalog.get(symbol)
+            spec = (catalog_spec.tick_size, catalog_spec.point_value) if catalog_spec else (0.0, 1.0)
+            self._specs[symbol] = spec
+        return spec
+
+    def submit(self, order):
+        order = dict(order, order_id=self._next_order_id)
+        self._next_order_id += 1
+        self.working.setdefault(order['symbol'], []).append(order)
+
+    def match(self, bar):
+        """Return fills for working orders on this bar's symbol"""
+        orders = self.working.get(bar['symbol'])
+        if not orders:
+            return []
+
+        tick_size = self.spec(bar['symbol'])[0]
+        slippage = self.slippage_ticks * tick_size
+        fills = []
+        remaining = []
+        for order in orders:
+            buy = order['side'] == 'buy'
+            order_type = order['order_type']
+            price = None
+            if order_type == 'market':
+                price = bar['open'] + (slippage if buy else -slippage)
+            elif order_type == 'limit':
+                limit = order['price']
+                if buy and bar['low'] <= limit:
+                    price = min(limit, bar['open'])
+                elif not buy and bar['high'] >= limit:
+                    price = max(limit, bar['open'])
+            elif order_type == 'stop':
+                stop = order['stop_price']
+                if buy and bar['high'] >= stop:
+                    price = max(stop, bar['open']) + slippage
+                elif not buy and bar['low'] <= stop:
+                    price = min(stop, bar['open']) - slippage
+
+            if price is None:
+                remaining.append(order)
+                continue
+            fills.append({
+                'type': 'fill',
+                'order_id': order['order_id'],
+                'symbol': order['symbol'],
+                'side': order['side'],
+                'quantity': order['quantity'],
+                'price': price,
+                'commission': self.commission * order['quantity'],
+                'ts': bar['ts'],
+            })
+
+        self.working[bar['symbol']] = remaining
+        return fills
+
+
+class Backtest:
+    """Replays bars through a strategy with the live ``Strategy`` interface"""
+
+    def __init__(self, strategy_config, initial_capital=100000.0, slippage_ticks=1,
+                 commission=0.0, catalog=None):
+        self.config = parse_config(strategy_config)
+        self.initial_capital = float(initial_capital)
+        self.broker = SimulatedBroker(slippage_ticks, commission, catalog)
+
+    def run(self, events):
+        strategy = create_strategy(self.config)
+        broker = self.broker
+
+        cash = self.initial_capital
+        positions = {}     # symbol -> signed quantity
+        avg_price = {}     # symbol -> average entry price
+        unrealized = {}    # symbol -> unrealized P&L at last close
+        unrealized_total = 0.0
+        trades = []
+        equity_ts = []
+        equity_values = []
+        last_ts = None
+
+        for bar in events:
+            symbol = bar['symbol']
+            if not strategy.wants(symbol):
+                continue
+
+            ts = bar['ts']
+            if ts != last_ts and last_ts is not None:
+                equity_ts.append(last_ts)
+                equity_values.append(cash + unrealized_total)
+            last_ts = ts
+
+            point_value = broker.spec(symbol)[1]
+
+            # Fill orders decided on earlier bars, then let the strategy react
+            for fill in broker.match(bar):
+                signed = fill['quantity'] if fill['side'] == 'buy' else -fill['quantity']
+                held = positions.get(symbol, 0)
+                entry = avg_price.get(symbol, 0.0)
+
+                if held and (held > 0) != (signed > 0):
+                    closed = min(abs(held), abs(signed))
+                    direction = 1 if held > 0 else -1
+                    cash += (fill['price'] - entry) * closed * direction * point_value
+                new_held = held + signed
+                if new_held == 0:
+                    avg_price.pop(symbol, None)
+                elif held == 0 or (held > 0) != (new_held > 0):
+                    avg_price[symbol] = fill['price']
+                elif (held > 0) == (signed > 0):
+                    avg_price[symbol] = (entry * abs(held) + fill['price'] * abs(signed)) / abs(new_held)
+                positions[symbol] = new_held
+                cash -= fill['commission']
+
+                trades.append(_trade_dict(len(trades) + 1, fill))
+                for order in strategy.handle(fill):
+                    broker.submit(order)
+
+            for order in strategy.handle(bar):
+                broker.submit(order)
+
+            # Incrementally re-mark this symbol
+            close = bar['close']
+            held = positions.get(symbol, 0)
+            value = (close - avg_price[symbol]) * held * point_value if held else 0.0
+            unrealized_total += value - unrealized.get(symbol, 0.0)
+            unrealized[symbol] = value
+
+        if last_ts is not None:
+            equity_ts.append(last_ts)
+            equity_values.append(cash + unrealized_total)
+
+        return BacktestResult(self.initial_capital, trades, np.asarray(equity_ts, dtype=np.int64),
+                              np.asarray(equity_values, dtype=np.float64), positions)
+
+
+class BacktestResult:
+    def __init__(self, initial_capital, trades, equity_ts, equity, positions):
+        self.initial_capital = initial_capital
+        self.trades = trades
+        self.equity_ts = equity_ts
+        self.equity = equity
+        self.positions = positions
+
+    def summary(self):
+        equity = self.equity
+        if len(equity):
+            peaks = np.maximum.accumulate(equity)
+            max_drawdown = float((peaks - equity).max())
+            final_equity = float(equity[-1])
+        else:
+            max_drawdown = 0.0
+            final_equity = self.initial_capital
+        return {
+            'initial_capital': self.initial_capital,
+            'final_equity': final_equity,
+            'net_pnl': final_equity - self.initial_capital,
+            'max_drawdown': max_drawdown,
+            'trade_count': len(self.trades),
+            'commission': sum(trade['commission'] or 0 for trade in self.trades),
+            'open_positions': {symbol: qty for symbol, qty in self.positions.items() if qty}
+        }
+
+    def equity_curve(self, max_points=1000):
+        """Equity curve as dicts, evenly downsampled to at most ``max_points``"""
+        count = len(self.equity)
+        step = max(1, -(-count // max_points))
+        indexes = list(range(0, count, step))
+        if count and indexes[-1] != count - 1:
+            indexes.append(count - 1)
+        return [
+            {'ts': _iso(int(self.equity_ts[i])), 'equity': float(self.equity[i])}
+            for i in indexes
+        ]
+
+    def to_dict(self, max_points=1000):
+        return {
+            'summary': self.summary(),
+            'trades': self.trades,
+            'equity_curve': self.equity_curve(max_points)
+        }
+
+
+def _iso(ts_ns):
+    return datetime.fromtimestamp(ts_ns / NS_PER_SECOND, tz=timezone.utc).isoformat()
+
+
+def _trade_dict(trade_id, fill):
+    """Shape a simulated fill like ``Trade.to_dict``"""
+    return {
+        'id': trade_id,
+        'order_id': fill['order_id'],
+        'symbol': fill['symbol'],
+        'side': fill['side'],
+        'quantity': fill['quantity'],
+        'price': fill['price'],
+        'commission': fill['commission'],
+        'executed_at': _iso(fill['ts']),
+        'created_at': None
+    }
+
+
+# Parameter sweeps
+
+_sweep_bars = None
+
+
+def _init_sweep_worker(bars):
+    global _sweep_bars
+    _sweep_bars = bars
+
+
+def _run_sweep_case(args):
+    strategy_config, params, options = args
+    config = dict(strategy_config, params=dict(strategy_config.get('params', {}), **params))
+    result = Backtest(config, **options).run(replay_bars([_sweep_bars]))
+    return {'params': params, 'summary': result.summary()}
+
+
+def parameter_grid(grid):
+    """Expand ``{'fast': [5, 10], 'slow': [20, 30]}`` into a list of param dicts"""
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError('param_grid must map parameter names to lists of values')
+    for name, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f'param_grid {name!r} must be a non-empty list')
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_sweep(strategy_config, param_grid, bars, max_workers=None, **options):
+    """Backtest every parameter combination across a process pool.
+
+    ``bars`` is a ``{symbol: bar arrays}`` dict; it is shipped to each worker
+    once through the pool initializer rather than with every case.
+    """
+    config = parse_config(strategy_config)
+    cases = [(config, params, options) for params in parameter_grid(param_grid)]
+    max_workers = max_workers or min(len(cases), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker,
+                             initargs=(bars,)) as executor:
+        results = list(executor.map(_run_sweep_case, cases))
+    return sorted(results, key=lambda result: result['summary']['net_pnl'], reverse=True)
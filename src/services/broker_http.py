@@ -0,0 +1,98 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from src.services.circuit_breaker import get_circuit_breaker
+from src.services.rate_limiter import (
+    PRIORITY_NAMES, RateLimitTimeout, current_call, get_scheduler, queue_wait, throttled
+)
+from src.utils.metrics import observe_broker_call
+
+DEFAULT_RETRY_AFTER = 1.0
+# Fail unreachable hosts quickly; cap reads so one hung call cannot hold a worker for long
+CONNECT_TIMEOUT = float(os.environ.get('BROKER_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.environ.get('BROKER_READ_TIMEOUT', '10'))
+# Threads shared by every parallel() call in this process
+PARALLEL_WORKERS = int(os.environ.get('BROKER_PARALLEL_WORKERS', '8'))
+
+_parallel_pool = None
+_parallel_pool_lock = threading.Lock()
+
+
+def _retry_after(response):
+    try:
+        return max(float(response.headers.get('Retry-After', DEFAULT_RETRY_AFTER)), 0.0)
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+def _timeout(requested):
+    if isinstance(requested, tuple):
+        requested = requested[-1]
+    read = min(requested, READ_TIMEOUT) if requested else READ_TIMEOUT
+    return (CONNECT_TIMEOUT, read)
+
+
+def broker_request(broker, endpoint, method, url, **kwargs):
+    """Send an HTTP request to a broker API and record its latency and outcome.
+
+    ``endpoint`` is a low-cardinality label such as ``'order/placeorder'``;
+    never pass ids or query strings in it. The call fails fast with
+    ``CircuitOpenError`` while the endpoint's circuit is open, then waits for
+    a rate limit token at the priority and credential set by ``@broker_call``.
+    """
+    breaker = get_circuit_breaker(broker, endpoint)
+    breaker.before_call()
+
+    scheduler = get_scheduler(broker)
+    priority, credential = current_call()
+    if scheduler is not None:
+        try:
+            waited = scheduler.acquire(priority, credential)
+        except RateLimitTimeout:
+            breaker.cancel()
+            raise
+        queue_wait.observe(waited, broker=broker, priority=PRIORITY_NAMES[priority])
+
+    kwargs['timeout'] = _timeout(kwargs.get('timeout'))
+    started = time.perf_counter()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except Exception as e:
+        breaker.record(False, time.perf_counter() - started)
+        observe_broker_call(broker, method, endpoint, started, error=e)
+        raise
+    breaker.record(response.status_code < 500, time.perf_counter() - started)
+    observe_broker_call(broker, method, endpoint, started, status=response.status_code)
+
+    if response.status_code == 429:
+        throttled.inc(broker=broker)
+        if scheduler is not None:
+            scheduler.penalize(credential, _retry_after(response))
+    return response
+
+
+def parallel(*calls):
+    """Run independent broker calls concurrently and return their results in order.
+
+    Each call runs in a copy of the caller's context, so the priority and
+    credential set by ``@broker_call`` still schedule its requests. The
+    first call runs on the calling thread; if any call raises, the first
+    exception is re-raised once all of them have finished.
+    """
+    global _parallel_pool
+    if _parallel_pool is None:
+        with _parallel_pool_lock:
+            if _parallel_pool is None:
+                _parallel_pool = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS,
+                                                    thread_name_prefix='broker-parallel')
+    futures = [_parallel_pool.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    try:
+        first = calls[0]()
+    finally:
+        wait(futures)
+    return [first] + [future.result() for future in futures]
@@ -0,0 +1,28 @@
+import importlib
+import json
+from src.utils.encryption import decrypt_data
+
+# Adapters are imported on first use so app startup does not pay for them
+BROKER_SERVICES = {
+    'tradovate': 'src.services.tradovate_service:TradovateService',
+    'topstep': 'src.services.topstep_service:TopStepService',
+}
+
+_services = {}
+
+
+def get_broker_service(broker_type):
+    """Shared service instance for a broker type"""
+    if broker_type not in BROKER_SERVICES:
+        raise ValueError(f'Unsupported broker type: {broker_type}')
+    service = _services.get(broker_type)
+    if service is None:
+        module_name, class_name = BROKER_SERVICES[broker_type].split(':')
+        service_class = getattr(importlib.import_module(module_name), class_name)
+        service = _services[broker_type] = service_class()
+    return service
+
+
+def load_credentials(broker_account):
+    """Decrypt the stored API credentials of a broker account"""
+    return json.loads(decrypt_data(broker_account.api_credentials))
@@ -0,0 +1,51 @@
+from sqlalchemy import func
+
+from src.models.journal import truncated_through
+from src.models.user import db, ChangeJournal
+
+
+def current_cursor():
+    """Cursor of the newest journaled change (0 for an empty journal)"""
+    return db.session.query(func.coalesce(func.max(ChangeJournal.id), 0)).scalar()
+
+
+def changes_since(model, account_ids, since, ignore_ops=()):
+    """Rows of ``model`` changed for the accounts after cursor ``since``.
+
+    Returns ``None`` when ``since`` is older than the retained journal and
+    the client must refetch everything. Otherwise returns ``(cursor,
+    upserted, deleted, reset_accounts)``: current rows to insert or replace,
+    ids to remove, and accounts changed wholesale (bulk writes) whose rows
+    should be replaced by the ones in ``upserted``. Clients pass ``cursor``
+    as ``since`` next time. Entries whose op is in ``ignore_ops`` are
+    skipped, e.g. ``('mark',)`` for a reader that only cares about quantities.
+    """
+    cursor = current_cursor()
+    if since < truncated_through(db.session.connection()):
+        return None
+    if not account_ids or since >= cursor:
+        return cursor, [], [], []
+
+    query = db.session.query(ChangeJournal.row_id, ChangeJournal.broker_account_id).filter(
+        ChangeJournal.table_name == model.__tablename__,
+        ChangeJournal.broker_account_id.in_(account_ids),
+        ChangeJournal.id > since,
+        ChangeJournal.id <= cursor
+    )
+    if ignore_ops:
+        query = query.filter(ChangeJournal.op.not_in(list(ignore_ops)))
+    entries = query.all()
+    row_ids = {row_id for row_id, _ in entries if row_id is not None}
+    reset_accounts = sorted({account_id for row_id, account_id in entries if row_id is None})
+
+    upserted = []
+    if row_ids:
+        upserted = model.query.filter(model.id.in_(row_ids), model.broker_account_id.in_(account_ids)).all()
+    if reset_accounts:
+        seen = {row.id for row in upserted}
+        upserted += [row for row in model.query.filter(model.broker_account_id.in_(reset_accounts)).all()
+                     if row.id not in seen]
+    # Whatever changed and no longer exists was deleted (or archived)
+    deleted = sorted(row_ids - {row.id for row in upserted})
+    upserted.sort(key=lambda row: row.id)
+    return cursor, upserted, deleted, reset_accounts
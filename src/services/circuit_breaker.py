@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+
+from src.utils.metrics import registry
+
+CLOSED = 0
+OPEN = 1
+HALF_OPEN = 2
+STATE_NAMES = {CLOSED: 'closed', OPEN: 'open', HALF_OPEN: 'half_open'}
+
+circuit_state = registry.gauge(
+    'broker_circuit_state', 'Circuit breaker state per broker endpoint (0 closed, 1 open, 2 half-open)',
+    ('broker', 'endpoint'))
+circuit_rejections = registry.counter(
+    'broker_circuit_rejections_total', 'Broker calls failed fast because the circuit was open',
+    ('broker', 'endpoint'))
+
+
+class CircuitOpenError(Exception):
+    """A broker endpoint is failing; the call was rejected without being sent"""
+
+    def __init__(self, broker, endpoint, retry_after):
+        super().__init__(f'{broker} {endpoint} is unavailable; retry in {retry_after:.0f}s')
+        self.broker = broker
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one broker endpoint.
+
+    Errors, 5xx responses and calls slower than ``slow_call_seconds`` count
+    as failures. After ``failure_threshold`` in a row the circuit opens and
+    calls fail fast for ``reset_timeout`` seconds; then up to
+    ``half_open_calls`` probes are let through, and the first result decides
+    whether the circuit closes or opens again.
+    """
+
+    def __init__(self, broker, endpoint, failure_threshold=5, slow_call_seconds=5.0,
+                 reset_timeout=30.0, half_open_calls=1):
+        self.broker = broker
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        circuit_state.set(CLOSED, broker=broker, endpoint=endpoint)
+
+    def _set_state(self, state):
+        self.state = state
+        circuit_state.set(state, broker=self.broker, endpoint=self.endpoint)
+
+    def before_call(self):
+        """Admit a call or raise ``CircuitOpenError``"""
+        with self._lock:
+            if self.state == OPEN:
+                retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+                if retry_after > 0:
+                    circuit_rejections.inc(broker=self.broker, endpoint=self.endpoint)
+                    raise CircuitOpenError(self.broker, self.endpoint, retry_after)
+                self._set_state(HALF_OPEN)
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    circuit_rejections.inc(broker=self.broker, endpoint=self.endpoint)
+                    raise CircuitOpenError(self.broker, self.endpoint, 1.0)
+                self._probes += 1
+
+    def cancel(self):
+        """Release an admitted call that was never sent"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record(self, success, elapsed):
+        with self._lock:
+            failed = not success or elapsed > self.slow_call_seconds
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open()
+                else:
+                    self.failures = 0
+                    self._set_state(CLOSED)
+                return
+            if not failed:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(broker, endpoint):
+    """Breaker for one broker endpoint, configured from ``BROKER_CIRCUIT_*``"""
+    breaker = _breakers.get((broker, endpoint))
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get((broker, endpoint))
+            if breaker is None:
+                breaker = _breakers[(broker, endpoint)] = CircuitBreaker(
+                    broker, endpoint,
+                    failure_threshold=int(os.environ.get('BROKER_CIRCUIT_FAILURES', '5')),
+                    slow_call_seconds=float(os.environ.get('BROKER_CIRCUIT_SLOW_SECONDS', '5')),
+                    reset_timeout=float(os.environ.get('BROKER_CIRCUIT_RESET_SECONDS', '30'))
+                )
+    return breaker
+
@@ -0,0 +1,327 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+# Month codes used in futures symbols, e.g. ESZ6 -> December
+MONTH_CODES = {
+    'F': 1, 'G': 2, 'H': 3, 'J': 4, 'K': 5, 'M': 6,
+    'N': 7, 'Q': 8, 'U': 9, 'V': 10, 'X': 11, 'Z': 12,
+}
+
+# Default specs for the products our users trade, keyed by root symbol.
+# Broker data overrides these once a refresh has run.
+DEFAULT_PRODUCTS = {
+    'ES': {'tick_size': 0.25, 'point_value': 50.0, 'exchange': 'CME'},
+    'MES': {'tick_size': 0.25, 'point_value': 5.0, 'exchange': 'CME'},
+    'NQ': {'tick_size': 0.25, 'point_value': 20.0, 'exchange': 'CME'},
+    'MNQ': {'tick_size': 0.25, 'point_value': 2.0, 'exchange': 'CME'},
+    'RTY': {'tick_size': 0.1, 'point_value': 50.0, 'exchange': 'CME'},
+    'M2K': {'tick_size': 0.1, 'point_value': 5.0, 'exchange': 'CME'},
+    'YM': {'tick_size': 1.0, 'point_value': 5.0, 'exchange': 'CBOT'},
+    'MYM': {'tick_size': 1.0, 'point_value': 0.5, 'exchange': 'CBOT'},
+    'ZB': {'tick_size': 0.03125, 'point_value': 1000.0, 'exchange': 'CBOT'},
+    'ZN': {'tick_size': 0.015625, 'point_value': 1000.0, 'exchange': 'CBOT'},
+    'CL': {'tick_size': 0.01, 'point_value': 1000.0, 'exchange': 'NYMEX'},
+    'MCL': {'tick_size': 0.01, 'point_value': 100.0, 'exchange': 'NYMEX'},
+    'NG': {'tick_size': 0.001, 'point_value': 10000.0, 'exchange': 'NYMEX'},
+    'GC': {'tick_size': 0.1, 'point_value': 100.0, 'exchange': 'COMEX'},
+    'MGC': {'tick_size': 0.1, 'point_value': 10.0, 'exchange': 'COMEX'},
+    'SI': {'tick_size': 0.005, 'point_value': 5000.0, 'exchange': 'COMEX'},
+    '6E': {'tick_size': 0.00005, 'point_value': 125000.0, 'exchange': 'CME'},
+}
+
+# Refresh this many days before a contract expires so roll data is in place
+ROLL_LEAD_DAYS = 8
+# How often lookups check for a due refresh or a snapshot written by another process
+CHECK_SECONDS = float(os.environ.get('CONTRACT_CHECK_SECONDS', '3600'))
+
+_SYMBOL_PATTERN = re.compile(r'^(?P<root>[A-Z0-9]+?)(?P<month>[FGHJKMNQUVXZ])(?P<year>\d{1,2})$')
+
+
+class ContractSpec:
+    """Static trading specification of a single futures contract"""
+
+    __slots__ = ('symbol', 'root', 'tick_size', 'point_value', 'expiry', 'exchange')
+
+    def __init__(self, symbol, root, tick_size, point_value, expiry=None, exchange=None):
+        self.symbol = symbol
+        self.root = root
+        self.tick_size = float(tick_size)
+        self.point_value = float(point_value)
+        self.expiry = expiry
+        self.exchange = exchange
+
+    @property
+    def tick_value(self):
+        return self.tick_size * self.point_value
+
+    def __repr__(self):
+        return f'<ContractSpec {self.symbol} tick={self.tick_size} pv={self.point_value}>'
+
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'root': self.root,
+            'tick_size': self.tick_size,
+            'point_value': self.point_value,
+            'tick_value': self.tick_value,
+            'expiry': self.expiry.isoformat() if self.expiry else None,
+            'exchange': self.exchange
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        expiry = data.get('expiry')
+        return cls(
+            symbol=data['symbol'],
+            root=data.get('root') or data['symbol'],
+            tick_size=data['tick_size'],
+            point_value=data['point_value'],
+            expiry=date.fromisoformat(expiry[:10]) if expiry else None,
+            exchange=data.get('exchange')
+        )
+
+
+def parse_symbol(symbol, today=None):
+    """Split a contract symbol into ``(root, expiry month date)``.
+
+    The expiry is estimated as the third Friday of the contract month, which
+    is exact for the equity index products and close enough to schedule a
+    refresh for everything else. Returns ``(symbol, None)`` for symbols that
+    do not carry a month code.
+    """
+    match = _SYMBOL_PATTERN.match(symbol.upper())
+    if not match:
+        return symbol.upper(), None
+
+    today = today or date.today()
+    month = MONTH_CODES[match.group('month')]
+    year_digits = match.group('year')
+    if len(year_digits) == 2:
+        year = 2000 + int(year_digits)
+    else:
+        # Single digit years refer to the nearest decade that is not in the past
+        year = today.year - today.year % 10 + int(year_digits)
+        if year < today.year - 1:
+            year += 10
+
+    return match.group('root'), third_friday(year, month)
+
+
+def third_friday(year, month):
+    first = date(year, month, 1)
+    offset = (4 - first.weekday()) % 7
+    return first + timedelta(days=offset + 14)
+
+
+class ContractCatalog:
+    """In-memory contract catalog with an on-disk warm-start snapshot.
+
+    Lookups are plain dict hits. Unknown symbols fall back to the default
+    product table so P&L and validation work before the first broker
+    refresh. Every ``CHECK_SECONDS`` a lookup also reloads the snapshot if
+    another process rewrote it, and calls ``on_refresh_due`` once a refresh
+    is due ahead of the earliest expiry (or none has run yet).
+    """
+
+    def __init__(self, snapshot_path=None, on_refresh_due=None):
+        self.snapshot_path = snapshot_path or os.environ.get(
+            'CONTRACT_SNAPSHOT_PATH',
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'contracts.json')
+        )
+        self.on_refresh_due = on_refresh_due
+        self._specs = {}
+        self._lock = threading.Lock()
+        self.refreshed_at = None
+        self._refresh_thread = None
+        self._snapshot_mtime = None
+        self._checked_at = time.monotonic()
+
+    def load_snapshot(self):
+        """Load specs from the snapshot file, returning how many were loaded"""
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+            with open(self.snapshot_path) as handle:
+                snapshot = json.load(handle)
+        except (OSError, ValueError):
+            return 0
+        self._snapshot_mtime = mtime
+
+        specs = {}
+        for item in snapshot.get('contracts', []):
+            spec = ContractSpec.from_dict(item)
+            specs[spec.symbol] = spec
+        with self._lock:
+            self._specs.update(specs)
+        refreshed_at = snapshot.get('refreshed_at')
+        self.refreshed_at = datetime.fromisoformat(refreshed_at) if refreshed_at else None
+        return len(specs)
+
+    def save_snapshot(self):
+        """Write the current catalog to the snapshot file atomically"""
+        with self._lock:
+            contracts = [spec.to_dict() for spec in self._specs.values()]
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        temp_path = f'{self.snapshot_path}.tmp'
+        with open(temp_path, 'w') as handle:
+            json.dump({
+                'refreshed_at': self.refreshed_at.isoformat() if self.refreshed_at else None,
+                'contracts': contracts
+            }, handle)
+        os.replace(temp_path, self.snapshot_path)
+        self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+
+    def get(self, symbol):
+        """Look up the spec for a symbol, deriving it from defaults when unknown"""
+        if time.monotonic() - self._checked_at >= CHECK_SECONDS:
+            self.check()
+        spec = self._specs.get(symbol)
+        if spec is not None:
+            return spec
+
+        root, expiry = parse_symbol(symbol)
+        product = DEFAULT_PRODUCTS.get(root)
+        if product is None:
+            return None
+        spec = ContractSpec(symbol, root, product['tick_size'], product['point_value'],
+                            expiry=expiry, exchange=product['exchange'])
+        with self._lock:
+            self._specs.setdefault(symbol, spec)
+        return spec
+
+    def point_value(self, symbol):
+        """Dollar value of a one point move, 1.0 for unknown symbols"""
+        spec = self.get(symbol)
+        return spec.point_value if spec else 1.0
+
+    def validate_price(self, symbol, price):
+        """Check that a price sits on the contract's tick grid"""
+        spec = self.get(symbol)
+        if spec is None:
+            return False, f'Unknown contract: {symbol}'
+        ticks = float(price) / spec.tick_size
+        if abs(ticks - round(ticks)) > 1e-6:
+            return False, f'Price {price} is not a multiple of the {symbol} tick size {spec.tick_size}'
+        return True, 'Price is valid'
+
+    def update(self, specs):
+        """Merge broker-provided specs (ContractSpec or dicts) into the catalog"""
+        parsed = [spec if isinstance(spec, ContractSpec) else ContractSpec.from_dict(spec) for spec in specs]
+        with self._lock:
+            for spec in parsed:
+                self._specs[spec.symbol] = spec
+        return len(parsed)
+
+    def next_roll_date(self):
+        """Date of the next scheduled refresh, based on the earliest known expiry"""
+        today = date.today()
+        expiries = [spec.expiry for spec in list(self._specs.values()) if spec.expiry and spec.expiry >= today]
+        if not expiries:
+            return None
+        return min(expiries) - timedelta(days=ROLL_LEAD_DAYS)
+
+    def needs_refresh(self, today=None):
+        """Whether no refresh has run yet, or the next roll date has passed since the last one"""
+        today = today or date.today()
+        if self.refreshed_at is None:
+            return True
+        roll_date = self.next_roll_date()
+        return roll_date is not None and today >= roll_date and self.refreshed_at.date() < roll_date
+
+    def check(self):
+        """Pick up a snapshot written by another process and report a due refresh"""
+        self._checked_at = time.monotonic()
+        try:
+            changed = os.path.getmtime(self.snapshot_path) != self._snapshot_mtime
+        except OSError:
+            changed = False
+        if changed:
+            self.load_snapshot()
+        if self.on_refresh_due is not None and self.needs_refresh():
+            try:
+                self.on_refresh_due()
+            except Exception:
+                pass  # asked again at the next check
+
+    def refresh(self, loader):
+        """Reload specs with ``loader(symbols)`` and persist a new snapshot"""
+        symbols = sorted(self._specs)
+        specs = loader(symbols)
+        self.update(specs)
+        self.refreshed_at = datetime.utcnow()
+        self.save_snapshot()
+        return len(specs)
+
+    def refresh_in_background(self, loader):
+        """Run a refresh on a daemon thread so startup never waits on the broker"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return self._refresh_thread
+
+        def run():
+            try:
+                self.refresh(loader)
+            except Exception:
+                # Keep serving the snapshot; the next check retries
+                pass
+
+        self._refresh_thread = threading.Thread(target=run, name='contract-refresh', daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+
+def tradovate_loader(credentials):
+    """``refresh`` loader fetching specs with a Tradovate login"""
+    from src.services.broker_registry import get_broker_service
+    service = get_broker_service('tradovate')
+
+    def load(symbols):
+        result = service.get_contract_specs(credentials, symbols)
+        if not result['success']:
+            raise Exception(result['error'])
+        return result['contracts']
+
+    return load
+
+
+def _queue_refresh(app):
+    """``on_refresh_due`` for app processes: queue a ``refresh_contracts`` job off the caller's thread"""
+    def run():
+        from src.models.user import db
+        from src.services.job_queue import PRIORITIES, enqueue, run_in_thread, runner_configured
+        with app.app_context():
+            try:
+                job, created = enqueue('refresh_contracts', priority=PRIORITIES['low'], max_attempts=1)
+                if created and not runner_configured():
+                    run_in_thread(app, job)
+            except Exception:
+                pass
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='contract-refresh-queue', daemon=True).start()
+
+
+_catalog = None
+_refresh_app = None
+
+
+def init_contract_refresh(app):
+    """Have this process's catalog queue roll refreshes as jobs run with ``app``"""
+    global _refresh_app
+    _refresh_app = app
+    if _catalog is not None:
+        _catalog.on_refresh_due = lambda: _queue_refresh(app)
+
+
+def get_contract_catalog():
+    """Process-wide contract catalog, warm-started from the snapshot"""
+    global _catalog
+    if _catalog is None:
+        app = _refresh_app
+        _catalog = ContractCatalog(on_refresh_due=(lambda: _queue_refresh(app)) if app is not None else None)
+        _catalog.load_snapshot()
+        _catalog.check()
+    return _catalog
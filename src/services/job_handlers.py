@@ -0,0 +1,209 @@
+"""Background job handlers, run inside job worker processes.
+
+Each takes a ``JobContext`` and returns a JSON-serialisable result; raising
+marks the attempt failed and lets the runner retry it.
+"""
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import update
+
+from src.models.user import db, BrokerAccount, Job, Position
+
+
+class JobFailed(Exception):
+    """The job could not complete; the message is stored on the job"""
+
+
+def connect_account(context):
+    """Test a newly connected login and give every account behind it a row.
+
+    Runs the broker's connection test (its calls go out in parallel), then
+    stages the discovered accounts like a sync so the pending placeholder
+    adopts the first and the rest get rows of their own, all marked
+    active. Credentials given with the job (a reconnect) replace the
+    login's stored ones once the test passes. Positions and orders follow
+    in a queued sync. The job's payload is cleared once it finishes.
+    """
+    try:
+        return _connect_account(context)
+    finally:
+        # Connect jobs run once; do not keep the credentials they carried
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == context.job_id).values(payload=None))
+
+
+def _connect_account(context):
+    from flask import current_app
+    from src.services.account_sync import login_accounts, stage_sync
+    from src.services.broker_registry import get_broker_service, load_credentials
+    from src.services.job_queue import PRIORITIES, enqueue, run_in_thread, runner_configured
+    from src.utils.encryption import decrypt_data
+
+    broker_account = db.session.get(BrokerAccount, context.broker_account_id)
+    if broker_account is None:
+        raise JobFailed(f'Broker account {context.broker_account_id} not found')
+    encrypted = context.payload.get('credentials')
+    credentials = json.loads(decrypt_data(encrypted)) if encrypted else load_credentials(broker_account)
+    context.progress(0.1, 'Testing connection')
+    result = get_broker_service(broker_account.broker_type).test_connection(credentials)
+    remote_accounts = []
+    if result['success']:
+        remote_accounts = [account for account in result.get('accounts') or [result.get('account_info') or {}]
+                           if account.get('account_id')]
+        if not remote_accounts:
+            result = {'success': False, 'error': 'No accounts found for these credentials'}
+    if not result['success']:
+        broker_account.account_status = 'failed'
+        db.session.commit()
+        raise JobFailed(result['error'])
+
+    context.progress(0.6, f'Found {len(remote_accounts)} accounts')
+    if encrypted:
+        for account in login_accounts(broker_account.user_id, broker_account.broker_type, credentials):
+            account.api_credentials = encrypted
+        broker_account.api_credentials = encrypted
+    _, synced = stage_sync(broker_account, credentials, remote_accounts, [], [])
+    for account in synced:
+        account.account_status = 'active'
+    db.session.commit()
+
+    sync_job, _ = enqueue('sync', broker_account_id=broker_account.id, user_id=broker_account.user_id,
+                          priority=PRIORITIES['high'])
+    if not runner_configured():
+        run_in_thread(current_app._get_current_object(), sync_job)
+    return {
+        'accounts': [account.id for account in synced],
+        'sync_job_id': sync_job.id
+    }
+
+
+def sync_account(context):
+    from src.services.broker_registry import get_broker_service, load_credentials
+
+    broker_account = db.session.get(BrokerAccount, context.broker_account_id)
+    if broker_account is None:
+        raise JobFailed(f'Broker account {context.broker_account_id} not found')
+    context.progress(0.1, 'Fetching from broker')
+    service = get_broker_service(broker_account.broker_type)
+    result = service.sync_account_data(load_credentials(broker_account), broker_account)
+    if not result['success']:
+        raise JobFailed(result['error'])
+    data = result['data']
+    return {
+        'positions': len(data['positions']),
+        'orders': len(data['orders']),
+        'accounts': [account['id'] for account in data.get('accounts', [])]
+    }
+
+
+def archive_history(context):
+    from src.services.trade_archive import TradeArchive
+
+    context.progress(0.0, 'Archiving closed orders and trades')
+    return TradeArchive(horizon_days=context.payload.get('horizon_days')).archive()
+
+
+def prune_snapshots(context):
+    from src.services.account_snapshots import prune_snapshots as prune
+
+    return prune()
+
+
+def reencrypt_credentials(context):
+    """Re-encrypt every stored broker credential under the current ENCRYPTION_KEY.
+
+    Run after moving the old key to PREVIOUS_ENCRYPTION_KEY; rows are
+    committed in batches, so a retry picks up where a failed attempt left off.
+    """
+    from src.utils.encryption import reencrypt_data
+
+    batch_size = 200
+    total = BrokerAccount.query.count()
+    done = failed = 0
+    last_id = 0
+    while True:
+        accounts = BrokerAccount.query.filter(BrokerAccount.id > last_id).order_by(BrokerAccount.id) \
+            .limit(batch_size).all()
+        if not accounts:
+            break
+        for account in accounts:
+            try:
+                account.api_credentials = reencrypt_data(account.api_credentials)
+                done += 1
+            except Exception:
+                failed += 1
+        last_id = accounts[-1].id
+        db.session.commit()
+        context.progress((done + failed) / max(total, 1), f'Re-encrypted {done} of {total}')
+    if failed:
+        raise JobFailed(f'{failed} credentials could not be decrypted with either key')
+    return {'reencrypted': done}
+
+
+def backtest_sweep(context):
+    """Run a parameter sweep of a stored strategy too large to run in the request"""
+    from src.models.user import TradingStrategy
+    from src.services.backtest_engine import merged_store_bars, run_sweep
+    from src.services.strategies import parse_config
+
+    payload = context.payload
+    strategy = db.session.get(TradingStrategy, payload['strategy_id'])
+    if strategy is None or strategy.user_id != context.user_id:
+        raise JobFailed(f"Strategy {payload['strategy_id']} not found")
+    config = parse_config(strategy.strategy_config)
+    if payload.get('params'):
+        config['params'] = dict(config.get('params', {}), **payload['params'])
+
+    context.progress(0.1, 'Loading bars')
+    bars = merged_store_bars(payload['symbols'], payload.get('start'), payload.get('end'), payload['interval'])
+    context.progress(0.2, 'Running sweep')
+    return {'strategy_id': strategy.id, 'sweep': run_sweep(config, payload['param_grid'], bars, **payload['options'])}
+
+
+def export_history(context):
+    """Write a user's hot and archived orders or trades to a CSV file"""
+    from src.services.trade_archive import get_trade_archive, iter_csv
+
+    kind = context.payload.get('kind', 'trades')
+    start = context.payload.get('start')
+    end = context.payload.get('end')
+    account_ids = [row[0] for row in db.session.query(BrokerAccount.id).filter_by(user_id=context.user_id).all()]
+    context.progress(0.1, 'Reading history')
+    records = get_trade_archive().history(
+        kind, account_ids,
+        datetime.fromisoformat(start) if start else None,
+        datetime.fromisoformat(end) if end else None
+    )
+
+    directory = os.environ.get(
+        'EXPORT_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'exports'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'job-{context.job_id}-{kind}.csv')
+    context.progress(0.5, f'Writing {len(records)} rows')
+    with open(path, 'w', newline='') as handle:
+        handle.writelines(iter_csv(records))
+    return {'path': path, 'rows': len(records)}
+
+
+def refresh_contracts(context):
+    """Reload contract specs ahead of a roll and write the snapshot every process picks up.
+
+    Uses the most recently synced active Tradovate login; without one the
+    catalog keeps serving its snapshot and defaults.
+    """
+    from src.services.broker_registry import load_credentials
+    from src.services.contract_catalog import get_contract_catalog, tradovate_loader
+
+    broker_account = BrokerAccount.query.filter_by(
+        broker_type='tradovate', account_status='active'
+    ).order_by(BrokerAccount.last_sync.desc()).first()
+    if broker_account is None:
+        return {'contracts': 0, 'message': 'No active Tradovate account to load contracts with'}
+    catalog = get_contract_catalog()
+    # Include the contracts being held, so a first refresh has something to load
+    for (symbol,) in db.session.query(Position.symbol).distinct():
+        catalog.get(symbol)
+    context.progress(0.1, 'Loading contract specs')
+    return {'contracts': catalog.refresh(tradovate_loader(load_credentials(broker_account)))}
@@ -0,0 +1,405 @@
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db, Job
+from src.utils.metrics import registry
+
+# Handlers run in worker processes and are imported there on first use
+JOB_TYPES = {
+    'connect': 'src.services.job_handlers:connect_account',
+    'sync': 'src.services.job_handlers:sync_account',
+    'archive_history': 'src.services.job_handlers:archive_history',
+    'prune_snapshots': 'src.services.job_handlers:prune_snapshots',
+    'export_history': 'src.services.job_handlers:export_history',
+    'refresh_contracts': 'src.services.job_handlers:refresh_contracts',
+    'reencrypt_credentials': 'src.services.job_handlers:reencrypt_credentials',
+    'backtest_sweep': 'src.services.job_handlers:backtest_sweep',
+}
+
+# Lower runs first
+PRIORITIES = {'high': 0, 'normal': 5, 'low': 9}
+
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 300.0
+PROGRESS_INTERVAL = 0.5
+
+jobs_finished = registry.counter(
+    'jobs_finished_total', 'Background job attempts finished, by outcome', ('job_type', 'outcome'))
+job_duration = registry.histogram('job_duration_seconds', 'Background job run time per attempt', ('job_type',))
+
+
+def enqueue(job_type, broker_account_id=None, user_id=None, payload=None, priority=PRIORITIES['normal'],
+            max_attempts=3, dedupe_key=None):
+    """Queue a job unless an identical one is already waiting.
+
+    Jobs are deduplicated on ``dedupe_key``, ``'<job_type>:<broker_account_id>'``
+    by default, against queued jobs only: a sync requested while another
+    runs is queued once to pick up whatever changed meanwhile. A duplicate
+    request can raise the waiting job's priority. Returns ``(job, created)``.
+    """
+    if job_type not in JOB_TYPES:
+        raise ValueError(f'Unsupported job type: {job_type}')
+    dedupe_key = dedupe_key or f'{job_type}:{broker_account_id}'
+
+    existing = Job.query.filter_by(dedupe_key=dedupe_key, status='queued').first()
+    if existing is None:
+        job = Job(
+            job_type=job_type,
+            user_id=user_id,
+            broker_account_id=broker_account_id,
+            dedupe_key=dedupe_key,
+            priority=priority,
+            status='queued',
+            payload=json.dumps(payload) if payload is not None else None,
+            max_attempts=max_attempts,
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+            return job, True
+        except IntegrityError:
+            # Lost the race to another request queueing the same job
+            db.session.rollback()
+            existing = Job.query.filter_by(dedupe_key=dedupe_key, status='queued').first()
+            if existing is None:
+                raise
+
+    if priority < existing.priority:
+        existing.priority = priority
+        db.session.commit()
+    return existing, False
+
+
+def cancel(job):
+    """Cancel a queued job, or flag a running one so its result is discarded"""
+    if job.status not in ('queued', 'running'):
+        return False
+    job.status = 'cancelled'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+# Worker process side
+
+_worker_app = None
+
+
+def _init_worker():
+    """Build the app once per worker process without its background services"""
+    global _worker_app
+    for name in ('MARK_TO_MARKET_ENABLED', 'STRATEGY_RUNTIME_ENABLED', 'JOB_RUNNER_ENABLED', 'AUTO_CREATE_SCHEMA'):
+        os.environ[name] = '0'
+    from src.main import app
+    _worker_app = app
+
+
+class JobContext:
+    """What a handler gets: the job's inputs and a way to report progress"""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.job_type = job.job_type
+        self.user_id = job.user_id
+        self.broker_account_id = job.broker_account_id
+        self.payload = json.loads(job.payload) if job.payload else {}
+        self.attempt = job.attempts
+        self._reported_at = 0.0
+
+    def progress(self, fraction, message=None):
+        """Record progress (0..1); writes are throttled and never fail the job"""
+        now = time.monotonic()
+        if fraction < 1 and now - self._reported_at < PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        try:
+            # Own connection, so the handler's open transaction is not committed with it
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(Job).where(Job.id == self.job_id, Job.status == 'running').values(
+                        progress=min(max(float(fraction), 0.0), 1.0),
+                        progress_message=message[:255] if message else None,
+                        updated_at=datetime.utcnow()
+                    )
+                )
+        except Exception:
+            pass
+
+
+def _load_handler(job_type):
+    module_name, function_name = JOB_TYPES[job_type].split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _run_job(job_id):
+    with _worker_app.app_context():
+        try:
+            job = db.session.get(Job, job_id)
+            context = JobContext(job)
+            db.session.rollback()  # do not hold a read transaction while the handler runs
+            return _load_handler(context.job_type)(context)
+        finally:
+            db.session.remove()
+
+
+# Dispatcher side
+
+def retry_delay(attempts):
+    """Exponential backoff after the ``attempts``-th failed attempt"""
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def runner_configured():
+    """Whether something runs queued jobs.
+
+    Either a runner in this process (``JOB_RUNNER_ENABLED=1``) or a separate
+    ``flask jobs-worker`` process, declared with ``JOB_WORKER_EXTERNAL=1``.
+    """
+    return os.environ.get('JOB_RUNNER_ENABLED') == '1' or os.environ.get('JOB_WORKER_EXTERNAL') == '1'
+
+
+def _claim(job_id, now):
+    """Compare-and-set a queued job to running; False if someone else took it"""
+    claimed = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+            status='running', attempts=Job.attempts + 1, started_at=now, updated_at=now,
+            progress=0.0, progress_message=None
+        )
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def _record_success(job_id, job_type, result):
+    finished = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'running').values(
+            status='succeeded', progress=1.0, result=json.dumps(result, default=str),
+            error=None, finished_at=datetime.utcnow(), updated_at=datetime.utcnow()
+        )
+    ).rowcount
+    db.session.commit()
+    jobs_finished.inc(job_type=job_type, outcome='succeeded' if finished else 'cancelled')
+
+
+def _record_failure(job_id, job_type, error):
+    job = db.session.get(Job, job_id)
+    if job is None or job.status != 'running':
+        db.session.rollback()
+        jobs_finished.inc(job_type=job_type, outcome='cancelled')
+        return
+    now = datetime.utcnow()
+    job.error = error[:2000]
+    if job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+        outcome = 'retried'
+    else:
+        job.status = 'failed'
+        job.finished_at = now
+        outcome = 'failed'
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A duplicate was queued meanwhile; it will do the work
+        db.session.rollback()
+        db.session.execute(update(Job).where(Job.id == job_id).values(
+            status='failed', error=f'{error[:1900]} (superseded by a newer queued job)', finished_at=now))
+        db.session.commit()
+        outcome = 'failed'
+    jobs_finished.inc(job_type=job_type, outcome=outcome)
+
+
+def run_in_thread(app, job):
+    """Run a queued job once on a thread of this process.
+
+    For jobs a request cannot leave waiting when no runner is configured
+    (see ``runner_configured``). The job is claimed like a runner would, so
+    a runner started meanwhile never runs it twice; a failed attempt is not
+    retried here.
+    """
+    job_id, job_type = job.id, job.job_type
+
+    def run():
+        with app.app_context():
+            try:
+                if not _claim(job_id, datetime.utcnow()):
+                    return
+                started = time.monotonic()
+                try:
+                    context = JobContext(db.session.get(Job, job_id))
+                    db.session.rollback()
+                    result = _load_handler(job_type)(context)
+                except Exception as e:
+                    db.session.rollback()
+                    _record_failure(job_id, job_type, f'{type(e).__name__}: {e}')
+                else:
+                    _record_success(job_id, job_type, result)
+                job_duration.observe(time.monotonic() - started, job_type=job_type)
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=f'job-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+class JobRunner:
+    """Claims queued jobs from the database and runs them in a process pool.
+
+    The pool has ``JOB_WORKERS`` (default: one per CPU) processes per
+    runner. Run one ``flask jobs-worker`` process per host and set
+    ``JOB_WORKER_EXTERNAL=1`` on the web workers: ``JOB_RUNNER_ENABLED=1``
+    starts a runner, and its pool, in every gunicorn worker.
+
+    The runner thread claims at most one job per idle worker, highest
+    priority first, with a compare-and-set UPDATE so several runners (one
+    per host, say) never take the same job. Running jobs are heartbeated;
+    a job whose runner died is requeued once its heartbeat is older than
+    ``stale_seconds``. Failures are retried with exponential backoff until
+    ``max_attempts``.
+    """
+
+    def __init__(self, app, max_workers=None, poll_interval=1.0, stale_seconds=300.0):
+        self.app = app
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self._executor = None
+        self._running = {}  # job id -> (job type, started)
+        self._finished = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _start_executor(self):
+        # Spawned, not forked: the parent has threads and open DB connections
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def start(self):
+        if multiprocessing.parent_process() is not None:
+            # A spawned job worker re-importing the parent's main module
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='job-runner', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread and wait:
+            self._thread.join()
+
+    def run(self):
+        """Dispatch until ``stop()``; call directly to run in the foreground"""
+        self._executor = self._start_executor()
+        heartbeat_at = 0.0
+        try:
+            with self.app.app_context():
+                while not self._stop.is_set():
+                    self._finish_done()
+                    if time.monotonic() - heartbeat_at >= self.stale_seconds / 4:
+                        heartbeat_at = time.monotonic()
+                        self._heartbeat()
+                        self._requeue_stale()
+                    self._claim_and_submit()
+                    db.session.remove()
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _claim_and_submit(self):
+        free = self.max_workers - len(self._running)
+        if free <= 0:
+            return
+        now = datetime.utcnow()
+        candidates = db.session.query(Job.id, Job.job_type).filter(
+            Job.status == 'queued', Job.run_after <= now
+        ).order_by(Job.priority, Job.id).limit(free * 2).all()
+        for job_id, job_type in candidates:
+            if free <= 0:
+                break
+            if not _claim(job_id, now):
+                continue
+            self._submit(job_id, job_type)
+            free -= 1
+
+    def _submit(self, job_id, job_type):
+        try:
+            future = self._executor.submit(_run_job, job_id)
+        except BrokenProcessPool:
+            self._executor = self._start_executor()
+            future = self._executor.submit(_run_job, job_id)
+        self._running[job_id] = (job_type, time.monotonic())
+
+        def done(future):
+            self._finished.put((job_id, future))
+            self._wake.set()
+
+        future.add_done_callback(done)
+
+    def _finish_done(self):
+        broken = False
+        while True:
+            try:
+                job_id, future = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            job_type, started = self._running.pop(job_id, (None, time.monotonic()))
+            job_duration.observe(time.monotonic() - started, job_type=job_type or 'unknown')
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                broken = True
+                _record_failure(job_id, job_type, f'Worker process died: {e}')
+            except Exception as e:
+                _record_failure(job_id, job_type, f'{type(e).__name__}: {e}')
+            else:
+                _record_success(job_id, job_type, result)
+        if broken:
+            # Every job in a broken pool fails; the next submit starts a fresh pool
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._start_executor()
+
+    def _heartbeat(self):
+        if self._running:
+            db.session.execute(update(Job).where(
+                Job.id.in_(list(self._running)), Job.status == 'running'
+            ).values(updated_at=datetime.utcnow()))
+            db.session.commit()
+
+    def _requeue_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        stale = Job.query.filter(Job.status == 'running', Job.updated_at < cutoff,
+                                 ~Job.id.in_(list(self._running) or [0])).all()
+        for job in stale:
+            _record_failure(job.id, job.job_type, 'Runner stopped while the job was running')
+
+
+_runner = None
+
+
+def get_job_runner(app=None):
+    """The process's job runner, created on first use from ``JOB_*`` settings"""
+    global _runner
+    if _runner is None and app is not None:
+        _runner = JobRunner(
+            app,
+            max_workers=int(os.environ.get('JOB_WORKERS', '0')) or None,
+            poll_interval=float(os.environ.get('JOB_POLL_SECONDS', '1')),
+            stale_seconds=float(os.environ.get('JOB_STALE_SECONDS', '300'))
+        )
+    return _runner
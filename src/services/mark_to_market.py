@@ -0,0 +1,223 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import update
+
+from src.models.events import mark_changed
+from src.models.user import db, BrokerAccount, Position
+from src.services.change_feed import changes_since, current_cursor
+from src.services.contract_catalog import get_contract_catalog
+
+# The only Position columns a flush writes
+MARK_COLUMNS = ('current_price', 'unrealized_pnl', 'updated_at')
+
+
+class MarkToMarketEngine:
+    """Revalues open positions in memory on every tick.
+
+    Positions are held as parallel NumPy arrays (one row per position) with a
+    precomputed index of rows per symbol, so a tick touches only the rows
+    holding that symbol and does no per-position Python work. Revalued rows
+    are marked dirty and written back in one bulk UPDATE per flush interval
+    instead of one write per tick.
+
+    Before each flush the engine reads position changes from the change
+    journal, so syncs committed by other web workers or the job runner
+    reach it too. Its own flushes are journaled as ``mark`` entries, which
+    it skips.
+    """
+
+    def __init__(self, flush_interval=1.0, point_value_for=None):
+        self.flush_interval = flush_interval
+        self.point_value_for = point_value_for or (lambda symbol: 1.0)
+        self.last_prices = {}
+        self._lock = threading.RLock()
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._poll_lock = threading.Lock()
+        self._cursor = None  # journal cursor the arrays are current to
+        self.flush_count = 0
+        self.rows_written = 0
+        self._reset_arrays([])
+
+    def _reset_arrays(self, rows):
+        """Rebuild the position arrays from ``(id, account_id, symbol, signed_qty, entry)`` rows"""
+        count = len(rows)
+        self.symbols = [row[2] for row in rows]
+        self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        self.account_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+        self.quantities = np.fromiter((row[3] for row in rows), dtype=np.float64, count=count)
+        self.entry_prices = np.fromiter((row[4] for row in rows), dtype=np.float64, count=count)
+        self.multipliers = np.fromiter(
+            (self.point_value_for(row[2]) for row in rows), dtype=np.float64, count=count
+        )
+        self.current_prices = np.full(count, np.nan)
+        self.unrealized_pnl = np.zeros(count)
+        self.dirty = np.zeros(count, dtype=bool)
+
+        rows_by_symbol = {}
+        for index, symbol in enumerate(self.symbols):
+            rows_by_symbol.setdefault(symbol, []).append(index)
+        self._rows_by_symbol = {
+            symbol: np.asarray(indexes, dtype=np.intp) for symbol, indexes in rows_by_symbol.items()
+        }
+
+        # Apply prices already seen so reloaded positions are marked immediately
+        for symbol, price in self.last_prices.items():
+            self._revalue(symbol, price)
+
+    @staticmethod
+    def _position_row(position):
+        signed_qty = position.quantity if position.side == 'long' else -position.quantity
+        return (
+            position.id,
+            position.broker_account_id,
+            position.symbol,
+            signed_qty,
+            float(position.entry_price or 0),
+        )
+
+    def load_positions(self):
+        """Load every open position from the database (needs an app context)"""
+        # Read before the rows, so changes committed meanwhile are applied by the next poll
+        cursor = current_cursor()
+        positions = Position.query.filter(Position.quantity != 0).all()
+        with self._lock:
+            self._reset_arrays([self._position_row(position) for position in positions])
+        self._cursor = cursor
+
+    def poll_positions(self):
+        """Apply position changes journaled since the last poll, by any process (needs an app context)"""
+        if self._app is None or self._cursor is None:
+            return
+        with self._poll_lock:
+            account_ids = [account_id for (account_id,) in db.session.query(BrokerAccount.id)]
+            changes = changes_since(Position, account_ids, self._cursor, ignore_ops=('mark',))
+            if changes is None:
+                # Behind the retained journal: start over
+                self.load_positions()
+                return
+            cursor, upserted, deleted, reset_accounts = changes
+            if upserted or deleted or reset_accounts:
+                self._apply_changes(upserted, deleted, reset_accounts)
+            self._cursor = cursor
+
+    def _apply_changes(self, upserted, deleted, reset_accounts):
+        changed = [position.id for position in upserted] + list(deleted)
+        with self._lock:
+            keep = ~np.isin(self.ids, changed) & ~np.isin(self.account_ids, reset_accounts)
+            rows = [
+                (int(self.ids[i]), int(self.account_ids[i]), self.symbols[i],
+                 float(self.quantities[i]), float(self.entry_prices[i]))
+                for i in np.flatnonzero(keep)
+            ]
+            rows.extend(self._position_row(position) for position in upserted if position.quantity)
+            self._reset_arrays(rows)
+
+    # Tick path
+
+    def on_tick(self, symbol, kind, ts, price, size=0):
+        """Tick listener compatible with ``TickStore.subscribe``"""
+        with self._lock:
+            self.last_prices[symbol] = price
+            self._revalue(symbol, price)
+
+    def _revalue(self, symbol, price):
+        rows = self._rows_by_symbol.get(symbol)
+        if rows is None:
+            return
+        self.current_prices[rows] = price
+        self.unrealized_pnl[rows] = (
+            (price - self.entry_prices[rows]) * self.quantities[rows] * self.multipliers[rows]
+        )
+        self.dirty[rows] = True
+
+    def account_unrealized_pnl(self):
+        """Total unrealized P&L per broker account id"""
+        with self._lock:
+            if not len(self.ids):
+                return {}
+            accounts, inverse = np.unique(self.account_ids, return_inverse=True)
+            totals = np.bincount(inverse, weights=self.unrealized_pnl)
+        return {int(account): float(total) for account, total in zip(accounts, totals)}
+
+    # Persistence
+
+    def flush(self):
+        """Write dirty positions back in a single bulk update (needs an app context)"""
+        with self._lock:
+            rows = np.flatnonzero(self.dirty)
+            if not len(rows):
+                return 0
+            accounts = self.account_ids[rows].tolist()
+            mappings = [
+                {
+                    'id': int(position_id),
+                    'current_price': round(float(price), 4),
+                    'unrealized_pnl': round(float(pnl), 2),
+                    'updated_at': datetime.utcnow(),
+                }
+                for position_id, price, pnl in zip(
+                    self.ids[rows], self.current_prices[rows], self.unrealized_pnl[rows]
+                )
+            ]
+            self.dirty[rows] = False
+
+        try:
+            db.session.execute(update(Position), mappings)
+            # Bulk UPDATEs skip the unit of work; report them for the journal and listeners
+            mark_changed(db.session, Position.__tablename__, accounts, op='mark', columns=MARK_COLUMNS)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Leave the rows dirty so the next flush retries them
+            with self._lock:
+                written = set(mapping['id'] for mapping in mappings)
+                self.dirty |= np.isin(self.ids, list(written))
+            raise
+
+        self.flush_count += 1
+        self.rows_written += len(mappings)
+        return len(mappings)
+
+    def start(self, app):
+        """Load positions and start the background flush thread"""
+        self._app = app
+        with app.app_context():
+            self.load_positions()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mark-to-market', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread after a final flush"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._app is not None:
+            with self._app.app_context():
+                self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._app.app_context():
+                try:
+                    self.poll_positions()
+                    self.flush()
+                except Exception:
+                    time.sleep(self.flush_interval)
+
+
+_engine = None
+
+
+def get_mark_to_market_engine():
+    """Process-wide mark-to-market engine instance"""
+    global _engine
+    if _engine is None:
+        _engine = MarkToMarketEngine(point_value_for=get_contract_catalog().point_value)
+    return _engine
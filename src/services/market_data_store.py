@@ -0,0 +1,376 @@
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.utils.metrics import registry
+
+# Column layouts for each record kind. Every column is stored in its own
+# append-only file so range reads only touch the columns they need.
+TRADE_COLUMNS = {
+    'ts': np.int64,       # nanoseconds since the epoch (UTC)
+    'price': np.float64,
+    'size': np.int32,
+}
+
+QUOTE_COLUMNS = {
+    'ts': np.int64,
+    'bid': np.float64,
+    'ask': np.float64,
+    'bid_size': np.int32,
+    'ask_size': np.int32,
+}
+
+KIND_COLUMNS = {
+    'trades': TRADE_COLUMNS,
+    'quotes': QUOTE_COLUMNS,
+}
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+
+_SAFE_SYMBOL = re.compile(r'[^A-Za-z0-9._-]')
+
+# Integer epochs below these are seconds, milliseconds and microseconds
+# (1e11 seconds is the year 5138; 1e11 milliseconds is early 1973)
+_EPOCH_UNITS = ((10 ** 11, NS_PER_SECOND), (10 ** 14, 1_000_000), (10 ** 17, 1_000))
+
+late_ticks = registry.counter(
+    'market_data_late_ticks_total', 'Ticks dropped for arriving older than their partition', ('kind',))
+
+
+def to_ns(value):
+    """Convert a datetime or an epoch in seconds, ms, µs or ns into epoch nanoseconds.
+
+    The unit of a number is told from its magnitude, so any timestamp
+    after 1973 converts correctly whichever unit a feed sends.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * NS_PER_SECOND)
+    if not isinstance(value, float):
+        value = int(value)
+    for limit, scale in _EPOCH_UNITS:
+        if abs(value) < limit:
+            return int(value * scale)
+    return int(value)
+
+
+class TickStore:
+    """Append-only columnar store for quotes and trades.
+
+    Data is partitioned as ``<root>/<symbol>/<YYYYMMDD>/<kind>.<column>`` with
+    one raw little-endian array per column. Writes are buffered in memory and
+    appended on flush; reads memory-map the column files so a range read only
+    pages in the rows it slices.
+
+    Range reads binary-search the timestamps, so each partition only ever
+    grows forward in time: a tick older than the newest one already taken
+    for its partition is dropped (and counted in
+    ``market_data_late_ticks_total``) rather than written out of order.
+    A partition's columns are cut to a common length when this process
+    first writes to it, so an append torn by a crash cannot misalign them.
+    """
+
+    def __init__(self, root=None, flush_size=1024):
+        self.root = root or os.environ.get(
+            'MARKET_DATA_DIR',
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'market_data')
+        )
+        self.flush_size = flush_size
+        self._buffers = {}
+        self._high_water = {}  # (symbol, day, kind) -> newest ts taken
+        self._newest_day = ''  # high-water entries of earlier days are dropped
+        self._last_trade = {}
+        self._last_quote = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    # Ingestion
+
+    def record_trade(self, symbol, ts, price, size=1):
+        """Buffer a trade print for a symbol"""
+        ts = to_ns(ts)
+        if not self._append(symbol, 'trades', ts, (ts, price, size)):
+            return
+        self._last_trade[symbol] = (ts, float(price))
+        self._notify(symbol, 'trade', ts, float(price), int(size))
+
+    def record_quote(self, symbol, ts, bid, ask, bid_size=0, ask_size=0):
+        """Buffer a top-of-book quote for a symbol"""
+        ts = to_ns(ts)
+        if not self._append(symbol, 'quotes', ts, (ts, bid, ask, bid_size, ask_size)):
+            return
+        self._last_quote[symbol] = (ts, float(bid), float(ask))
+        self._notify(symbol, 'quote', ts, (float(bid) + float(ask)) / 2.0, 0)
+
+    def subscribe(self, callback):
+        """Register ``callback(symbol, kind, ts, price, size)`` for every ingested tick.
+
+        ``size`` is the traded size of a trade and 0 for a quote.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove a previously registered tick listener"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, symbol, kind, ts, price, size):
+        for callback in list(self._listeners):
+            callback(symbol, kind, ts, price, size)
+
+    def _append(self, symbol, kind, ts, row):
+        """Buffer a row unless it is older than its partition; returns whether it was taken"""
+        day = self._day_key(ts)
+        key = (symbol, day, kind)
+        with self._lock:
+            if day > self._newest_day:
+                self._drop_days_before(day)
+            high_water = self._high_water.get(key)
+            if high_water is None:
+                self._align_partition(symbol, day, kind)
+                high_water = self._stored_high_water(symbol, day, kind)
+            if high_water is not None and ts < high_water:
+                late_ticks.inc(kind=kind)
+                return False
+            self._high_water[key] = ts
+            rows = self._buffers.setdefault(key, [])
+            rows.append(row)
+            if len(rows) >= self.flush_size:
+                self._flush_key(key)
+        return True
+
+    def _drop_days_before(self, day):
+        """Forget the high-water marks of past days so they do not pile up"""
+        self._newest_day = day
+        for key in [key for key in self._high_water if key[1] < day]:
+            # Written out first, so a late tick for that day is checked against the file
+            self._flush_key(key)
+            del self._high_water[key]
+
+    def _align_partition(self, symbol, day, kind):
+        """Cut every column file of a partition to the rows all of them hold"""
+        partition = self._partition_path(symbol, day)
+        sizes = {}
+        for name, dtype in KIND_COLUMNS[kind].items():
+            path = os.path.join(partition, f'{kind}.{name}')
+            itemsize = np.dtype(dtype).itemsize
+            sizes[path] = (os.path.getsize(path) if os.path.exists(path) else 0, itemsize)
+        count = min(size // itemsize for size, itemsize in sizes.values())
+        for path, (size, itemsize) in sizes.items():
+            if size > count * itemsize:
+                os.truncate(path, count * itemsize)
+
+    def _stored_high_water(self, symbol, day, kind):
+        """Newest timestamp already written to a partition, if any"""
+        path = os.path.join(self._partition_path(symbol, day), f'{kind}.ts')
+        dtype = np.dtype(np.int64).newbyteorder('<')
+        try:
+            with open(path, 'rb') as handle:
+                handle.seek(0, os.SEEK_END)
+                size = handle.tell() // dtype.itemsize * dtype.itemsize
+                if not size:
+                    return None
+                handle.seek(size - dtype.itemsize)
+                return int(np.frombuffer(handle.read(dtype.itemsize), dtype=dtype)[0])
+        except OSError:
+            return None
+
+    def flush(self):
+        """Append every buffered row to its partition files"""
+        with self._lock:
+            for key in list(self._buffers):
+                self._flush_key(key)
+
+    def _flush_key(self, key):
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        symbol, day, kind = key
+        columns = KIND_COLUMNS[kind]
+        partition = self._partition_path(symbol, day)
+        os.makedirs(partition, exist_ok=True)
+
+        # _append only takes rows in time order, so they extend the partition as is
+        for index, (name, dtype) in enumerate(columns.items()):
+            values = np.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+            with open(os.path.join(partition, f'{kind}.{name}'), 'ab') as handle:
+                handle.write(values.astype(np.dtype(dtype).newbyteorder('<'), copy=False).tobytes())
+
+    # Reads
+
+    def last_price(self, symbol):
+        """Latest trade price for a symbol, falling back to the quote mid"""
+        trade = self._last_trade.get(symbol)
+        quote = self._last_quote.get(symbol)
+        if trade and (not quote or trade[0] >= quote[0]):
+            return trade[1]
+        if quote:
+            return (quote[1] + quote[2]) / 2.0
+
+        # Nothing seen in this process yet, look at the most recent partition
+        days = self.days(symbol)
+        for day in reversed(days):
+            data = self._read_partition(symbol, day, 'trades', ('price',))
+            if data is not None and len(data['price']):
+                return float(data['price'][-1])
+        return None
+
+    def symbols(self):
+        """List the symbols that have stored data"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    def days(self, symbol):
+        """List the stored day partitions (YYYYMMDD) for a symbol"""
+        path = os.path.join(self.root, self._safe_symbol(symbol))
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.listdir(path))
+
+    def read_range(self, symbol, start=None, end=None, kind='trades', columns=None):
+        """Read rows with ``start <= ts < end`` as a dict of NumPy arrays"""
+        if kind not in KIND_COLUMNS:
+            raise ValueError(f'Unknown tick kind: {kind}')
+        names = tuple(columns) if columns else tuple(KIND_COLUMNS[kind])
+        if 'ts' not in names:
+            names = ('ts',) + names
+
+        start_ns = to_ns(start)
+        end_ns = to_ns(end)
+        start_day = self._day_key(start_ns) if start_ns is not None else None
+        end_day = self._day_key(end_ns - 1) if end_ns is not None else None
+
+        # Make buffered rows visible to readers
+        self.flush()
+
+        chunks = {name: [] for name in names}
+        for day in self.days(symbol):
+            if start_day and day < start_day:
+                continue
+            if end_day and day > end_day:
+                break
+            data = self._read_partition(symbol, day, kind, names)
+            if data is None:
+                continue
+            ts = data['ts']
+            lo = np.searchsorted(ts, start_ns, side='left') if start_ns is not None else 0
+            hi = np.searchsorted(ts, end_ns, side='left') if end_ns is not None else len(ts)
+            for name in names:
+                chunks[name].append(data[name][lo:hi])
+
+        result = {}
+        for name in names:
+            if chunks[name]:
+                result[name] = np.concatenate(chunks[name])
+            else:
+                result[name] = np.empty(0, dtype=KIND_COLUMNS[kind][name])
+        return result
+
+    def bars(self, symbol, interval_seconds=60, start=None, end=None):
+        """Aggregate stored trades into OHLCV bars on the fly"""
+        data = self.read_range(symbol, start, end, kind='trades')
+        return aggregate_bars(data['ts'], data['price'], data['size'], interval_seconds)
+
+    def _read_partition(self, symbol, day, kind, names):
+        partition = self._partition_path(symbol, day)
+        columns = KIND_COLUMNS[kind]
+        arrays = {}
+        length = None
+        for name in names:
+            path = os.path.join(partition, f'{kind}.{name}')
+            if not os.path.exists(path):
+                return None
+            dtype = np.dtype(columns[name]).newbyteorder('<')
+            count = os.path.getsize(path) // dtype.itemsize
+            if length is None or count < length:
+                length = count
+            if count == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+        # A torn append by another process may not be aligned yet; read the common rows
+        return {name: array[:length] for name, array in arrays.items()}
+
+    def _partition_path(self, symbol, day):
+        return os.path.join(self.root, self._safe_symbol(symbol), day)
+
+    @staticmethod
+    def _safe_symbol(symbol):
+        return _SAFE_SYMBOL.sub('_', symbol)
+
+    @staticmethod
+    def _day_key(ts_ns):
+        return datetime.fromtimestamp(ts_ns // NS_PER_SECOND, tz=timezone.utc).strftime('%Y%m%d')
+
+
+def aggregate_bars(ts, price, size, interval_seconds=60):
+    """Bucket time-ordered trades into OHLCV bars.
+
+    Returns a dict of arrays keyed ``ts`` (bucket start, epoch ns), ``open``,
+    ``high``, ``low``, ``close`` and ``volume``.
+    """
+    if len(ts) == 0:
+        return {
+            'ts': np.empty(0, dtype=np.int64),
+            'open': np.empty(0, dtype=np.float64),
+            'high': np.empty(0, dtype=np.float64),
+            'low': np.empty(0, dtype=np.float64),
+            'close': np.empty(0, dtype=np.float64),
+            'volume': np.empty(0, dtype=np.int64),
+        }
+
+    interval_ns = int(interval_seconds * NS_PER_SECOND)
+    buckets = np.asarray(ts, dtype=np.int64) // interval_ns
+    price = np.asarray(price, dtype=np.float64)
+    size = np.asarray(size, dtype=np.int64)
+
+    # Index of the first trade in every bucket
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+
+    return {
+        'ts': buckets[starts] * interval_ns,
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends],
+        'volume': np.add.reduceat(size, starts),
+    }
+
+
+def bars_to_dicts(bars):
+    """Convert bar arrays into JSON-friendly dicts"""
+    return [
+        {
+            'ts': datetime.fromtimestamp(int(ts) / NS_PER_SECOND, tz=timezone.utc).isoformat(),
+            'open': float(o),
+            'high': float(h),
+            'low': float(l),
+            'close': float(c),
+            'volume': int(v),
+        }
+        for ts, o, h, l, c, v in zip(
+            bars['ts'], bars['open'], bars['high'], bars['low'], bars['close'], bars['volume']
+        )
+    ]
+
+
+_tick_store = None
+
+
+def get_tick_store():
+    """Process-wide tick store instance"""
+    global _tick_store
+    if _tick_store is None:
+        _tick_store = TickStore()
+    return _tick_store
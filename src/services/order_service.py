@@ -0,0 +1,71 @@
+from datetime import datetime
+from src.models.user import db, Order
+from src.services.broker_registry import get_broker_service, load_credentials
+
+
+def place_order(broker_account, order_data, strategy_id=None):
+    """Place an order with the account's broker and record it as an Order row.
+
+    ``strategy_id`` marks orders placed by a running strategy, whose fills
+    are then delivered back to it.
+    """
+    service = get_broker_service(broker_account.broker_type)
+    # Route to this account when the login holds several
+    routed = dict(order_data, account_id=broker_account.broker_account_id,
+                  account_name=broker_account.account_name)
+    result = service.place_order(load_credentials(broker_account), routed)
+    if not result['success']:
+        return result
+
+    order = Order(
+        broker_account_id=broker_account.id,
+        broker_order_id=result.get('order_id', ''),
+        strategy_id=strategy_id,
+        symbol=order_data['symbol'],
+        side=order_data['side'],
+        order_type=order_data['order_type'],
+        quantity=order_data['quantity'],
+        price=order_data.get('price'),
+        stop_price=order_data.get('stop_price'),
+        status='pending',
+        created_at=datetime.utcnow()
+    )
+    # Some responses already report the order filled (e.g. marketable orders)
+    reported = result.get('data') if isinstance(result.get('data'), dict) else {}
+    if str(reported.get('status', '')).lower() == 'filled':
+        record_fill(order, reported.get('filled_quantity') or order.quantity,
+                    reported.get('filled_price') or reported.get('price'))
+    db.session.add(order)
+    db.session.commit()
+
+    if order.status == 'filled' and strategy_id is not None:
+        notify_fills()
+    return dict(result, order=order)
+
+
+def record_fill(order, filled_quantity, filled_price=None):
+    """Mark an Order row (partially) filled; returns whether anything changed.
+
+    Fills only ever grow, so replaying an older broker snapshot is a no-op.
+    """
+    filled_quantity = min(int(filled_quantity or 0), order.quantity)
+    if filled_quantity <= (order.filled_quantity or 0):
+        return False
+    order.filled_quantity = filled_quantity
+    if filled_price:
+        order.filled_price = filled_price
+    if filled_quantity == order.quantity:
+        order.status = 'filled'
+    return True
+
+
+def notify_fills():
+    """Have a strategy runtime in this process deliver committed fills now.
+
+    Runtimes in other processes pick them up from the change journal on
+    their next poll.
+    """
+    from src.services.strategy_engine import current_strategy_runtime
+    runtime = current_strategy_runtime()
+    if runtime is not None:
+        runtime.wake()
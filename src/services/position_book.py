@@ -0,0 +1,288 @@
+import os
+import threading
+import time
+
+from sqlalchemy import select
+
+from src.models import events
+from src.models.user import db, BrokerAccount, Position, Order
+from src.services.change_feed import current_cursor
+
+BOOK_TABLES = (Position.__tablename__, Order.__tablename__, BrokerAccount.__tablename__)
+
+
+def _number(value):
+    # Same falsy-to-None rule as the models' to_dict
+    return float(value) if value else None
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+class PositionRecord:
+    """One open position.
+
+    Memory, measured with tracemalloc on CPython 3.11: about 440 bytes per
+    record including its own strings, floats and datetimes, so 10,000
+    positions take roughly 4.4 MB.
+    """
+    __slots__ = ('id', 'account_id', 'symbol', 'side', 'quantity', 'entry_price', 'current_price',
+                 'unrealized_pnl', 'realized_pnl', 'opened_at', 'updated_at')
+
+    COLUMNS = (Position.id, Position.broker_account_id, Position.symbol, Position.side, Position.quantity,
+               Position.entry_price, Position.current_price, Position.unrealized_pnl, Position.realized_pnl,
+               Position.opened_at, Position.updated_at)
+
+    def __init__(self, row):
+        (self.id, self.account_id, self.symbol, self.side, self.quantity, entry_price, current_price,
+         unrealized_pnl, realized_pnl, self.opened_at, self.updated_at) = row
+        self.entry_price = _number(entry_price)
+        self.current_price = _number(current_price)
+        self.unrealized_pnl = _number(unrealized_pnl)
+        self.realized_pnl = _number(realized_pnl)
+
+    @property
+    def net_quantity(self):
+        return self.quantity if self.side == 'long' else -self.quantity
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'quantity': self.quantity,
+            'entry_price': self.entry_price,
+            'current_price': self.current_price,
+            'unrealized_pnl': self.unrealized_pnl,
+            'realized_pnl': self.realized_pnl,
+            'opened_at': _timestamp(self.opened_at),
+            'updated_at': _timestamp(self.updated_at)
+        }
+
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class OrderRecord:
+    """One order as served by the orders endpoint"""
+    __slots__ = ('id', 'account_id', 'broker_order_id', 'symbol', 'side', 'order_type', 'quantity', 'price',
+                 'stop_price', 'status', 'filled_quantity', 'filled_price', 'created_at', 'updated_at')
+
+    COLUMNS = (Order.id, Order.broker_account_id, Order.broker_order_id, Order.symbol, Order.side,
+               Order.order_type, Order.quantity, Order.price, Order.stop_price, Order.status,
+               Order.filled_quantity, Order.filled_price, Order.created_at, Order.updated_at)
+
+    def __init__(self, row):
+        (self.id, self.account_id, self.broker_order_id, self.symbol, self.side, self.order_type, self.quantity,
+         price, stop_price, self.status, self.filled_quantity, filled_price, self.created_at,
+         self.updated_at) = row
+        self.price = _number(price)
+        self.stop_price = _number(stop_price)
+        self.filled_price = _number(filled_price)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'broker_order_id': self.broker_order_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'order_type': self.order_type,
+            'quantity': self.quantity,
+            'price': self.price,
+            'stop_price': self.stop_price,
+            'status': self.status,
+            'filled_quantity': self.filled_quantity,
+            'filled_price': self.filled_price,
+            'created_at': _timestamp(self.created_at),
+            'updated_at': _timestamp(self.updated_at)
+        }
+
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class UserBook:
+    __slots__ = ('generation', 'loaded_at', 'cursor', 'account_ids', 'positions', 'orders')
+
+    def __init__(self, generation, cursor, account_ids):
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        self.cursor = cursor  # change journal cursor read before the rows
+        self.account_ids = account_ids
+        self.positions = {}  # account id -> [PositionRecord]
+        self.orders = {}     # account id -> [OrderRecord]
+
+
+def _load_records(record_class, account_ids):
+    by_account = {account_id: [] for account_id in account_ids}
+    if not account_ids:
+        return by_account
+    model_id, account_column = record_class.COLUMNS[0], record_class.COLUMNS[1]
+    rows = db.session.execute(
+        select(*record_class.COLUMNS).where(account_column.in_(account_ids)).order_by(model_id)
+    ).all()
+    for row in rows:
+        by_account[row[1]].append(record_class(row))
+    return by_account
+
+
+class PositionBook:
+    """Per-user positions and orders held as slotted records.
+
+    A user's book is loaded with three column-only queries (no ORM
+    instances) and dropped whenever a committed change touches that user's
+    accounts, positions or orders, so syncs, fills and mark-to-market
+    flushes are visible on the next read. Changes committed by other
+    workers show up as a new generation in the shared response-cache
+    counters; without those (``RESPONSE_CACHE=off``) ``ttl`` bounds how
+    stale another process's writes can leave the book.
+
+    Each book keeps the change journal cursor read just before its rows,
+    so a ``since=`` client resuming from it is sent anything the book might
+    be missing, however stale the book is.
+    """
+
+    def __init__(self, generation_for=None, ttl=30.0):
+        self.generation_for = generation_for or (lambda user_id: 0)
+        self.ttl = ttl
+        self._users = {}
+        self._owners = {}  # account id -> user id
+        self._drops = {}  # user id -> times their book was dropped, to spot loads that raced a drop
+        self._clears = 0
+        self._lock = threading.RLock()
+
+    def _drop(self, user_id):
+        self._users.pop(user_id, None)
+        self._drops[user_id] = self._drops.get(user_id, 0) + 1
+
+    def on_changes(self, changes):
+        with self._lock:
+            for change in changes:
+                if change.table in BOOK_TABLES:
+                    self._drop(change.user_id or self._owners.get(change.account_id))
+
+    def _fresh(self, book, generation):
+        return (book is not None and book.generation == generation
+                and time.monotonic() - book.loaded_at <= self.ttl)
+
+    def _book(self, user_id):
+        generation = self.generation_for(user_id)
+        with self._lock:
+            book = self._users.get(user_id)
+            drops = (self._drops.get(user_id, 0), self._clears)
+        if self._fresh(book, generation):
+            return book
+
+        # Loaded without the lock, so one user's load never holds up another's reads
+        cursor = current_cursor()
+        account_ids = [row[0] for row in db.session.execute(
+            select(BrokerAccount.id).where(BrokerAccount.user_id == user_id).order_by(BrokerAccount.id)
+        ).all()]
+        loaded = UserBook(generation, cursor, account_ids)
+        loaded.positions = _load_records(PositionRecord, account_ids)
+        loaded.orders = _load_records(OrderRecord, account_ids)
+
+        with self._lock:
+            if (self._drops.get(user_id, 0), self._clears) != drops:
+                # Changed while loading: serve these rows but leave the next read to reload
+                return loaded
+            book = self._users.get(user_id)
+            # A concurrent load may have installed a book at least as new
+            if self._fresh(book, generation) and book.cursor >= loaded.cursor:
+                return book
+            self._users[user_id] = loaded
+            for account_id in account_ids:
+                self._owners[account_id] = user_id
+        return loaded
+
+    # Reads
+
+    def positions(self, user_id):
+        return self.positions_at(user_id)[0]
+
+    def orders(self, user_id):
+        return self.orders_at(user_id)[0]
+
+    def positions_at(self, user_id):
+        """The user's positions and the journal cursor they are current as of"""
+        book = self._book(user_id)
+        records = [record for account_id in book.account_ids for record in book.positions[account_id]]
+        records.sort(key=lambda record: record.id)
+        return records, book.cursor
+
+    def orders_at(self, user_id):
+        """The user's orders and the journal cursor they are current as of"""
+        book = self._book(user_id)
+        records = [record for account_id in book.account_ids for record in book.orders[account_id]]
+        records.sort(key=lambda record: record.id)
+        return records, book.cursor
+
+    def net_quantity(self, user_id, account_id, symbol):
+        """Signed open quantity in ``symbol`` for one account, for pre-trade checks"""
+        book = self._book(user_id)
+        return sum(record.net_quantity for record in book.positions.get(account_id, ()) if record.symbol == symbol)
+
+    def working_orders(self, user_id, account_id):
+        book = self._book(user_id)
+        return [record for record in book.orders.get(account_id, ()) if record.status in ('pending', 'working')]
+
+    # Maintenance
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self._clears += 1
+            else:
+                self._drop(user_id)
+
+    def verify(self):
+        """Compare every loaded book with the database.
+
+        Returns ``{user id: [problems]}`` for users whose book disagrees,
+        naming the account and the position or order ids that differ.
+        """
+        with self._lock:
+            loaded = {user_id: book for user_id, book in self._users.items()}
+        problems = {}
+        for user_id, book in loaded.items():
+            user_problems = []
+            for label, record_class, held in (('positions', PositionRecord, book.positions),
+                                              ('orders', OrderRecord, book.orders)):
+                fresh = _load_records(record_class, book.account_ids)
+                for account_id in book.account_ids:
+                    expected = {record.id: record.fields() for record in fresh[account_id]}
+                    actual = {record.id: record.fields() for record in held.get(account_id, ())}
+                    if expected == actual:
+                        continue
+                    missing = sorted(expected.keys() - actual.keys())
+                    extra = sorted(actual.keys() - expected.keys())
+                    changed = sorted(key for key in expected.keys() & actual.keys() if expected[key] != actual[key])
+                    user_problems.append(
+                        f'account {account_id} {label}: missing {missing}, extra {extra}, changed {changed}')
+            if user_problems:
+                problems[user_id] = user_problems
+        return problems
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def get_position_book():
+    """The process-wide book, or None when ``POSITION_BOOK=off``"""
+    global _book
+    if os.environ.get('POSITION_BOOK') == 'off':
+        return None
+    if _book is None:
+        with _book_lock:
+            if _book is None:
+                from src.utils.response_cache import get_response_cache
+                cache = get_response_cache()
+                _book = PositionBook(
+                    generation_for=cache.generation if cache is not None else None,
+                    ttl=float(os.environ.get('POSITION_BOOK_TTL', '30'))
+                )
+                events.subscribe(_book.on_changes)
+    return _book
@@ -0,0 +1,194 @@
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from src.services.broker_http import broker_request
+from src.services.broker_registry import get_broker_service
+
+logger = logging.getLogger(__name__)
+
+# Upstream quote feeds by broker type, imported on first use. Brokers
+# without one only see ticks ingested by other means.
+QUOTE_FEEDS = {
+    'tradovate': 'src.services.quote_feeds:TradovateQuoteFeed',
+}
+
+HEARTBEAT_SECONDS = 2.5
+# How long the socket read blocks before pending (un)subscriptions are sent
+POLL_SECONDS = 0.25
+RECONNECT_BASE_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 30.0
+
+
+def open_quote_feed(broker_type, credentials, store):
+    """Start the broker's upstream quote feed, recording its ticks in ``store``"""
+    if broker_type not in QUOTE_FEEDS:
+        raise ValueError(f'No quote feed for broker type: {broker_type}')
+    module_name, class_name = QUOTE_FEEDS[broker_type].split(':')
+    feed_class = getattr(importlib.import_module(module_name), class_name)
+    return feed_class(credentials, store)
+
+
+class TradovateQuoteFeed:
+    """Tradovate market data websocket with one quote subscription per symbol.
+
+    ``subscribe`` and ``unsubscribe`` only change the wanted set; the socket
+    thread reconciles it with what is subscribed upstream between reads,
+    and after every reconnect (with backoff, a fresh token and all symbols
+    resubscribed). Quotes are recorded in the tick store; a rise in total
+    traded volume is recorded as a trade of that size at the last price.
+    """
+
+    def __init__(self, credentials, store):
+        self.credentials = credentials
+        self.store = store
+        self.url = os.environ.get('TRADOVATE_MD_WS_URL', 'wss://md.tradovateapi.com/v1/websocket')
+        self.symbols = set()
+        self._subscribed = set()
+        self._contracts = {}  # contract id -> symbol
+        self._contract_ids = {}  # symbol -> contract id
+        self._volumes = {}
+        self._request_id = 0
+        self._authorize_id = None
+        self._authorized = False
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='tradovate-quotes', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, symbol):
+        with self._lock:
+            self.symbols.add(symbol)
+
+    def unsubscribe(self, symbol):
+        with self._lock:
+            self.symbols.discard(symbol)
+
+    def close(self):
+        self._closed.set()
+
+    # Socket thread
+
+    def _run(self):
+        attempt = 0
+        while not self._closed.is_set():
+            try:
+                self._connect_and_read()
+            except Exception as e:
+                logger.warning('Tradovate quote feed disconnected: %s', e)
+            if self._authorized:
+                # The last connection worked; back off from scratch
+                attempt = 0
+            if self._closed.wait(min(RECONNECT_BASE_SECONDS * 2 ** attempt, RECONNECT_MAX_SECONDS)):
+                break
+            attempt += 1
+
+    def _connect_and_read(self):
+        # websocket-client is only needed once a feed is opened
+        import websocket
+
+        tokens = get_broker_service('tradovate').get_access_token(self.credentials)
+        if not tokens['success']:
+            raise ConnectionError(tokens['error'])
+        self._access_token = tokens['access_token']
+        self._md_token = tokens['md_access_token']
+        self._authorized = False
+        self._subscribed = set()
+
+        socket = websocket.create_connection(self.url, timeout=HEARTBEAT_SECONDS * 4)
+        try:
+            socket.settimeout(POLL_SECONDS)
+            heartbeat_at = time.monotonic()
+            while not self._closed.is_set():
+                try:
+                    frame = socket.recv()
+                except websocket.WebSocketTimeoutException:
+                    frame = None
+                if frame:
+                    self._handle_frame(socket, frame)
+                if self._authorized:
+                    self._reconcile(socket)
+                if time.monotonic() - heartbeat_at >= HEARTBEAT_SECONDS:
+                    socket.send('[]')
+                    heartbeat_at = time.monotonic()
+        finally:
+            socket.close()
+
+    def _send(self, socket, endpoint, body):
+        self._request_id += 1
+        payload = body if isinstance(body, str) else json.dumps(body)
+        socket.send(f'{endpoint}\n{self._request_id}\n\n{payload}')
+        return self._request_id
+
+    def _handle_frame(self, socket, frame):
+        kind = frame[0]
+        if kind == 'o':
+            self._authorize_id = self._send(socket, 'authorize', self._md_token)
+        elif kind == 'c':
+            raise ConnectionError(f'Closed by server: {frame[1:]}')
+        elif kind == 'a':
+            for message in json.loads(frame[1:]):
+                if message.get('e') == 'md':
+                    self._handle_quotes(message.get('d', {}).get('quotes', []))
+                elif message.get('i') == self._authorize_id:
+                    if message.get('s') != 200:
+                        raise ConnectionError(f"Authorization failed: {message.get('d')}")
+                    self._authorized = True
+
+    def _reconcile(self, socket):
+        with self._lock:
+            wanted = set(self.symbols)
+        for symbol in wanted - self._subscribed:
+            if self._contract_id(symbol) is None:
+                continue
+            self._send(socket, 'md/subscribeQuote', {'symbol': symbol})
+            self._subscribed.add(symbol)
+        for symbol in self._subscribed - wanted:
+            self._send(socket, 'md/unsubscribeQuote', {'symbol': symbol})
+            self._subscribed.discard(symbol)
+            self._volumes.pop(symbol, None)
+
+    def _contract_id(self, symbol):
+        """Quotes name contracts by id; look each symbol's up once"""
+        if symbol not in self._contract_ids:
+            service = get_broker_service('tradovate')
+            response = broker_request(
+                'tradovate', 'contract/find', 'GET',
+                f"{service.demo_base_url}/contract/find",
+                headers={'Authorization': f"Bearer {self._access_token}"},
+                params={'name': symbol},
+                timeout=10
+            )
+            if response.status_code != 200:
+                return None  # retried on the next pass
+            contract = response.json()
+            if not contract:
+                logger.warning('Tradovate has no contract named %s', symbol)
+                self._contract_ids[symbol] = None
+                return None
+            self._contract_ids[symbol] = contract['id']
+            self._contracts[contract['id']] = symbol
+        return self._contract_ids[symbol]
+
+    def _handle_quotes(self, quotes):
+        for quote in quotes:
+            symbol = self._contracts.get(quote.get('contractId'))
+            if symbol is None or symbol not in self._subscribed:
+                continue
+            ts = datetime.fromisoformat(quote['timestamp'].replace('Z', '+00:00'))
+            entries = quote.get('entries', {})
+            bid, offer = entries.get('Bid'), entries.get('Offer')
+            if bid and offer and bid.get('price') is not None and offer.get('price') is not None:
+                self.store.record_quote(symbol, ts, bid['price'], offer['price'],
+                                        int(bid.get('size') or 0), int(offer.get('size') or 0))
+            trade = entries.get('Trade')
+            volume = entries.get('TotalTradeVolume', {}).get('size')
+            if trade and trade.get('price') is not None and volume is not None:
+                previous = self._volumes.get(symbol)
+                self._volumes[symbol] = volume
+                if previous is not None and volume > previous:
+                    self.store.record_trade(symbol, ts, trade['price'], int(volume - previous))
@@ -0,0 +1,222 @@
+import contextvars
+import functools
+import hashlib
+import hmac
+import itertools
+import os
+import threading
+import time
+
+from src.utils.metrics import registry
+
+# Priority classes, most urgent first
+ORDER = 0
+CANCEL = 1
+SYNC = 2
+CONNECTION_TEST = 3
+PRIORITY_NAMES = {ORDER: 'order', CANCEL: 'cancel', SYNC: 'sync', CONNECTION_TEST: 'connection_test'}
+
+# (requests per second, burst) per broker and per credential within a broker
+DEFAULT_LIMITS = {
+    'tradovate': {'broker': (20.0, 40), 'credential': (5.0, 10)},
+    'topstep': {'broker': (10.0, 20), 'credential': (3.0, 6)},
+}
+FALLBACK_LIMITS = {'broker': (10.0, 20), 'credential': (3.0, 6)}
+QUEUE_TIMEOUT = 60.0
+
+# Keys credential buckets so their names reveal nothing about the login
+SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+
+queue_wait = registry.histogram(
+    'broker_queue_wait_seconds', 'Time broker calls waited for a rate limit token', ('broker', 'priority'))
+throttled = registry.counter(
+    'broker_throttled_total', 'Broker responses that signalled throttling (HTTP 429)', ('broker',))
+
+_call_context = contextvars.ContextVar('broker_call', default=(SYNC, None))
+
+
+class RateLimitTimeout(Exception):
+    """A broker call waited longer than the queue timeout for a token"""
+
+
+def credential_key(credentials):
+    """Stable, non-reversible identifier for a broker login.
+
+    An HMAC under ``SECRET_KEY`` of the username, so a password change
+    keeps the same bucket; token-only logins are identified by their token.
+    """
+    identity = credentials.get('username') or credentials.get('api_token') or ''
+    return hmac.new(SECRET_KEY.encode(), str(identity).encode(), hashlib.sha256).hexdigest()
+
+
+def broker_call(priority):
+    """Decorate a broker service method whose first argument is ``credentials``.
+
+    Every ``broker_request`` made inside it, including the token exchange,
+    is scheduled with ``priority`` against that credential's bucket.
+    """
+
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, credentials, *args, **kwargs):
+            token = _call_context.set((priority, credential_key(credentials)))
+            try:
+                return method(self, credentials, *args, **kwargs)
+            finally:
+                _call_context.reset(token)
+        return wrapper
+
+    return decorate
+
+
+def current_call():
+    """``(priority, credential_key)`` of the broker call in progress"""
+    return _call_context.get()
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self.refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class BrokerScheduler:
+    """Token buckets for one broker and each of its credentials.
+
+    Callers queue in priority order. A waiter is granted once both the
+    broker bucket and its credential bucket have a token and no waiter
+    ahead of it could be granted instead; a higher-priority waiter that is
+    only held back by its own credential's bucket does not block others.
+    """
+
+    def __init__(self, broker, broker_limit, credential_limit, queue_timeout=QUEUE_TIMEOUT):
+        self.broker = broker
+        self.credential_limit = credential_limit
+        self.queue_timeout = queue_timeout
+        self._bucket = TokenBucket(*broker_limit)
+        self._credentials = {}
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _credential_bucket(self, key):
+        bucket = self._credentials.get(key)
+        if bucket is None:
+            bucket = self._credentials[key] = TokenBucket(*self.credential_limit)
+        return bucket
+
+    def _delay(self, key, now):
+        delay = self._bucket.delay(now)
+        if key is not None:
+            delay = max(delay, self._credential_bucket(key).delay(now))
+        return delay
+
+    def acquire(self, priority=SYNC, key=None):
+        """Block until the call may be sent; returns the seconds spent waiting"""
+        started = time.monotonic()
+        entry = (priority, next(self._sequence), key)
+        with self._condition:
+            self._waiting.append(entry)
+            self._waiting.sort()
+            try:
+                while True:
+                    now = time.monotonic()
+                    granted = next((waiter for waiter in self._waiting if not self._delay(waiter[2], now)), None)
+                    if granted is entry:
+                        self._bucket.tokens -= 1
+                        if key is not None:
+                            self._credentials[key].tokens -= 1
+                        break
+                    if granted is not None:
+                        # Someone ahead can go; let them run first
+                        self._condition.notify_all()
+
+                    remaining = self.queue_timeout - (now - started)
+                    if remaining <= 0:
+                        raise RateLimitTimeout(
+                            f'{self.broker} call waited {self.queue_timeout:.0f}s for a rate limit token')
+                    self._condition.wait(min(remaining, max(self._delay(key, now), 0.001)))
+            finally:
+                self._waiting.remove(entry)
+                self._condition.notify_all()
+        return time.monotonic() - started
+
+    def penalize(self, key=None, seconds=1.0):
+        """Hold back the credential (or the whole broker) after a throttling response"""
+        with self._condition:
+            bucket = self._credential_bucket(key) if key is not None else self._bucket
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            # Allow a single call when the penalty ends, then refill from there
+            bucket.tokens = 1.0
+            bucket.updated = bucket.blocked_until
+
+
+def _parse_limit(value, default):
+    if not value:
+        return default
+    rate, _, burst = value.partition(':')
+    return float(rate), int(burst or max(1, float(rate)))
+
+
+def _process_share(limit, processes):
+    """This process's part of a limit shared by ``processes`` processes"""
+    rate, burst = limit
+    return rate / processes, max(1, burst // processes)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(broker):
+    """Scheduler for a broker, or None when ``BROKER_RATE_LIMITS=off``.
+
+    Limits come from ``<BROKER>_RATE_LIMIT`` and
+    ``<BROKER>_CREDENTIAL_RATE_LIMIT`` as ``rate:burst`` (requests per
+    second and bucket size), falling back to ``DEFAULT_LIMITS``.
+
+    Buckets live in each process, so every process gets an equal share of
+    those limits: they are divided by ``BROKER_RATE_PROCESSES``, which
+    defaults to gunicorn's ``WEB_CONCURRENCY`` (1 when unset). Add any job
+    worker processes that call brokers to it; otherwise the combined rate
+    can reach the limit times the number of processes.
+    """
+    if os.environ.get('BROKER_RATE_LIMITS') == 'off':
+        return None
+    scheduler = _schedulers.get(broker)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(broker)
+            if scheduler is None:
+                defaults = DEFAULT_LIMITS.get(broker, FALLBACK_LIMITS)
+                prefix = broker.upper()
+                processes = max(1, int(os.environ.get('BROKER_RATE_PROCESSES',
+                                                      os.environ.get('WEB_CONCURRENCY', '1'))))
+                scheduler = _schedulers[broker] = BrokerScheduler(
+                    broker,
+                    _process_share(_parse_limit(os.environ.get(f'{prefix}_RATE_LIMIT'), defaults['broker']),
+                                   processes),
+                    _process_share(_parse_limit(os.environ.get(f'{prefix}_CREDENTIAL_RATE_LIMIT'),
+                                                defaults['credential']), processes),
+                    float(os.environ.get('BROKER_QUEUE_TIMEOUT', QUEUE_TIMEOUT))
+                )
+    return scheduler
@@ -0,0 +1,131 @@
+import json
+from collections import deque
+
+STRATEGY_TYPES = {}
+
+
+def register_strategy(name):
+    """Class decorator that makes a strategy available to ``strategy_config['type']``"""
+    def decorator(cls):
+        STRATEGY_TYPES[name] = cls
+        cls.strategy_type = name
+        return cls
+    return decorator
+
+
+def parse_config(strategy_config):
+    """Accept the stored JSON text or an already decoded dict"""
+    if isinstance(strategy_config, str):
+        return json.loads(strategy_config)
+    return dict(strategy_config)
+
+
+def create_strategy(strategy_config):
+    """Build a strategy instance from a ``TradingStrategy.strategy_config`` value"""
+    config = parse_config(strategy_config)
+    strategy_type = config.get('type')
+    if strategy_type not in STRATEGY_TYPES:
+        raise ValueError(f'Unknown strategy type: {strategy_type}')
+    return STRATEGY_TYPES[strategy_type](config)
+
+
+class Strategy:
+    """Base class shared by the live runtime and the backtester.
+
+    Event handlers receive plain dicts and return an iterable of order
+    intents (or ``None``). Intents use the same keys as the broker services'
+    ``place_order``: ``symbol``, ``side``, ``quantity``, ``order_type`` and
+    optionally ``price`` / ``stop_price``.
+    """
+
+    strategy_type = None
+
+    def __init__(self, config):
+        self.config = config
+        self.params = config.get('params', {})
+        self.symbols = set(config.get('symbols', []))
+        self.positions = {}
+
+    def wants(self, symbol):
+        return not self.symbols or symbol in self.symbols
+
+    def on_bar(self, bar):
+        return None
+
+    def on_tick(self, tick):
+        return None
+
+    def on_fill(self, fill):
+        signed = fill['quantity'] if fill['side'] == 'buy' else -fill['quantity']
+        self.positions[fill['symbol']] = self.positions.get(fill['symbol'], 0) + signed
+        return None
+
+    def handle(self, event):
+        """Dispatch an event dict to the matching handler"""
+        event_type = event['type']
+        if event_type == 'bar':
+            orders = self.on_bar(event)
+        elif event_type == 'tick':
+            orders = self.on_tick(event)
+        elif event_type == 'fill':
+            orders = self.on_fill(event)
+        else:
+            orders = None
+        return list(orders) if orders else []
+
+    @staticmethod
+    def market_order(symbol, side, quantity):
+        return {'symbol': symbol, 'side': side, 'quantity': quantity, 'order_type': 'market'}
+
+    @staticmethod
+    def limit_order(symbol, side, quantity, price):
+        return {'symbol': symbol, 'side': side, 'quantity': quantity, 'order_type': 'limit', 'price': price}
+
+
+@register_strategy('sma_cross')
+class SmaCrossStrategy(Strategy):
+    """Go long when the fast moving average crosses above the slow one and
+    flip short on the opposite cross."""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.fast = int(self.params.get('fast', 10))
+        self.slow = int(self.params.get('slow', 30))
+        self.quantity = int(self.params.get('quantity', 1))
+        if self.fast >= self.slow:
+            raise ValueError('fast period must be shorter than slow period')
+        self._closes = {}
+        self._sums = {}
+        self._last_signal = {}
+
+    def on_bar(self, bar):
+        symbol = bar['symbol']
+        closes = self._closes.get(symbol)
+        if closes is None:
+            closes = self._closes[symbol] = deque(maxlen=self.slow)
+            self._sums[symbol] = [0.0, 0.0]
+
+        # Keep running sums so each bar costs O(1)
+        sums = self._sums[symbol]
+        close = bar['close']
+        if len(closes) == self.slow:
+            sums[1] -= closes[0]
+        if len(closes) >= self.fast:
+            sums[0] -= closes[-self.fast]
+        closes.append(close)
+        sums[0] += close
+        sums[1] += close
+
+        if len(closes) < self.slow:
+            return None
+
+        signal = 1 if sums[0] / self.fast > sums[1] / self.slow else -1
+        if signal == self._last_signal.get(symbol):
+            return None
+        self._last_signal[symbol] = signal
+
+        target = signal * self.quantity
+        delta = target - self.positions.get(symbol, 0)
+        if delta == 0:
+            return None
+        return [self.market_order(symbol, 'buy' if delta > 0 else 'sell', abs(delta))]
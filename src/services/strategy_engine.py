@@ -0,0 +1,467 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.models.user import db, BrokerAccount, Order, TradingStrategy
+from src.services.broker_registry import load_credentials
+from src.services.change_feed import changes_since, current_cursor
+from src.services.order_service import place_order
+from src.services.market_data_store import NS_PER_SECOND
+from src.services.strategies import create_strategy, parse_config
+from src.services.subscriptions import get_subscription_manager
+
+# How often the runtime re-reads active strategies and new fills from the
+# database, so changes made by other processes are picked up
+POLL_SECONDS = float(os.environ.get('STRATEGY_POLL_SECONDS', '1'))
+
+# Strategy instance living inside a worker process
+_worker_strategy = None
+
+
+def _init_worker(strategy_config):
+    global _worker_strategy
+    _worker_strategy = create_strategy(strategy_config)
+
+
+def _handle_event(event):
+    """Run one event through the worker's strategy.
+
+    ``time.monotonic`` is system-wide on the platforms we deploy to, so the
+    decision timestamp can be compared with the parent process' clock.
+    """
+    started = time.monotonic()
+    orders = _worker_strategy.handle(event)
+    decided_at = time.monotonic()
+    return {
+        'orders': orders,
+        'decided_at': decided_at,
+        'compute_seconds': decided_at - started
+    }
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class StrategyWorker:
+    """One active strategy running in its own single-process executor"""
+
+    def __init__(self, strategy, max_pending=100, on_restart=None, restart_lock=None):
+        self.strategy_id = strategy.id
+        self.strategy_name = strategy.strategy_name
+        self.broker_account_id = strategy.broker_account_id
+        self.config = parse_config(strategy.strategy_config)
+        self.symbols = set(self.config.get('symbols', []))
+        self.quote_broker = None  # broker whose upstream feed holds our symbols
+        self.quote_login = None  # login key the hold was taken under
+        self.max_pending = max_pending
+        self.on_restart = on_restart  # called with the worker, under restart_lock, after its process is replaced
+        self.restarts = 0
+        self.pending = 0
+        self.events = 0
+        self.dropped_events = 0
+        self.errors = 0
+        self.orders_sent = 0
+        self.orders_failed = 0
+        self.decision_latency = deque(maxlen=1000)
+        self.compute_time = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._restart_lock = restart_lock or threading.Lock()
+        self.executor = self._start_executor()
+
+    def _start_executor(self):
+        return ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(self.config,))
+
+    def wants(self, symbol):
+        return not self.symbols or symbol in self.symbols
+
+    def submit(self, event, on_result):
+        """Queue an event unless the strategy is already too far behind"""
+        with self._lock:
+            # Market data for a backed-up strategy is dropped rather than queued
+            # without bound; fills are always delivered.
+            if self.pending >= self.max_pending and event['type'] != 'fill':
+                self.dropped_events += 1
+                return False
+            self.pending += 1
+            self.events += 1
+
+        executor = self.executor
+        try:
+            future = executor.submit(_handle_event, event)
+        except BrokenProcessPool:
+            self.restart(executor)
+            future = self.executor.submit(_handle_event, event)
+
+        def done(future):
+            with self._lock:
+                self.pending -= 1
+            try:
+                result = future.result()
+            except Exception:
+                self.errors += 1
+                return
+            self.compute_time.append(result['compute_seconds'])
+            on_result(self, result)
+
+        future.add_done_callback(done)
+        return True
+
+    def restart(self, broken=None):
+        """Replace a crashed worker process (strategy state starts fresh).
+
+        ``broken`` is the executor the caller saw fail; if another caller has
+        already replaced it, nothing is done.
+        """
+        with self._restart_lock:
+            if broken is not None and self.executor is not broken:
+                return
+            # Not under self._lock: cancelled futures run their callbacks here
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._start_executor()
+            self.restarts += 1
+            if self.on_restart is not None:
+                self.on_restart(self)
+
+    def stop(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        latency = list(self.decision_latency)
+        compute = list(self.compute_time)
+        return {
+            'strategy_id': self.strategy_id,
+            'strategy_name': self.strategy_name,
+            'events': self.events,
+            'pending_events': self.pending,
+            'dropped_events': self.dropped_events,
+            'errors': self.errors,
+            'orders_sent': self.orders_sent,
+            'orders_failed': self.orders_failed,
+            'decision_to_order_ms': {
+                'p50': _percentile(latency, 0.5) * 1000 if latency else None,
+                'p99': _percentile(latency, 0.99) * 1000 if latency else None,
+                'max': max(latency) * 1000 if latency else None
+            },
+            'compute_ms': {
+                'p50': _percentile(compute, 0.5) * 1000 if compute else None,
+                'p99': _percentile(compute, 0.99) * 1000 if compute else None
+            }
+        }
+
+
+class StrategyRuntime:
+    """Event loop that feeds active strategies and routes their orders.
+
+    Market data and fills are pushed onto an in-memory queue and fanned out
+    to every interested strategy. Each strategy runs in its own worker
+    process, so a slow or crashing strategy only delays itself. Orders
+    returned by strategies are placed through the broker services on a
+    separate routing thread and recorded as ``Order`` rows tagged with the
+    strategy.
+
+    A poll thread keeps the runtime in line with the database, wherever
+    the change was made: strategies activated or deactivated by any web
+    worker are started or stopped, and fills recorded on a strategy's
+    orders (by order placement or an account sync) are delivered to it
+    from the change journal. A new worker is first replayed the fills of
+    the strategy's existing orders so it starts from its actual position,
+    and so is one whose process crashed and was replaced.
+    """
+
+    def __init__(self, max_pending=100, bar_seconds=60):
+        self.max_pending = max_pending
+        self.bar_ns = bar_seconds * NS_PER_SECOND
+        self.workers = {}
+        self._bars = {}
+        self._events = queue.Queue()
+        self._orders = queue.Queue()
+        self._app = None
+        self._threads = []
+        self._running = False
+        self._wake = threading.Event()
+        self._poll_lock = threading.Lock()
+        self._fill_cursor = None
+        self._delivered = {}  # strategy id -> {order id: filled quantity already delivered}
+        self._restarted = set()  # strategy ids whose replaced worker awaits its fills
+        # Held while fills are recorded as delivered and while a worker restarts,
+        # so every fill is tagged for exactly one of a worker's processes
+        self._fills_lock = threading.RLock()
+
+    def start(self, app):
+        self._app = app
+        self._running = True
+        self.poll()
+        self._threads = [
+            threading.Thread(target=self._event_loop, name='strategy-events', daemon=True),
+            threading.Thread(target=self._order_loop, name='strategy-orders', daemon=True),
+            threading.Thread(target=self._poll_loop, name='strategy-poll', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self._events.put(None)
+        self._orders.put(None)
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        for worker in self.workers.values():
+            worker.stop()
+            self._release_quotes(worker)
+        self.workers = {}
+
+    def wake(self):
+        """Poll the database now instead of at the next interval"""
+        self._wake.set()
+
+    def _poll_loop(self):
+        while self._running:
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                self.poll()
+            except Exception:
+                pass  # retried on the next poll
+
+    def poll(self):
+        """Pick up strategy activation changes and new fills from the database"""
+        if self._app is None:
+            return
+        with self._poll_lock, self._app.app_context():
+            try:
+                if self._fill_cursor is None:
+                    # New workers replay their fills; only later ones come from the journal
+                    self._fill_cursor = current_cursor()
+                self._reload()
+                self._replay_restarted()
+                self._poll_fills()
+            finally:
+                db.session.remove()
+
+    def reload(self):
+        """Start workers for newly active strategies and stop deactivated ones"""
+        self.poll()
+
+    def _reload(self):
+        active = {strategy.id: strategy for strategy in TradingStrategy.query.filter_by(is_active=True).all()}
+        for strategy_id in list(self.workers):
+            if strategy_id not in active:
+                worker = self.workers.pop(strategy_id)
+                worker.stop()
+                self._release_quotes(worker)
+                self._delivered.pop(strategy_id, None)
+        for strategy_id, strategy in active.items():
+            if strategy_id not in self.workers:
+                worker = self.workers[strategy_id] = StrategyWorker(
+                    strategy, self.max_pending, on_restart=self._on_restart, restart_lock=self._fills_lock)
+                self._retain_quotes(worker, strategy.broker_account)
+                self._replay_fills(worker)
+
+    # Fills
+
+    def _replay_fills(self, worker):
+        """Deliver every fill of a new worker's strategy so it starts from its real position"""
+        orders = Order.query.filter(Order.strategy_id == worker.strategy_id, Order.filled_quantity > 0) \
+            .order_by(Order.id).all()
+        with self._fills_lock:
+            self._delivered[worker.strategy_id] = {}
+            for order in orders:
+                self.deliver_fill(order)
+
+    def _on_restart(self, worker):
+        """Forget what a crashed worker was told and have the poll thread replay it"""
+        self._delivered.pop(worker.strategy_id, None)
+        self._restarted.add(worker.strategy_id)
+        self.wake()
+
+    def _replay_restarted(self):
+        for strategy_id in list(self._restarted):
+            self._restarted.discard(strategy_id)
+            worker = self.workers.get(strategy_id)
+            if worker is not None:
+                self._replay_fills(worker)
+
+    def _poll_fills(self):
+        account_ids = sorted({worker.broker_account_id for worker in self.workers.values()})
+        if not account_ids:
+            self._fill_cursor = current_cursor()
+            return
+        changes = changes_since(Order, account_ids, self._fill_cursor)
+        if changes is None:
+            # Behind the retained journal: rescan every strategy order
+            cursor = current_cursor()
+            orders = Order.query.filter(Order.strategy_id.in_(list(self.workers)), Order.filled_quantity > 0).all()
+        else:
+            cursor, orders, _, _ = changes
+        for order in sorted(orders, key=lambda order: order.id):
+            self.deliver_fill(order)
+        self._fill_cursor = cursor
+
+    def deliver_fill(self, order):
+        """Publish the part of an Order row's fill its strategy has not seen yet"""
+        with self._fills_lock:
+            return self._deliver_fill(order)
+
+    def _deliver_fill(self, order):
+        delivered = self._delivered.get(order.strategy_id)
+        if delivered is None or not order.filled_quantity:
+            return False
+        quantity = order.filled_quantity - delivered.get(order.id, 0)
+        if quantity <= 0:
+            return False
+        delivered[order.id] = order.filled_quantity
+        worker = self.workers.get(order.strategy_id)
+        self.publish_fill(order.strategy_id, {
+            # Fills queued for a worker's previous process are replayed to the new one
+            'restarts': worker.restarts if worker is not None else 0,
+            'order_id': order.id,
+            'symbol': order.symbol,
+            'side': order.side,
+            'quantity': quantity,
+            'price': float(order.filled_price) if order.filled_price else None
+        })
+        return True
+
+    def _retain_quotes(self, worker, broker_account):
+        """Hold a strategy's symbols on its broker's upstream feed, shared with other consumers"""
+        if not worker.symbols or broker_account is None:
+            return
+        try:
+            login = get_subscription_manager().retain(broker_account.broker_type,
+                                                      load_credentials(broker_account), worker.symbols)
+            if login is not None:
+                worker.quote_broker = broker_account.broker_type
+                worker.quote_login = login
+        except Exception:
+            pass  # the strategy still sees ticks ingested by other means
+
+    def _release_quotes(self, worker):
+        if worker.quote_broker is not None:
+            get_subscription_manager().release(worker.quote_broker, worker.symbols, worker.quote_login)
+            worker.quote_broker = worker.quote_login = None
+
+    # Event ingress
+
+    def publish_tick(self, symbol, kind, ts, price, size=0):
+        """Tick listener compatible with ``TickStore.subscribe``"""
+        if kind == 'trade':
+            self._update_bar(symbol, ts, price, size)
+        self._events.put({
+            'type': 'tick', 'symbol': symbol, 'kind': kind, 'ts': ts, 'price': price,
+            'received_at': time.monotonic()
+        })
+
+    def _update_bar(self, symbol, ts, price, size):
+        """Build bars from trades and publish each one when its interval closes.
+
+        Volume is the traded size, as in bars aggregated from the tick store.
+        """
+        bucket = ts - ts % self.bar_ns
+        bar = self._bars.get(symbol)
+        if bar is not None and bar['ts'] != bucket:
+            self.publish_bar(bar)
+            bar = None
+        if bar is None:
+            self._bars[symbol] = {
+                'symbol': symbol, 'ts': bucket, 'open': price, 'high': price,
+                'low': price, 'close': price, 'volume': 0
+            }
+            bar = self._bars[symbol]
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['close'] = price
+        bar['volume'] += size
+
+    def publish_bar(self, bar):
+        event = dict(bar, type='bar', received_at=time.monotonic())
+        self._events.put(event)
+
+    def publish_fill(self, strategy_id, fill):
+        event = dict(fill, type='fill', strategy_id=strategy_id, received_at=time.monotonic())
+        self._events.put(event)
+
+    def _event_loop(self):
+        while self._running:
+            event = self._events.get()
+            if event is None:
+                break
+            if event['type'] == 'fill':
+                worker = self.workers.get(event['strategy_id'])
+                if worker and event.get('restarts', 0) == worker.restarts:
+                    worker.submit(event, self._on_result)
+                continue
+            for worker in list(self.workers.values()):
+                if worker.wants(event['symbol']):
+                    worker.submit(event, self._on_result)
+
+    def _on_result(self, worker, result):
+        for order in result['orders']:
+            self._orders.put((worker, order, result['decided_at']))
+
+    # Order routing
+
+    def _order_loop(self):
+        while self._running:
+            item = self._orders.get()
+            if item is None:
+                break
+            worker, order, decided_at = item
+            with self._app.app_context():
+                try:
+                    success = self.route_order(worker, order)
+                except Exception:
+                    db.session.rollback()
+                    success = False
+            if success:
+                worker.orders_sent += 1
+                worker.decision_latency.append(time.monotonic() - decided_at)
+            else:
+                worker.orders_failed += 1
+
+    def route_order(self, worker, order):
+        """Place a strategy order with its broker and record it"""
+        if self.workers.get(worker.strategy_id) is not worker:
+            return False  # the strategy was stopped after deciding this order
+
+        broker_account = BrokerAccount.query.get(worker.broker_account_id)
+        if broker_account is None:
+            return False
+
+        return place_order(broker_account, order, strategy_id=worker.strategy_id)['success']
+
+    def stats(self):
+        return {
+            'running': self._running,
+            'queued_events': self._events.qsize(),
+            'queued_orders': self._orders.qsize(),
+            'strategies': [worker.stats() for worker in self.workers.values()]
+        }
+
+
+_runtime = None
+
+
+def get_strategy_runtime():
+    """Process-wide strategy runtime instance"""
+    global _runtime
+    if _runtime is None:
+        _runtime = StrategyRuntime()
+    return _runtime
+
+
+def current_strategy_runtime():
+    """The runtime running in this process, or None"""
+    if _runtime is not None and _runtime._running:
+        return _runtime
+    return None
@@ -0,0 +1,318 @@
+import logging
+import os
+import threading
+
+from src.services.market_data_store import get_tick_store
+from src.services.quote_feeds import QUOTE_FEEDS, open_quote_feed
+from src.services.rate_limiter import credential_key
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Ticks a subscriber may fall behind before its updates are conflated
+BUFFER_SIZE = int(os.environ.get('SUBSCRIPTION_BUFFER_SIZE', '1024'))
+
+open_subscriptions = registry.gauge(
+    'market_data_subscriptions', 'Open in-process market data subscriptions')
+upstream_symbols = registry.gauge(
+    'market_data_upstream_symbols', 'Symbols subscribed on upstream quote feeds', ('broker',))
+
+
+class RingBuffer:
+    """Bounded single-producer, single-consumer tick buffer that conflates when full.
+
+    The ring itself takes no lock: the producer only advances ``_tail`` and
+    the consumer only ``_head``, and a slot is published by storing
+    ``_tail`` after it is written, which relies on the GIL making each of
+    those stores atomic. Once the consumer is ``capacity`` ticks behind, the
+    producer stops queueing and keeps only the newest tick per symbol and
+    kind in ``_latest``, handed out after the ring drains, until the
+    consumer has caught up. Both sides change ``_latest``, so it has a small
+    lock of its own. It hands ticks out in the order they were last updated,
+    so each symbol's ticks stay in time order. A slow consumer skips
+    intermediate prices instead of holding up the feed or growing without
+    bound.
+    """
+
+    __slots__ = ('_slots', '_mask', '_head', '_tail', '_latest', '_latest_lock', '_conflating', 'conflated')
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self._slots = [None] * size
+        self._mask = size - 1
+        self._head = 0
+        self._tail = 0
+        self._latest = {}
+        self._latest_lock = threading.Lock()
+        self._conflating = False
+        self.conflated = 0
+
+    def __len__(self):
+        return self._tail - self._head + len(self._latest)
+
+    def push(self, tick):
+        """Producer side: queue a ``(symbol, kind, ts, price)`` tick"""
+        tail = self._tail
+        if self._conflating:
+            if tail == self._head and not self._latest:
+                self._conflating = False
+            else:
+                self._conflate(tick)
+                return
+        if tail - self._head > self._mask:
+            self._conflating = True
+            self._conflate(tick)
+            return
+        self._slots[tail & self._mask] = tick
+        self._tail = tail + 1
+
+    def _conflate(self, tick):
+        key = (tick[0], tick[1])
+        with self._latest_lock:
+            # Re-inserted at the end, so the dict stays in update order
+            if self._latest.pop(key, None) is not None:
+                self.conflated += 1
+            self._latest[key] = tick
+
+    def drain(self, limit=None):
+        """Consumer side: take queued ticks oldest first, then conflated ones"""
+        head, tail = self._head, self._tail
+        if limit is not None:
+            tail = min(tail, head + limit)
+        slots, mask = self._slots, self._mask
+        ticks = [slots[index & mask] for index in range(head, tail)]
+        self._head = tail
+        # Conflated ticks are newer than anything in the ring, so they come last
+        if tail == self._tail and self._latest:
+            with self._latest_lock:
+                latest = self._latest
+                while latest and (limit is None or len(ticks) < limit):
+                    ticks.append(latest.pop(next(iter(latest))))
+        return ticks
+
+
+class Subscription:
+    """One consumer's feed of ticks for a set of symbols.
+
+    Ticks are pushed by the manager and read with ``get()`` from a single
+    consumer thread. Close it (or use it as a context manager) to release
+    its symbols.
+    """
+
+    def __init__(self, manager, symbols, broker_type=None, capacity=BUFFER_SIZE, login=None):
+        self.symbols = frozenset(symbols)
+        self.broker_type = broker_type
+        self.login = login
+        self.buffer = RingBuffer(capacity)
+        self.closed = False
+        self._manager = manager
+        self._wake = threading.Event()
+
+    def push(self, tick):
+        self.buffer.push(tick)
+        if not self._wake.is_set():
+            self._wake.set()
+
+    def get(self, timeout=None, limit=None):
+        """Ticks received since the last call, waiting up to ``timeout`` for one"""
+        self._wake.clear()
+        ticks = self.buffer.drain(limit)
+        if not ticks and timeout != 0:
+            self._wake.wait(timeout)
+            ticks = self.buffer.drain(limit)
+        return ticks
+
+    def close(self):
+        self._manager.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        return {
+            'symbols': sorted(self.symbols),
+            'broker_type': self.broker_type,
+            'queued': len(self.buffer),
+            'conflated': self.buffer.conflated
+        }
+
+
+class SubscriptionManager:
+    """Reference-counted market data subscriptions shared by the whole process.
+
+    Every ``(broker, symbol)`` pair is subscribed once on the broker's
+    upstream quote feed, however many consumers hold it, and dropped when
+    the last one releases it. Feed ticks go through the tick store, so they
+    are stored, marked to market and seen by strategies as before, and the
+    manager fans each one out to the ring buffers of the subscriptions
+    interested in its symbol. Fan-out is serialised, keeping every ring
+    single-producer.
+
+    Each hold is taken under a broker login. A broker's feed signs in with
+    one holder's login; when the last hold under that login is released
+    while others still hold symbols, the feed is reopened with another
+    holder's credentials, so it never outlives its login's holders.
+    """
+
+    def __init__(self, store=None, capacity=BUFFER_SIZE):
+        self.store = store or get_tick_store()
+        self.capacity = capacity
+        self._routes = {}  # symbol -> tuple of subscriptions, replaced on change
+        self._refcounts = {}  # (broker type, symbol) -> holders
+        self._feeds = {}  # broker type -> upstream quote feed
+        self._feed_logins = {}  # broker type -> login key the feed signed in with
+        self._logins = {}  # broker type -> {login key: [credentials, holds]}
+        self._subscriptions = set()
+        self._listening = False
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+
+    # Upstream
+
+    def retain(self, broker_type, credentials, symbols):
+        """Hold upstream subscriptions for ``symbols`` under a login.
+
+        Returns the login key to pass to ``release``, or None if the broker
+        has no feed.
+        """
+        if broker_type not in QUOTE_FEEDS:
+            return None
+        symbols = list(symbols)
+        login = credential_key(credentials)
+        with self._lock:
+            feed = self._feeds.get(broker_type)
+            if feed is None:
+                feed = self._feeds[broker_type] = open_quote_feed(broker_type, credentials, self.store)
+                self._feed_logins[broker_type] = login
+            holder = self._logins.setdefault(broker_type, {}).setdefault(login, [credentials, 0])
+            holder[0] = credentials  # the newest, should the password have changed
+            holder[1] += len(symbols)
+            for symbol in symbols:
+                key = (broker_type, symbol)
+                self._refcounts[key] = self._refcounts.get(key, 0) + 1
+                if self._refcounts[key] == 1:
+                    feed.subscribe(symbol)
+            upstream_symbols.set(len(feed.symbols), broker=broker_type)
+        return login
+
+    def release(self, broker_type, symbols, login=None):
+        """Drop holds taken by ``retain``; the last one unsubscribes upstream"""
+        symbols = list(symbols)
+        with self._lock:
+            logins = self._logins.get(broker_type, {})
+            holder = logins.get(login)
+            if holder is not None:
+                holder[1] -= len(symbols)
+                if holder[1] <= 0:
+                    del logins[login]
+            feed = self._feeds.get(broker_type)
+            for symbol in symbols:
+                key = (broker_type, symbol)
+                count = self._refcounts.get(key, 0) - 1
+                if count > 0:
+                    self._refcounts[key] = count
+                    continue
+                self._refcounts.pop(key, None)
+                if feed is not None:
+                    feed.unsubscribe(symbol)
+            if feed is None:
+                return
+            if not feed.symbols:
+                feed.close()
+                del self._feeds[broker_type]
+                self._feed_logins.pop(broker_type, None)
+                self._logins.pop(broker_type, None)
+            elif self._feed_logins.get(broker_type) not in logins and logins:
+                feed = self._reopen_feed(broker_type, feed, logins)
+            upstream_symbols.set(len(feed.symbols), broker=broker_type)
+
+    def _reopen_feed(self, broker_type, feed, logins):
+        """Move a broker's feed to a login that still holds symbols (needs ``_lock``)"""
+        login, (credentials, _) = next(iter(logins.items()))
+        replacement = open_quote_feed(broker_type, credentials, self.store)
+        for symbol in feed.symbols:
+            replacement.subscribe(symbol)
+        feed.close()
+        self._feeds[broker_type] = replacement
+        self._feed_logins[broker_type] = login
+        return replacement
+
+    # Consumers
+
+    def subscribe(self, symbols, broker_type=None, credentials=None, capacity=None):
+        """Open a subscription to ``symbols``, held upstream on the broker's feed if given"""
+        symbols = frozenset(symbols)
+        login = None
+        if broker_type is not None:
+            try:
+                login = self.retain(broker_type, credentials, symbols)
+            except Exception:
+                logger.exception('Could not open the %s quote feed', broker_type)
+        subscription = Subscription(self, symbols, broker_type if login is not None else None,
+                                    capacity or self.capacity, login=login)
+        with self._lock:
+            if not self._listening:
+                self.store.subscribe(self.on_tick)
+                self._listening = True
+            for symbol in symbols:
+                self._routes[symbol] = self._routes.get(symbol, ()) + (subscription,)
+            self._subscriptions.add(subscription)
+            open_subscriptions.set(len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for symbol in subscription.symbols:
+                remaining = tuple(other for other in self._routes.get(symbol, ()) if other is not subscription)
+                if remaining:
+                    self._routes[symbol] = remaining
+                else:
+                    self._routes.pop(symbol, None)
+            self._subscriptions.discard(subscription)
+            open_subscriptions.set(len(self._subscriptions))
+        if subscription.broker_type is not None:
+            self.release(subscription.broker_type, subscription.symbols, subscription.login)
+
+    def on_tick(self, symbol, kind, ts, price, size=0):
+        """Tick listener compatible with ``TickStore.subscribe``"""
+        subscriptions = self._routes.get(symbol)
+        if not subscriptions:
+            return
+        tick = (symbol, kind, ts, price)
+        with self._dispatch_lock:
+            for subscription in subscriptions:
+                subscription.push(tick)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscriptions': [subscription.stats() for subscription in self._subscriptions],
+                'upstream': {
+                    broker_type: sorted(feed.symbols) for broker_type, feed in self._feeds.items()
+                },
+                'holders': {
+                    f'{broker_type}:{symbol}': count for (broker_type, symbol), count in self._refcounts.items()
+                }
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_subscription_manager():
+    """Process-wide subscription manager"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SubscriptionManager()
+    return _manager
@@ -0,0 +1,173 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from src.models.user import db, BrokerAccount
+from src.services.account_sync import refresh_valuations, stage_sync, sync_result
+from src.services.order_service import notify_fills
+from src.utils.metrics import registry, COUNT_BUCKETS
+
+flush_latency = registry.histogram(
+    'sync_flush_seconds', 'Time to stage and commit one batch of sync results')
+flush_wait = registry.histogram(
+    'sync_write_wait_seconds', 'Time from a sync submitting its results to their commit')
+batch_size = registry.histogram(
+    'sync_batch_size', 'Syncs committed per batch', buckets=COUNT_BUCKETS)
+
+
+class _PendingSync:
+    __slots__ = ('account_id', 'credentials', 'remote_accounts', 'positions', 'orders', 'future', 'submitted')
+
+    def __init__(self, account_id, credentials, remote_accounts, positions, orders):
+        self.account_id = account_id
+        self.credentials = credentials
+        self.remote_accounts = remote_accounts
+        self.positions = positions
+        self.orders = orders
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class SyncWriteBuffer:
+    """Group commit for sync results.
+
+    Syncs fetch from their broker concurrently, then hand the normalised
+    results to this buffer and wait. A single writer thread stages every
+    pending sync into one session, in submission order, and commits them in
+    one transaction once ``max_batch`` syncs are waiting or the oldest has
+    waited ``max_delay`` seconds. Because one thread applies them in order,
+    two syncs touching the same account are written in the order they were
+    submitted within this process. If a batch fails to commit, its syncs
+    are retried one transaction each, so only the faulty one fails.
+
+    Should the writer thread die, the syncs it held and any still queued
+    fail with the error, and the next ``submit`` starts a new thread.
+    """
+
+    def __init__(self, app, max_batch=100, max_delay=0.05):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sync-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, account_id, credentials, remote_accounts, positions, orders):
+        """Queue one sync's results; the future resolves to its ``sync_result`` data"""
+        pending = _PendingSync(account_id, credentials, remote_accounts, positions, orders)
+        self._queue.put(pending)
+        self._ensure_thread()
+        return pending.future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].submitted + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._next_batch()
+                with self.app.app_context():
+                    try:
+                        self._flush(batch)
+                    except Exception:
+                        db.session.rollback()
+                        for pending in batch:
+                            self._flush([pending], isolated=True)
+                    finally:
+                        db.session.remove()
+        except BaseException as e:
+            self._fail_pending(batch, e)
+            raise
+
+    def _fail_pending(self, batch, error):
+        """Fail the syncs of a dying writer so their callers are not left waiting"""
+        error = RuntimeError(f'Sync writer stopped: {error!r}')
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    def _flush(self, batch, isolated=False):
+        started = time.monotonic()
+        try:
+            staged = []
+            for pending in batch:
+                broker_account = db.session.get(BrokerAccount, pending.account_id)
+                if broker_account is None:
+                    raise LookupError(f'Broker account {pending.account_id} no longer exists')
+                results, synced = stage_sync(broker_account, pending.credentials, pending.remote_accounts,
+                                             pending.positions, pending.orders)
+                staged.append((pending, broker_account, results, synced))
+            db.session.flush()
+            payloads = [sync_result(broker_account, results, synced)
+                        for _, broker_account, results, synced in staged]
+            db.session.commit()
+        except Exception as e:
+            if not isolated:
+                raise
+            db.session.rollback()
+            batch[0].future.set_exception(e)
+            return
+
+        committed = time.monotonic()
+        flush_latency.observe(committed - started)
+        batch_size.observe(len(batch))
+        accounts = {}
+        for pending, _, _, synced in staged:
+            for account in synced:
+                accounts[account.id] = account
+        try:
+            refresh_valuations(accounts.values())
+        except Exception:
+            pass  # the engine reloads positions on its own; the writes are committed
+        try:
+            notify_fills()
+        except Exception:
+            pass  # the strategy runtime also polls for fills
+        for (pending, _, _, _), payload in zip(staged, payloads):
+            flush_wait.observe(committed - pending.submitted)
+            pending.future.set_result(payload)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_sync_writer():
+    """The process's write buffer, or None when ``SYNC_WRITE_BUFFER=off``"""
+    global _writer
+    if os.environ.get('SYNC_WRITE_BUFFER') == 'off':
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = SyncWriteBuffer(
+                    current_app._get_current_object(),
+                    max_batch=int(os.environ.get('SYNC_BATCH_SIZE', '100')),
+                    max_delay=float(os.environ.get('SYNC_FLUSH_MS', '50')) / 1000
+                )
+    return _writer
@@ -1,13 +1,18 @@
+import os
 import requests
 import json
 from datetime import datetime, timedelta
 from src.models.user import db, Position, Order, Trade
+from src.services.account_sync import sync_accounts
+from src.services.broker_http import broker_request, parallel
+from src.services.rate_limiter import broker_call, ORDER, CANCEL, SYNC, CONNECTION_TEST
 
 class TopStepService:
     def __init__(self):
-        self.base_url = "https://api.projectx.com/v1"  # Placeholder URL
+        self.base_url = os.environ.get('TOPSTEP_BASE_URL', "https://api.projectx.com/v1")  # Placeholder URL
         self.dashboard_url = "https://dashboard.projectx.com"
         
+    @broker_call(CONNECTION_TEST)
     def test_connection(self, credentials):
         """Test connection to TopStep API"""
         try:
@@ -24,36 +29,31 @@ class TopStepService:
                 'Content-Type': 'application/json'
             }
             
-            # Test API call to get user info
-            response = requests.get(
-                f"{self.base_url}/user/profile",
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                user_data = response.json()
-                
-                # Get account information
-                accounts_response = requests.get(
+            # Test API call to get user info, fetching the account list alongside
+            response, accounts_response = parallel(
+                lambda: broker_request(
+                    'topstep', 'user/profile', 'GET',
+                    f"{self.base_url}/user/profile",
+                    headers=headers,
+                    timeout=30
+                ),
+                lambda: broker_request(
+                    'topstep', 'accounts', 'GET',
                     f"{self.base_url}/accounts",
                     headers=headers,
                     timeout=30
                 )
+            )
+            
+            if response.status_code == 200:
+                user_data = response.json()
                 
+                accounts = []
                 account_info = {}
                 if accounts_response.status_code == 200:
-                    accounts = accounts_response.json()
-                    if accounts and len(accounts) > 0:
-                        account = accounts[0]  # Use first account
-                        account_info = {
-                            'account_id': str(account.get('id', '')),
-                            'account_name': account.get('name', ''),
-                            'balance': account.get('balance', 0),
-                            'equity': account.get('equity', 0),
-                            'margin_used': account.get('margin_used', 0),
-                            'margin_available': account.get('margin_available', 0)
-                        }
+                    accounts = [self._account_info(account) for account in accounts_response.json()]
+                    if accounts:
+                        account_info = accounts[0]
                     else:
                         # Default account info if no accounts found
                         account_info = {
@@ -68,7 +68,8 @@ class TopStepService:
                 return {
                     'success': True,
                     'message': 'Connection successful',
-                    'account_info': account_info
+                    'account_info': account_info,
+                    'accounts': accounts or [account_info]
                 }
             elif response.status_code == 401:
                 return {
@@ -110,8 +111,33 @@ class TopStepService:
                 'error': f"Connection test failed: {str(e)}"
             }
     
+    @staticmethod
+    def _account_info(account):
+        return {
+            'account_id': str(account.get('id', '')),
+            'account_name': account.get('name', ''),
+            'balance': account.get('balance', 0),
+            'equity': account.get('equity', 0),
+            'margin_used': account.get('margin_used', 0),
+            'margin_available': account.get('margin_available', 0)
+        }
+    
+    def _fetch(self, endpoint, headers):
+        """GET a resource, or None when the API is not reachable"""
+        try:
+            return broker_request(
+                'topstep', endpoint, 'GET',
+                f"{self.base_url}/{endpoint}",
+                headers=headers,
+                timeout=30
+            )
+        except requests.exceptions.RequestException:
+            # If API is not available, use demo data
+            return None
+    
+    @broker_call(SYNC)
     def sync_account_data(self, credentials, broker_account):
-        """Sync account data from TopStep"""
+        """Sync every account behind this API token from TopStep"""
         try:
             api_token = credentials.get('api_token')
             
@@ -120,122 +146,47 @@ class TopStepService:
                 'Content-Type': 'application/json'
             }
             
-            # Try to get account information
-            try:
-                accounts_response = requests.get(
-                    f"{self.base_url}/accounts",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if accounts_response.status_code == 200:
-                    accounts = accounts_response.json()
-                    if accounts:
-                        account = accounts[0]  # Use first account
-                        
-                        # Update broker account with latest data
-                        broker_account.balance = account.get('balance', broker_account.balance)
-                        broker_account.equity = account.get('equity', broker_account.equity)
-                        broker_account.margin_used = account.get('margin_used', broker_account.margin_used)
-                        broker_account.margin_available = account.get('margin_available', broker_account.margin_available)
-                
-            except requests.exceptions.RequestException:
-                # If API is not available, use demo data
-                pass
+            # Fetch everything before touching the database so the write
+            # transaction is not held open while calls wait for rate limits.
+            # The list calls cover every account of the user at once.
+            accounts_response = self._fetch('accounts', headers)
+            positions_response = self._fetch('positions', headers)
+            orders_response = self._fetch('orders', headers)
             
-            # Try to get positions
-            positions_data = []
-            try:
-                positions_response = requests.get(
-                    f"{self.base_url}/positions",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if positions_response.status_code == 200:
-                    positions = positions_response.json()
-                    
-                    # Update positions in database
-                    for pos_data in positions:
-                        if pos_data.get('quantity', 0) != 0:  # Only active positions
-                            # Check if position already exists
-                            existing_position = Position.query.filter_by(
-                                broker_account_id=broker_account.id,
-                                symbol=pos_data.get('symbol', '')
-                            ).first()
-                            
-                            if existing_position:
-                                # Update existing position
-                                existing_position.quantity = abs(pos_data.get('quantity', 0))
-                                existing_position.side = 'long' if pos_data.get('quantity', 0) > 0 else 'short'
-                                existing_position.current_price = pos_data.get('current_price', 0)
-                                existing_position.unrealized_pnl = pos_data.get('unrealized_pnl', 0)
-                                existing_position.updated_at = datetime.utcnow()
-                            else:
-                                # Create new position
-                                new_position = Position(
-                                    broker_account_id=broker_account.id,
-                                    symbol=pos_data.get('symbol', ''),
-                                    side='long' if pos_data.get('quantity', 0) > 0 else 'short',
-                                    quantity=abs(pos_data.get('quantity', 0)),
-                                    entry_price=pos_data.get('entry_price', 0),
-                                    current_price=pos_data.get('current_price', 0),
-                                    unrealized_pnl=pos_data.get('unrealized_pnl', 0),
-                                    opened_at=datetime.utcnow()
-                                )
-                                db.session.add(new_position)
-                            
-                            positions_data.append({
-                                'symbol': pos_data.get('symbol', ''),
-                                'side': 'long' if pos_data.get('quantity', 0) > 0 else 'short',
-                                'quantity': abs(pos_data.get('quantity', 0)),
-                                'unrealized_pnl': pos_data.get('unrealized_pnl', 0)
-                            })
-                            
-            except requests.exceptions.RequestException:
-                # If API is not available, use demo data
-                pass
+            accounts = []
+            if accounts_response is not None and accounts_response.status_code == 200:
+                accounts = [self._account_info(account) for account in accounts_response.json()]
             
-            # Try to get orders
-            orders_data = []
-            try:
-                orders_response = requests.get(
-                    f"{self.base_url}/orders",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if orders_response.status_code == 200:
-                    orders = orders_response.json()
-                    
-                    for order_data in orders:
-                        orders_data.append({
-                            'id': order_data.get('id'),
-                            'symbol': order_data.get('symbol', ''),
-                            'side': order_data.get('side', '').lower(),
-                            'quantity': order_data.get('quantity', 0),
-                            'price': order_data.get('price', 0),
-                            'status': order_data.get('status', '').lower()
-                        })
-                        
-            except requests.exceptions.RequestException:
-                # If API is not available, use demo data
-                pass
+            positions = []
+            if positions_response is not None and positions_response.status_code == 200:
+                for pos_data in positions_response.json():
+                    positions.append({
+                        'account_id': str(pos_data['account_id']) if pos_data.get('account_id') is not None else None,
+                        'symbol': pos_data.get('symbol', ''),
+                        'net_quantity': pos_data.get('quantity', 0),
+                        'entry_price': pos_data.get('entry_price', 0),
+                        'current_price': pos_data.get('current_price', 0),
+                        'unrealized_pnl': pos_data.get('unrealized_pnl', 0)
+                    })
             
-            db.session.commit()
+            orders = []
+            if orders_response is not None and orders_response.status_code == 200:
+                for order_data in orders_response.json():
+                    orders.append({
+                        'account_id': str(order_data['account_id']) if order_data.get('account_id') is not None else None,
+                        'id': order_data.get('id'),
+                        'symbol': order_data.get('symbol', ''),
+                        'side': order_data.get('side', '').lower(),
+                        'quantity': order_data.get('quantity', 0),
+                        'price': order_data.get('price', 0),
+                        'status': order_data.get('status', '').lower()
+                    })
+            
+            data = sync_accounts(broker_account, credentials, accounts, positions, orders)
             
             return {
                 'success': True,
-                'data': {
-                    'account': {
-                        'balance': float(broker_account.balance) if broker_account.balance else 0,
-                        'equity': float(broker_account.equity) if broker_account.equity else 0,
-                        'margin_used': float(broker_account.margin_used) if broker_account.margin_used else 0,
-                        'margin_available': float(broker_account.margin_available) if broker_account.margin_available else 0
-                    },
-                    'positions': positions_data,
-                    'orders': orders_data
-                }
+                'data': data
             }
             
         except Exception as e:
@@ -245,6 +196,7 @@ class TopStepService:
                 'error': f"Sync failed: {str(e)}"
             }
     
+    @broker_call(ORDER)
     def place_order(self, credentials, order_data):
         """Place an order through TopStep API"""
         try:
@@ -263,6 +215,9 @@ class TopStepService:
                 "order_type": order_data['order_type']
             }
             
+            if order_data.get('account_id'):
+                topstep_order['account_id'] = order_data['account_id']
+            
             if order_data.get('price'):
                 topstep_order['price'] = order_data['price']
             
@@ -270,7 +225,8 @@ class TopStepService:
                 topstep_order['stop_price'] = order_data['stop_price']
             
             try:
-                response = requests.post(
+                response = broker_request(
+                    'topstep', 'orders', 'POST',
                     f"{self.base_url}/orders",
                     headers=headers,
                     json=topstep_order,
@@ -314,6 +270,7 @@ class TopStepService:
                 'error': f"Order placement error: {str(e)}"
             }
     
+    @broker_call(ORDER)
     def modify_order(self, credentials, order_id, modifications):
         """Modify an existing order"""
         try:
@@ -336,7 +293,8 @@ class TopStepService:
                 modify_data['stop_price'] = modifications['stop_price']
             
             try:
-                response = requests.put(
+                response = broker_request(
+                    'topstep', 'orders/:id', 'PUT',
                     f"{self.base_url}/orders/{order_id}",
                     headers=headers,
                     json=modify_data,
@@ -376,6 +334,7 @@ class TopStepService:
                 'error': f"Order modification error: {str(e)}"
             }
     
+    @broker_call(CANCEL)
     def cancel_order(self, credentials, order_id):
         """Cancel an existing order"""
         try:
@@ -387,7 +346,8 @@ class TopStepService:
             }
             
             try:
-                response = requests.delete(
+                response = broker_request(
+                    'topstep', 'orders/:id', 'DELETE',
                     f"{self.base_url}/orders/{order_id}",
                     headers=headers,
                     timeout=30
@@ -0,0 +1,221 @@
+import csv
+import gzip
+import heapq
+import io
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from src.models.events import mark_changed
+from src.models.user import db, Order, Trade
+
+CLOSED_STATUSES = ('filled', 'cancelled', 'rejected', 'expired')
+DEFAULT_HORIZON_DAYS = 90
+BATCH_SIZE = 1000
+
+# Archived record layouts: the API fields plus what is needed to scope and join them
+ORDER_FIELDS = ('id', 'broker_account_id', 'broker_order_id', 'symbol', 'side', 'order_type', 'quantity',
+                'price', 'stop_price', 'status', 'filled_quantity', 'filled_price', 'created_at', 'updated_at')
+TRADE_FIELDS = ('id', 'broker_account_id', 'order_id', 'symbol', 'side', 'quantity', 'price', 'commission',
+                'executed_at', 'created_at')
+
+KINDS = {
+    'orders': (Order, ORDER_FIELDS, 'created_at'),
+    'trades': (Trade, TRADE_FIELDS, 'executed_at'),
+}
+
+
+def _month(value):
+    return value.strftime('%Y-%m')
+
+
+def _months(start, end):
+    """``YYYY-MM`` partition names covering ``start``..``end`` inclusive"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f'{year:04d}-{month:02d}'
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _encode(row, fields):
+    record = {}
+    for field in fields:
+        value = getattr(row, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, (int, str)):
+            value = float(value)
+        record[field] = value
+    return record
+
+
+def _public(kind, record):
+    """Strip the join columns so archived records look like ``to_dict()`` output"""
+    record = dict(record)
+    if kind == 'trades':
+        record.pop('order_id', None)
+    record.pop('broker_account_id', None)
+    return record
+
+
+def iter_csv(records, chunk_size=64 * 1024):
+    """Render ``history()`` records as CSV text in chunks of about ``chunk_size``"""
+    buffer = io.StringIO()
+    writer = None
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(record))
+            writer.writeheader()
+        writer.writerow(record)
+        if buffer.tell() > chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class TradeArchive:
+    """Closed orders and their trades, moved out of the hot tables by month.
+
+    Records older than the horizon are appended to
+    ``<root>/<kind>/<YYYY-MM>.jsonl.gz`` (one gzip member per archive run,
+    partitioned by ``created_at`` for orders and ``executed_at`` for trades)
+    and then deleted from the database. Files are written and synced before
+    the delete commits, so a crash in between leaves duplicates that reads
+    drop by id rather than lost rows.
+    """
+
+    def __init__(self, root=None, horizon_days=None):
+        self.root = root or os.environ.get(
+            'TRADE_ARCHIVE_DIR',
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'archive')
+        )
+        self.horizon_days = horizon_days if horizon_days is not None else int(
+            os.environ.get('ARCHIVE_HORIZON_DAYS', DEFAULT_HORIZON_DAYS))
+        self._lock = threading.Lock()
+
+    def _path(self, kind, month):
+        return os.path.join(self.root, kind, f'{month}.jsonl.gz')
+
+    def partitions(self, kind):
+        """Archived months for a kind, oldest first"""
+        directory = os.path.join(self.root, kind)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.jsonl.gz')] for name in os.listdir(directory) if name.endswith('.jsonl.gz'))
+
+    # Archiving
+
+    def archive(self, now=None, batch_size=BATCH_SIZE):
+        """Move closed orders (and all of their trades) older than the horizon.
+
+        An order qualifies once its status is final and it was last updated
+        before the cutoff. Returns ``{'orders': n, 'trades': n}``.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.horizon_days)
+        moved = {'orders': 0, 'trades': 0}
+        with self._lock:
+            while True:
+                orders = Order.query.filter(
+                    Order.status.in_(CLOSED_STATUSES),
+                    db.func.coalesce(Order.updated_at, Order.created_at) < cutoff
+                ).order_by(Order.id).limit(batch_size).all()
+                if not orders:
+                    break
+                order_ids = [order.id for order in orders]
+                trades = Trade.query.filter(Trade.order_id.in_(order_ids)).order_by(Trade.id).all()
+
+                self._write('orders', orders)
+                self._write('trades', trades)
+
+                account_ids = {order.broker_account_id for order in orders}
+                # Trades first: they reference the orders being removed
+                Trade.query.filter(Trade.order_id.in_(order_ids)).delete(synchronize_session=False)
+                Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+                mark_changed(db.session, Order.__tablename__, account_ids, op='delete')
+                if trades:
+                    mark_changed(db.session, Trade.__tablename__, account_ids, op='delete')
+                db.session.commit()
+
+                moved['orders'] += len(orders)
+                moved['trades'] += len(trades)
+                if len(orders) < batch_size:
+                    break
+        return moved
+
+    def _write(self, kind, rows):
+        _, fields, time_field = KINDS[kind]
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(_month(getattr(row, time_field)), []).append(_encode(row, fields))
+        os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        for month, records in by_month.items():
+            payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+            # Appending a new gzip member keeps earlier runs intact and readable as one stream
+            with open(self._path(kind, month), 'ab') as handle:
+                handle.write(gzip.compress(payload.encode(), compresslevel=6))
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    # Reading
+
+    def read(self, kind, account_ids, start=None, end=None):
+        """Archived records for the accounts, filtered to ``start <= time < end``.
+
+        Only the monthly partitions overlapping the range are opened.
+        """
+        _, _, time_field = KINDS[kind]
+        months = self.partitions(kind)
+        if start is not None or end is not None:
+            wanted = set(_months(start or datetime(1970, 1, 1), end or datetime.utcnow()))
+            months = [month for month in months if month in wanted]
+        account_ids = set(account_ids)
+        start_key = start.isoformat() if start else None
+        end_key = end.isoformat() if end else None
+        for month in months:
+            with gzip.open(self._path(kind, month), 'rt') as handle:
+                for line in handle:
+                    record = json.loads(line)
+                    if record['broker_account_id'] not in account_ids:
+                        continue
+                    stamp = record[time_field] or ''
+                    if start_key and stamp < start_key or end_key and stamp >= end_key:
+                        continue
+                    yield record
+
+    def history(self, kind, account_ids, start=None, end=None):
+        """Hot and archived records for the accounts, newest first, as ``to_dict()`` payloads"""
+        model, fields, time_field = KINDS[kind]
+        column = getattr(model, time_field)
+        query = model.query.filter(model.broker_account_id.in_(account_ids))
+        if start is not None:
+            query = query.filter(column >= start)
+        if end is not None:
+            query = query.filter(column < end)
+        hot = [_encode(row, fields) for row in query.order_by(column.desc(), model.id.desc()).all()]
+
+        seen = {record['id'] for record in hot}
+        archived = []
+        for record in self.read(kind, account_ids, start, end):
+            # Rows archived by a run that crashed before its delete committed
+            if record['id'] not in seen:
+                seen.add(record['id'])
+                archived.append(record)
+        archived.sort(key=lambda record: (record[time_field] or '', record['id']), reverse=True)
+
+        def key(record):
+            return record[time_field] or '', record['id']
+
+        merged = heapq.merge(hot, archived, key=key, reverse=True)
+        return [_public(kind, record) for record in merged]
+
+
+_archive = None
+
+
+def get_trade_archive():
+    global _archive
+    if _archive is None:
+        _archive = TradeArchive()
+    return _archive
@@ -1,13 +1,17 @@
+import os
 import requests
 import json
 from datetime import datetime, timedelta
 from src.models.user import db, Position, Order, Trade
+from src.services.account_sync import sync_accounts
+from src.services.broker_http import broker_request, parallel
+from src.services.rate_limiter import broker_call, ORDER, CANCEL, SYNC, CONNECTION_TEST
 
 class TradovateService:
     def __init__(self):
-        self.demo_base_url = "https://demo.tradovateapi.com/v1"
-        self.live_base_url = "https://live.tradovateapi.com/v1"
-        self.md_base_url = "https://md.tradovateapi.com/v1"
+        self.demo_base_url = os.environ.get('TRADOVATE_DEMO_URL', "https://demo.tradovateapi.com/v1")
+        self.live_base_url = os.environ.get('TRADOVATE_LIVE_URL', "https://live.tradovateapi.com/v1")
+        self.md_base_url = os.environ.get('TRADOVATE_MD_URL', "https://md.tradovateapi.com/v1")
         
     def get_access_token(self, credentials, is_live=False):
         """Get access token from Tradovate API"""
@@ -24,7 +28,8 @@ class TradovateService:
                 "deviceId": credentials.get('device_id', 'trading-platform-device')
             }
             
-            response = requests.post(
+            response = broker_request(
+                'tradovate', 'auth/accesstokenrequest', 'POST',
                 f"{base_url}/auth/accesstokenrequest",
                 headers={
                     'Content-Type': 'application/json',
@@ -56,6 +61,7 @@ class TradovateService:
                 'error': f"Connection error: {str(e)}"
             }
     
+    @broker_call(CONNECTION_TEST)
     def test_connection(self, credentials):
         """Test connection to Tradovate API"""
         try:
@@ -73,40 +79,34 @@ class TradovateService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
-                f"{self.demo_base_url}/user/me",
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                user_data = response.json()
-                
-                # Get account information
-                accounts_response = requests.get(
+            # The account list does not depend on the user call; fetch both at once
+            response, accounts_response = parallel(
+                lambda: broker_request(
+                    'tradovate', 'user/me', 'GET',
+                    f"{self.demo_base_url}/user/me",
+                    headers=headers,
+                    timeout=30
+                ),
+                lambda: broker_request(
+                    'tradovate', 'account/list', 'GET',
                     f"{self.demo_base_url}/account/list",
                     headers=headers,
                     timeout=30
                 )
+            )
+            
+            if response.status_code == 200:
+                user_data = response.json()
                 
-                account_info = {}
+                accounts = []
                 if accounts_response.status_code == 200:
-                    accounts = accounts_response.json()
-                    if accounts:
-                        account = accounts[0]  # Use first account
-                        account_info = {
-                            'account_id': str(account.get('id', '')),
-                            'account_name': account.get('name', ''),
-                            'balance': account.get('cashBalance', 0),
-                            'equity': account.get('netLiquidationValue', 0),
-                            'margin_used': account.get('marginUsed', 0),
-                            'margin_available': account.get('marginAvailable', 0)
-                        }
+                    accounts = [self._account_info(account) for account in accounts_response.json()]
                 
                 return {
                     'success': True,
                     'message': 'Connection successful',
-                    'account_info': account_info
+                    'account_info': accounts[0] if accounts else {},
+                    'accounts': accounts
                 }
             else:
                 return {
@@ -120,8 +120,96 @@ class TradovateService:
                 'error': f"Connection test failed: {str(e)}"
             }
     
+    @broker_call(SYNC)
+    def get_contract_specs(self, credentials, symbols):
+        """Get tick size, point value and expiry for contracts"""
+        try:
+            # Get access token
+            auth_result = self.get_access_token(credentials)
+            
+            if not auth_result['success']:
+                return auth_result
+            
+            access_token = auth_result['access_token']
+            headers = {
+                'Authorization': f"Bearer {access_token}",
+                'Content-Type': 'application/json'
+            }
+            
+            contracts = []
+            products = {}
+            for symbol in symbols:
+                contract_response = broker_request(
+                    'tradovate', 'contract/find', 'GET',
+                    f"{self.demo_base_url}/contract/find",
+                    headers=headers,
+                    params={'name': symbol},
+                    timeout=30
+                )
+                if contract_response.status_code != 200 or not contract_response.json():
+                    continue
+                contract = contract_response.json()
+                
+                maturity_response = broker_request(
+                    'tradovate', 'contractMaturity/item', 'GET',
+                    f"{self.demo_base_url}/contractMaturity/item",
+                    headers=headers,
+                    params={'id': contract.get('contractMaturityId')},
+                    timeout=30
+                )
+                if maturity_response.status_code != 200:
+                    continue
+                maturity = maturity_response.json()
+                
+                # Products are shared by every maturity of a root symbol
+                product_id = maturity.get('productId')
+                if product_id not in products:
+                    product_response = broker_request(
+                        'tradovate', 'product/item', 'GET',
+                        f"{self.demo_base_url}/product/item",
+                        headers=headers,
+                        params={'id': product_id},
+                        timeout=30
+                    )
+                    if product_response.status_code != 200:
+                        continue
+                    products[product_id] = product_response.json()
+                product = products[product_id]
+                
+                contracts.append({
+                    'symbol': contract.get('name', symbol),
+                    'root': product.get('name'),
+                    'tick_size': product.get('tickSize'),
+                    'point_value': product.get('valuePerPoint'),
+                    'expiry': maturity.get('expirationDate'),
+                    'exchange': product.get('exchangeId')
+                })
+            
+            return {
+                'success': True,
+                'contracts': contracts
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Contract lookup failed: {str(e)}"
+            }
+    
+    @staticmethod
+    def _account_info(account):
+        return {
+            'account_id': str(account.get('id', '')),
+            'account_name': account.get('name', ''),
+            'balance': account.get('cashBalance', 0),
+            'equity': account.get('netLiquidationValue', 0),
+            'margin_used': account.get('marginUsed', 0),
+            'margin_available': account.get('marginAvailable', 0)
+        }
+    
+    @broker_call(SYNC)
     def sync_account_data(self, credentials, broker_account):
-        """Sync account data from Tradovate"""
+        """Sync every account behind these credentials from Tradovate"""
         try:
             # Get access token
             auth_result = self.get_access_token(credentials)
@@ -136,7 +224,8 @@ class TradovateService:
             }
             
             # Get account information
-            accounts_response = requests.get(
+            accounts_response = broker_request(
+                'tradovate', 'account/list', 'GET',
                 f"{self.demo_base_url}/account/list",
                 headers=headers,
                 timeout=30
@@ -155,75 +244,40 @@ class TradovateService:
                     'error': "No accounts found"
                 }
             
-            account = accounts[0]  # Use first account
-            
-            # Update broker account with latest data
-            broker_account.balance = account.get('cashBalance', 0)
-            broker_account.equity = account.get('netLiquidationValue', 0)
-            broker_account.margin_used = account.get('marginUsed', 0)
-            broker_account.margin_available = account.get('marginAvailable', 0)
-            
-            # Get positions
-            positions_response = requests.get(
+            # Fetch everything before touching the database so the write
+            # transaction is not held open while calls wait for rate limits.
+            # The list calls cover every account of the user at once.
+            positions_response = broker_request(
+                'tradovate', 'position/list', 'GET',
                 f"{self.demo_base_url}/position/list",
                 headers=headers,
                 timeout=30
             )
             
-            positions_data = []
-            if positions_response.status_code == 200:
-                positions = positions_response.json()
-                
-                # Update positions in database
-                for pos_data in positions:
-                    if pos_data.get('netPos', 0) != 0:  # Only active positions
-                        # Check if position already exists
-                        existing_position = Position.query.filter_by(
-                            broker_account_id=broker_account.id,
-                            symbol=pos_data.get('contractName', '')
-                        ).first()
-                        
-                        if existing_position:
-                            # Update existing position
-                            existing_position.quantity = abs(pos_data.get('netPos', 0))
-                            existing_position.side = 'long' if pos_data.get('netPos', 0) > 0 else 'short'
-                            existing_position.current_price = pos_data.get('price', 0)
-                            existing_position.unrealized_pnl = pos_data.get('unrealizedPnL', 0)
-                            existing_position.updated_at = datetime.utcnow()
-                        else:
-                            # Create new position
-                            new_position = Position(
-                                broker_account_id=broker_account.id,
-                                symbol=pos_data.get('contractName', ''),
-                                side='long' if pos_data.get('netPos', 0) > 0 else 'short',
-                                quantity=abs(pos_data.get('netPos', 0)),
-                                entry_price=pos_data.get('price', 0),
-                                current_price=pos_data.get('price', 0),
-                                unrealized_pnl=pos_data.get('unrealizedPnL', 0),
-                                opened_at=datetime.utcnow()
-                            )
-                            db.session.add(new_position)
-                        
-                        positions_data.append({
-                            'symbol': pos_data.get('contractName', ''),
-                            'side': 'long' if pos_data.get('netPos', 0) > 0 else 'short',
-                            'quantity': abs(pos_data.get('netPos', 0)),
-                            'unrealized_pnl': pos_data.get('unrealizedPnL', 0)
-                        })
-            
-            # Get orders
-            orders_response = requests.get(
+            orders_response = broker_request(
+                'tradovate', 'order/list', 'GET',
                 f"{self.demo_base_url}/order/list",
                 headers=headers,
                 timeout=30
             )
             
-            orders_data = []
+            positions = []
+            if positions_response.status_code == 200:
+                for pos_data in positions_response.json():
+                    positions.append({
+                        'account_id': str(pos_data['accountId']) if pos_data.get('accountId') is not None else None,
+                        'symbol': pos_data.get('contractName', ''),
+                        'net_quantity': pos_data.get('netPos', 0),
+                        'entry_price': pos_data.get('price', 0),
+                        'current_price': pos_data.get('price', 0),
+                        'unrealized_pnl': pos_data.get('unrealizedPnL', 0)
+                    })
+            
+            orders = []
             if orders_response.status_code == 200:
-                orders = orders_response.json()
-                
-                for order_data in orders:
-                    orders_data.append({
+                for order_data in orders_response.json():
+                    orders.append({
+                        'account_id': str(order_data['accountId']) if order_data.get('accountId') is not None else None,
                         'id': order_data.get('id'),
                         'symbol': order_data.get('contractName', ''),
                         'side': order_data.get('action', '').lower(),
@@ -232,20 +286,13 @@ class TradovateService:
                         'status': order_data.get('orderStatus', '').lower()
                     })
             
-            db.session.commit()
+            data = sync_accounts(
+                broker_account, credentials, [self._account_info(account) for account in accounts], positions, orders
+            )
             
             return {
                 'success': True,
-                'data': {
-                    'account': {
-                        'balance': broker_account.balance,
-                        'equity': broker_account.equity,
-                        'margin_used': broker_account.margin_used,
-                        'margin_available': broker_account.margin_available
-                    },
-                    'positions': positions_data,
-                    'orders': orders_data
-                }
+                'data': data
             }
             
         except Exception as e:
@@ -255,6 +302,7 @@ class TradovateService:
                 'error': f"Sync failed: {str(e)}"
             }
     
+    @broker_call(ORDER)
     def place_order(self, credentials, order_data):
         """Place an order through Tradovate API"""
         try:
@@ -272,20 +320,24 @@ class TradovateService:
             
             # Convert order data to Tradovate format
             tradovate_order = {
-                "accountSpec": credentials.get('account_id', ''),
+                "accountSpec": order_data.get('account_name') or credentials.get('account_id', ''),
                 "contractName": order_data['symbol'],
                 "action": order_data['side'].upper(),
                 "orderQty": order_data['quantity'],
                 "orderType": order_data['order_type'].upper()
             }
             
+            if str(order_data.get('account_id', '')).isdigit():
+                tradovate_order['accountId'] = int(order_data['account_id'])
+            
             if order_data.get('price'):
                 tradovate_order['price'] = order_data['price']
             
             if order_data.get('stop_price'):
                 tradovate_order['stopPrice'] = order_data['stop_price']
             
-            response = requests.post(
+            response = broker_request(
+                'tradovate', 'order/placeorder', 'POST',
                 f"{self.demo_base_url}/order/placeorder",
                 headers=headers,
                 json=tradovate_order,
@@ -311,6 +363,7 @@ class TradovateService:
                 'error': f"Order placement error: {str(e)}"
             }
     
+    @broker_call(ORDER)
     def modify_order(self, credentials, order_id, modifications):
         """Modify an existing order"""
         try:
@@ -339,7 +392,8 @@ class TradovateService:
             if modifications.get('stop_price'):
                 modify_data['stopPrice'] = modifications['stop_price']
             
-            response = requests.post(
+            response = broker_request(
+                'tradovate', 'order/modifyorder', 'POST',
                 f"{self.demo_base_url}/order/modifyorder",
                 headers=headers,
                 json=modify_data,
@@ -363,6 +417,7 @@ class TradovateService:
                 'error': f"Order modification error: {str(e)}"
             }
     
+    @broker_call(CANCEL)
     def cancel_order(self, credentials, order_id):
         """Cancel an existing order"""
         try:
@@ -382,7 +437,8 @@ class TradovateService:
                 "orderId": order_id
             }
             
-            response = requests.post(
+            response = broker_request(
+                'tradovate', 'order/cancelorder', 'POST',
                 f"{self.demo_base_url}/order/cancelorder",
                 headers=headers,
                 json=cancel_data,
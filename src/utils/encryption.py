@@ -1,18 +1,21 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 import base64
 import os
 
 # Generate a key for encryption (in production, this should be stored securely)
 ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY', 'your-encryption-key-here-change-in-production')
+# The key being rotated away from; data under it still decrypts until re-encrypted
+PREVIOUS_ENCRYPTION_KEY = os.environ.get('PREVIOUS_ENCRYPTION_KEY')
 
-def get_fernet_key():
+def get_fernet_key(secret=None):
     """Get or generate a Fernet encryption key"""
     # In production, this should be stored in environment variables or a secure key management system
-    if len(ENCRYPTION_KEY) < 32:
+    secret = secret or ENCRYPTION_KEY
+    if len(secret) < 32:
         # Pad the key to 32 bytes for Fernet
-        padded_key = ENCRYPTION_KEY.ljust(32, '0')[:32]
+        padded_key = secret.ljust(32, '0')[:32]
     else:
-        padded_key = ENCRYPTION_KEY[:32]
+        padded_key = secret[:32]
     
     # Encode to base64 for Fernet
     key = base64.urlsafe_b64encode(padded_key.encode())
@@ -36,12 +39,27 @@ def decrypt_data(encrypted_data):
         if isinstance(encrypted_data, str):
             encrypted_data = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
         
-        fernet = get_fernet_key()
+        fernet = _decrypting_fernet()
         decrypted_data = fernet.decrypt(encrypted_data)
         return decrypted_data.decode('utf-8')
     except Exception as e:
         raise Exception(f"Decryption failed: {str(e)}")
 
+def _decrypting_fernet():
+    """The current key, then the previous one during a rotation"""
+    keys = [get_fernet_key()]
+    if PREVIOUS_ENCRYPTION_KEY:
+        keys.append(get_fernet_key(PREVIOUS_ENCRYPTION_KEY))
+    return MultiFernet(keys)
+
+def reencrypt_data(encrypted_data):
+    """Re-encrypt data under the current key (for key rotation)"""
+    try:
+        token = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
+        return base64.urlsafe_b64encode(_decrypting_fernet().rotate(token)).decode('utf-8')
+    except Exception as e:
+        raise Exception(f"Re-encryption failed: {str(e)}")
+
 def generate_new_key():
     """Generate a new encryption key (for key rotation)"""
     return Fernet.generate_key().decode('utf-8')
@@ -0,0 +1,379 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds; covers fast DB reads up to broker timeouts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs)
+    return '{' + body + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def merge(self, key, value, process):
+        self._values[key] = self._values.get(key, 0) + value
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+class Gauge(Counter):
+    """A value that can go up and down.
+
+    ``per_process=False`` marks gauges every process computes alike at
+    scrape time (from the database); they are not aggregated across workers.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), per_process=True):
+        super().__init__(name, documentation, labelnames)
+        self.per_process = per_process
+
+    def merge(self, key, value, process):
+        # A process's gauge is not additive with another's; label it instead
+        self._values[key + (process,)] = value
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then count and sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0, 0.0]
+            series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def items(self):
+        with self._lock:
+            return [(key, list(series)) for key, series in self._series.items()]
+
+    def merge(self, key, series, process):
+        merged = self._series.get(key)
+        if merged is None:
+            self._series[key] = list(series)
+        else:
+            self._series[key] = [total + value for total, value in zip(merged, series)]
+
+    def snapshot(self, **labels):
+        """``(count, sum)`` for one label set"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return (series[-2], series[-1]) if series else (0, 0.0)
+
+    def collect(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', str(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_count{labels} {series[-2]}')
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), per_process=True):
+        return self._register(Gauge(name, documentation, labelnames, per_process))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Register a callable run at scrape time to refresh gauges"""
+        self._collectors.append(collector)
+
+    def render(self, snapshots=None):
+        """Render every metric in the Prometheus text exposition format.
+
+        With ``snapshots`` (``{process: snapshot}``, see ``snapshot``) the
+        values of every process are rendered instead of this one's:
+        counters and histograms summed, gauges labelled with their process.
+        """
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            if snapshots is not None and getattr(metric, 'per_process', True):
+                metric = _merged(metric, snapshots)
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """This process's values, as JSON-serialisable data for ``render``"""
+        return {
+            metric.name: {'kind': metric.kind, 'items': [[list(key), value] for key, value in metric.items()]}
+            for metric in list(self._metrics.values()) if getattr(metric, 'per_process', True)
+        }
+
+
+def _merged(metric, snapshots):
+    if metric.kind == 'histogram':
+        merged = Histogram(metric.name, metric.documentation, metric.labelnames, metric.buckets)
+    elif metric.kind == 'gauge':
+        merged = Gauge(metric.name, metric.documentation, metric.labelnames + ('process',))
+    else:
+        merged = Counter(metric.name, metric.documentation, metric.labelnames)
+    for process, snapshot in snapshots.items():
+        for key, value in snapshot.get(metric.name, {}).get('items', []):
+            merged.merge(tuple(key), value, process)
+    return merged
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('method', 'endpoint', 'status'))
+request_db_queries = registry.histogram(
+    'http_request_db_queries', 'Database queries issued per request', ('endpoint',), COUNT_BUCKETS)
+request_db_time = registry.histogram(
+    'http_request_db_seconds', 'Time spent in database queries per request', ('endpoint',))
+broker_latency = registry.histogram(
+    'broker_request_duration_seconds', 'Broker API call latency', ('broker', 'method', 'endpoint', 'status'))
+broker_errors = registry.counter(
+    'broker_request_errors_total', 'Broker API calls that raised before a response',
+    ('broker', 'method', 'endpoint', 'error'))
+sync_lag = registry.gauge(
+    'broker_account_sync_lag_seconds', 'Seconds since each broker account last synced', ('account_id', 'broker'),
+    per_process=False)
+app_startup = registry.gauge(
+    'app_startup_seconds', 'Seconds from importing src.main to a configured app')
+
+
+def observe_broker_call(broker, method, endpoint, started, status=None, error=None):
+    """Record one broker API call; ``status`` is the HTTP status when a response arrived"""
+    elapsed = time.perf_counter() - started
+    if error is not None:
+        broker_errors.inc(broker=broker, method=method, endpoint=endpoint, error=type(error).__name__)
+        status = 'error'
+    broker_latency.observe(elapsed, broker=broker, method=method, endpoint=endpoint, status=status)
+
+
+# Per-request DB accounting
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'metrics_started' in g:
+        g.db_queries += 1
+        g.db_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    connection = context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+# Multi-process aggregation
+
+# Each gunicorn worker has its own registry. With METRICS_DIR set, workers
+# write snapshots there and a scrape of any worker renders all of them.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_WRITE_SECONDS = float(os.environ.get('METRICS_WRITE_SECONDS', '5'))
+# Counters and histograms of exited workers, so totals never go backwards
+ARCHIVE = 'archive'
+
+
+def _snapshot_path(directory, process):
+    return os.path.join(directory, f'{process}.json')
+
+
+def _write_json(path, data):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None  # removed or being replaced
+
+
+def write_snapshot(directory=None):
+    """Write this process's values for other workers' scrapes"""
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    _write_json(_snapshot_path(directory, os.getpid()), registry.snapshot())
+
+
+def read_snapshots(directory=None):
+    """``{process: snapshot}`` of every worker, live or archived"""
+    directory = directory or METRICS_DIR
+    snapshots = {}
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            snapshot = _read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                snapshots[name[:-len('.json')]] = snapshot
+    return snapshots
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold an exited worker's counters and histograms into the archive; drop its gauges.
+
+    Called from the gunicorn master, the only writer of the archive.
+    """
+    directory = directory or METRICS_DIR
+    path = _snapshot_path(directory, pid)
+    snapshot = _read_json(path)
+    if snapshot is not None:
+        archive_path = _snapshot_path(directory, ARCHIVE)
+        archive = _read_json(archive_path) or {}
+        for name, data in snapshot.items():
+            if data['kind'] == 'gauge':
+                continue
+            merged = Histogram(name, '') if data['kind'] == 'histogram' else Counter(name, '')
+            for key, value in archive.get(name, {}).get('items', []) + data['items']:
+                merged.merge(tuple(key), value, ARCHIVE)
+            archive[name] = {'kind': data['kind'], 'items': [[list(key), value] for key, value in merged.items()]}
+        _write_json(archive_path, archive)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clear_snapshots(directory=None):
+    """Start a server's aggregation from zero, as a single process would"""
+    directory = directory or METRICS_DIR
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
+
+
+def render_metrics():
+    """The scrape body: every worker's metrics with METRICS_DIR, else this process's"""
+    if METRICS_DIR is None:
+        return registry.render()
+    write_snapshot()
+    return registry.render(read_snapshots())
+
+
+def _write_snapshots():
+    while True:
+        time.sleep(METRICS_WRITE_SECONDS)
+        try:
+            write_snapshot()
+        except OSError:
+            pass  # retried next interval
+
+
+def init_metrics(app):
+    """Install request timing hooks on the Flask app"""
+    if METRICS_DIR is not None:
+        threading.Thread(target=_write_snapshots, name='metrics-snapshot', daemon=True).start()
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        request_latency.observe(time.perf_counter() - started, method=request.method,
+                                endpoint=endpoint, status=response.status_code)
+        request_db_queries.observe(g.db_queries, endpoint=endpoint)
+        request_db_time.observe(g.db_seconds, endpoint=endpoint)
+        return response
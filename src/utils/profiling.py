@@ -0,0 +1,223 @@
+import gzip
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import Blueprint, g, request, jsonify, send_file, abort, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer.
+
+    Stacks are stored in collapsed form (``outer;inner;leaf -> count``) which
+    flame graph tools read directly. Frames are looked up per OS thread, so
+    this only works with real threads: under gevent's monkeypatching every
+    greenlet shares one OS thread and ``threads_patched`` turns it off.
+    """
+
+    def __init__(self, thread_id, interval=0.005, max_depth=64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                code = frame.f_code
+                frames.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            key = ';'.join(reversed(frames))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+def threads_patched():
+    """Whether gevent has monkeypatched threading in this process"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _token_matches(header):
+    return _token is not None and header is not None and hmac.compare_digest(header, _token)
+
+
+class ProfileStore:
+    """Rotating directory of gzipped JSON profiles, oldest removed first"""
+
+    def __init__(self, directory, max_profiles=200):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile['id']}.json.gz")
+        with gzip.open(path, 'wt') as handle:
+            json.dump(profile, handle)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        with self._lock:
+            files = self._files()
+            for name in files[:max(0, len(files) - self.max_profiles)]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # Profile ids start with a sortable timestamp
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json.gz'))
+
+    def list(self):
+        return [name[:-len('.json.gz')] for name in reversed(self._files())]
+
+    def path(self, profile_id):
+        name = os.path.basename(profile_id) + '.json.gz'
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+profiles_bp = Blueprint('profiles', __name__)
+_store = None
+_token = None
+
+
+@profiles_bp.before_request
+def _check_token():
+    if not _token_matches(request.headers.get('X-Profile')):
+        abort(403)
+
+
+@profiles_bp.route('', methods=['GET'])
+def list_profiles():
+    """List stored request profiles, newest first"""
+    return jsonify({'profiles': _store.list()}), 200
+
+
+@profiles_bp.route('/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a stored request profile"""
+    path = _store.path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/gzip', as_attachment=True,
+                     download_name=f'{profile_id}.json.gz')
+
+
+def init_profiling(app):
+    """Install opt-in request profiling.
+
+    Nothing is registered unless ``PROFILING_ENABLED=1``, so a disabled
+    profiler costs nothing per request. When enabled, a request is profiled
+    if it wins a ``PROFILE_SAMPLE_RATE`` draw or sends an ``X-Profile``
+    header matching ``PROFILE_TOKEN``. Without a token the header is
+    ignored and ``/api/profiles`` refuses every request. Under gevent,
+    profiles carry SQL timings but no stack samples.
+    """
+    global _store, _token
+    if os.environ.get('PROFILING_ENABLED') != '1':
+        return False
+
+    sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    _token = os.environ.get('PROFILE_TOKEN') or None
+    interval = float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000.0
+    _store = ProfileStore(
+        os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'profiles')),
+        int(os.environ.get('PROFILE_MAX_FILES', '200'))
+    )
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _profile_query_start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _profile_query_end(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profile_started'].pop()
+        profile = g.get('profile') if has_request_context() else None
+        if profile is not None:
+            profile['sql'].append({
+                'statement': statement,
+                'executemany': executemany,
+                'offset_ms': (started - profile['started']) * 1000,
+                'duration_ms': (time.perf_counter() - started) * 1000
+            })
+
+    @event.listens_for(Engine, 'handle_error')
+    def _profile_query_error(context):
+        connection = context.connection
+        if connection is not None and connection.info.get('profile_started'):
+            connection.info['profile_started'].pop()
+
+    sample_stacks = not threads_patched()
+
+    @app.before_request
+    def _start_profile():
+        requested = _token_matches(request.headers.get('X-Profile'))
+        if not requested and not (sample_rate and random.random() < sample_rate):
+            return
+        sampler = StackSampler(threading.get_ident(), interval) if sample_stacks else None
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        g.profile = {'id': profile_id, 'started': time.perf_counter(), 'sampler': sampler, 'sql': []}
+        if sampler is not None:
+            sampler.start()
+
+    @app.after_request
+    def _tag_profile(response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+            response.headers['X-Profile-Id'] = profile['id']
+        return response
+
+    # Teardown runs even when the view raised, so the sampler always stops
+    @app.teardown_request
+    def _finish_profile(error=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        sampler = profile['sampler']
+        if sampler is not None:
+            sampler.stop()
+        _store.save({
+            'id': profile['id'],
+            'method': request.method,
+            'path': request.full_path,
+            'endpoint': request.endpoint,
+            'status': profile.get('status', 500),
+            'error': repr(error) if error is not None else None,
+            'duration_ms': (time.perf_counter() - profile['started']) * 1000,
+            'sample_interval_ms': interval * 1000,
+            'samples': sampler.samples if sampler is not None else 0,
+            'stacks': sampler.stacks if sampler is not None else {},
+            'sql': profile['sql']
+        })
+
+    app.register_blueprint(profiles_bp, url_prefix='/api/profiles')
+    return True
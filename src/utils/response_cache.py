@@ -0,0 +1,249 @@
+import functools
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+from src.models import events
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Columns whose updates alone do not invalidate: the position marks
+# rewritten by every mark-to-market flush, which views serving them bound
+# with ``cache_per_user(marks=True)`` instead
+UNCACHED_COLUMNS = {'positions': frozenset(('current_price', 'unrealized_pnl', 'updated_at'))}
+
+cache_requests = registry.counter(
+    'response_cache_requests_total', 'Per-user response cache lookups', ('endpoint', 'result'))
+
+
+class LocalGenerations:
+    """Per-user generation counters for a single process"""
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self._generations.get(user_id, 0)
+
+    def bump(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+class SQLiteGenerations:
+    """Per-user generation counters in a local SQLite file shared by all workers.
+
+    Only the counters are shared; response bodies stay in each process. A
+    bump in one worker therefore invalidates every worker's copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS generations (user_id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, user_id):
+        row = self._connection().execute(
+            'SELECT generation FROM generations WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, user_ids):
+        self._connection().executemany(
+            'INSERT INTO generations (user_id, generation) VALUES (?, 1) '
+            'ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1',
+            [(user_id,) for user_id in user_ids]
+        )
+
+
+def _uncached_only(change):
+    return change.columns is not None and change.columns <= UNCACHED_COLUMNS.get(change.table, frozenset())
+
+
+class CachedResponse:
+    __slots__ = ('generation', 'expires_at', 'body', 'etag')
+
+    def __init__(self, generation, body, ttl):
+        self.generation = generation
+        self.expires_at = time.monotonic() + ttl
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+
+
+class ResponseCache:
+    """LRU of serialized JSON responses keyed by user, endpoint and query.
+
+    An entry is valid while its user's generation is unchanged. Generations
+    are bumped from committed model changes, so a sync or order touching
+    one user's accounts invalidates exactly that user's responses. ``ttl``
+    bounds staleness from writes that bypass the ORM without calling
+    ``events.mark_changed``.
+
+    Mark-to-market flushes, which rewrite position marks every second, do
+    not bump generations. Responses carrying those marks are instead kept
+    for only ``mark_ttl``, so their prices lag the engine by about that
+    much while repeated polls within it still hit.
+    """
+
+    def __init__(self, generations, max_entries=10000, ttl=300.0, mark_ttl=1.0):
+        self.generations = generations
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mark_ttl = mark_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        return self.generations.get(user_id)
+
+    def get(self, user_id, key, generation):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None
+            if entry.generation != generation or time.monotonic() > entry.expires_at:
+                del self._entries[(user_id, key)]
+                return None
+            self._entries.move_to_end((user_id, key))
+            return entry
+
+    def put(self, user_id, key, generation, body, ttl=None):
+        entry = CachedResponse(generation, body, self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[(user_id, key)] = entry
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_ids):
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in user_ids]:
+                del self._entries[key]
+        self.generations.bump(user_ids)
+
+    def on_changes(self, changes):
+        try:
+            self.invalidate(change.user_id for change in changes
+                            if change.user_id is not None and not _uncached_only(change))
+        except Exception:
+            # Never fail the request whose commit already succeeded
+            logger.exception('Response cache invalidation failed')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+
+
+def _default_path():
+    """Counters are throwaway state of one database, so they live in the temp dir keyed by it"""
+    from src.models.schema import database_uri
+    digest = hashlib.sha1(database_uri().encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'response-cache-{digest}.db')
+
+
+def get_response_cache():
+    """The process-wide response cache, or None when disabled"""
+    return _cache
+
+
+def init_response_cache(app):
+    """Enable the response cache according to ``RESPONSE_CACHE``.
+
+    ``shared`` (default) keeps generation counters in a SQLite file so all
+    gunicorn workers see each other's invalidations; ``local`` keeps them in
+    memory and is only correct with a single worker; ``off`` disables it.
+    """
+    global _cache
+    mode = os.environ.get('RESPONSE_CACHE', 'shared')
+    if mode == 'off':
+        return None
+    if mode == 'local':
+        generations = LocalGenerations()
+    else:
+        generations = SQLiteGenerations(os.environ.get('RESPONSE_CACHE_PATH') or _default_path())
+    _cache = ResponseCache(
+        generations,
+        max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '10000')),
+        ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '300')),
+        mark_ttl=float(os.environ.get('RESPONSE_CACHE_MARK_TTL', '1'))
+    )
+    events.subscribe(_cache.on_changes)
+    return _cache
+
+
+def cache_per_user(view=None, marks=False):
+    """Cache a user's successful JSON responses and answer If-None-Match with 304.
+
+    The user is taken from the ``user_id`` query parameter, as the views do.
+    ``?since=`` deltas are never cached: their cursor must reflect the
+    journal at request time. Views returning position marks pass
+    ``marks=True`` so their entries expire after the cache's ``mark_ttl``.
+    """
+    if view is None:
+        return functools.partial(cache_per_user, marks=marks)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = _cache
+        if cache is None or 'since' in request.args:
+            return view(*args, **kwargs)
+
+        user_id = request.args.get('user_id', 1, type=int)
+        key = (request.endpoint, request.query_string)
+        generation = cache.generation(user_id)
+        entry = cache.get(user_id, key, generation)
+        if entry is not None:
+            result = 'hit'
+        else:
+            result = 'miss'
+            # Generation is read before building, so a concurrent change
+            # leaves this entry already stale rather than wrongly fresh
+            response = view(*args, **kwargs)
+            body, status = response if isinstance(response, tuple) else (response, 200)
+            if status != 200:
+                return response
+            entry = cache.put(user_id, key, generation, body.get_data(),
+                              ttl=cache.mark_ttl if marks else None)
+
+        if request.if_none_match.contains(entry.etag):
+            result = 'not_modified'
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        cache_requests.inc(endpoint=request.endpoint, result=result)
+        return response
+
+    return wrapper
@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always built
+    brotli = None
+
+# Vite emits content-hashed names such as assets/index-BW8AjxKc.js: an
+# 8-character base64url hash, which in practice always has a digit or
+# capital, under assets/. Plain names like site-manifest.json do not match.
+HASHED_NAME = re.compile(r'^assets/(?:.+/)?[^/]+-(?=[A-Za-z0-9_-]{0,7}[A-Z0-9])[A-Za-z0-9_-]{8}\.[a-z0-9]+$')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'application/manifest+json')
+MIN_COMPRESS_BYTES = 1024
+MAX_INDEXED_BYTES = 8 * 1024 * 1024
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+SHORT_LIVED = 'public, max-age=3600'
+
+
+class StaticAsset:
+    """One file held in memory with its precompressed variants"""
+
+    __slots__ = ('path', 'body', 'mimetype', 'etag', 'cache_control', 'variants')
+
+    def __init__(self, path, body, mimetype, cache_control):
+        self.path = path
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()[:20] if body is not None else None
+        self.cache_control = cache_control
+        # encoding -> (body, etag); each representation gets its own strong ETag
+        self.variants = {}
+
+
+def _cache_control(relative_path):
+    if relative_path == 'index.html':
+        return REVALIDATE
+    if HASHED_NAME.search(relative_path):
+        return IMMUTABLE
+    return SHORT_LIVED
+
+
+def _read(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+class StaticAssetIndex:
+    """In-memory index of a static folder, built once at startup.
+
+    Lookups never touch the filesystem. Compressible files get gzip (and
+    brotli, when the ``brotli`` package is installed) variants, preferring
+    ``.gz``/``.br`` files shipped next to the original over compressing at
+    build time. Files above ``MAX_INDEXED_BYTES`` are indexed by path only
+    and streamed from disk.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+
+    def build(self):
+        assets = {}
+        if self.root and os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith(('.gz', '.br')):
+                        continue
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    assets[relative] = self._load(path, relative)
+        self.assets = assets
+        return self
+
+    def _load(self, path, relative):
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if os.path.getsize(path) > MAX_INDEXED_BYTES:
+            asset = StaticAsset(path, None, mimetype, _cache_control(relative))
+            asset.etag = hashlib.sha1(f'{path}:{os.path.getmtime(path)}'.encode()).hexdigest()[:20]
+            return asset
+
+        body = _read(path)
+        asset = StaticAsset(path, body, mimetype, _cache_control(relative))
+        if len(body) < MIN_COMPRESS_BYTES or not mimetype.startswith(COMPRESSIBLE_TYPES):
+            return asset
+
+        compressed = {}
+        if os.path.exists(path + '.br'):
+            compressed['br'] = _read(path + '.br')
+        elif brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        if os.path.exists(path + '.gz'):
+            compressed['gzip'] = _read(path + '.gz')
+        else:
+            compressed['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+
+        for encoding, data in compressed.items():
+            # Only keep variants that actually save bytes
+            if len(data) < len(body):
+                asset.variants[encoding] = (data, f'{asset.etag}-{encoding}')
+        return asset
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def __len__(self):
+        return len(self.assets)
+
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants:
+            quality = accepted[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+    return best
+
+
+def asset_response(asset):
+    """Build the response for an indexed asset, honouring If-None-Match"""
+    if asset.body is None:
+        response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.etag, conditional=True)
+        response.headers['Cache-Control'] = asset.cache_control
+        return response
+
+    encoding = _choose_encoding(asset) if asset.variants else None
+    body, etag = asset.variants[encoding] if encoding else (asset.body, asset.etag)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_static_assets(app):
+    """Index ``app.static_folder`` and serve it, with SPA fallback to index.html"""
+    index = StaticAssetIndex(app.static_folder).build()
+    app.extensions['static_assets'] = index
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if app.static_folder is None:
+            return "Static folder not configured", 404
+
+        asset = index.get(path) if path else None
+        if asset is None:
+            asset = index.get('index.html')
+            if asset is None:
+                return "index.html not found", 404
+        return asset_response(asset)
+
+    return index
@@ -0,0 +1,286 @@
+import math
+import re
+
+from src.services.broker_registry import BROKER_SERVICES
+from src.services.contract_catalog import get_contract_catalog
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+UPPERCASE = re.compile(r'[A-Z]')
+LOWERCASE = re.compile(r'[a-z]')
+DIGIT = re.compile(r'\d')
+
+class Invalid:
+    """What a compiled field check returns instead of a value it rejects"""
+
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+
+class Field:
+    """One request value: whether it must be present, and how to clean it.
+
+    ``compile(name)`` turns the declaration into a single function that
+    returns the cleaned value or an ``Invalid``. Messages are formatted and
+    options resolved there, once, so a request only pays for the checks it
+    actually runs.
+    """
+
+    def __init__(self, required=True, default=None, message=None):
+        self.required = required
+        self.default = default
+        self.message = message
+
+    def compile(self, name):
+        return lambda value: value
+
+
+class String(Field):
+    """A string, optionally stripped, case-folded and checked against patterns.
+
+    ``checks`` is a sequence of ``(compiled pattern, message)`` pairs that
+    must each match somewhere in the value; ``pattern`` must match it whole.
+    """
+
+    def __init__(self, strip=True, lower=False, upper=False, choices=None, pattern=None, pattern_message=None,
+                 min_length=None, max_length=None, checks=(), **kwargs):
+        super().__init__(**kwargs)
+        self.strip = strip
+        self.lower = lower
+        self.upper = upper
+        self.choices = frozenset(choices) if choices is not None else None
+        self.pattern = pattern
+        self.pattern_message = pattern_message
+        self.min_length = min_length
+        self.max_length = max_length
+        self.checks = tuple(checks)
+
+    def compile(self, name):
+        strip, lower, upper = self.strip, self.lower, self.upper
+        min_length, max_length, choices = self.min_length or 0, self.max_length, self.choices
+        match = self.pattern.match if self.pattern is not None else None
+        searches = tuple((pattern.search, Invalid(message)) for pattern, message in self.checks)
+
+        not_string = Invalid(f'{name} must be a string')
+        too_short = Invalid(f'{name} must be at least {min_length} characters long')
+        too_long = Invalid(f'{name} must be at most {max_length} characters long')
+        not_a_choice = Invalid(f'{name} must be one of {", ".join(sorted(choices or ()))}')
+        bad_format = Invalid(self.pattern_message or f'Invalid {name} format')
+
+        def clean(value):
+            if not isinstance(value, str):
+                return not_string
+            if strip:
+                value = value.strip()
+            if lower:
+                value = value.lower()
+            elif upper:
+                value = value.upper()
+            if len(value) < min_length:
+                return too_short
+            if max_length is not None and len(value) > max_length:
+                return too_long
+            if choices is not None and value not in choices:
+                return not_a_choice
+            if match is not None and match(value) is None:
+                return bad_format
+            for search, failed in searches:
+                if search(value) is None:
+                    return failed
+            return value
+
+        return clean
+
+
+class Integer(Field):
+    """A whole number (JSON integer or digit string) within optional bounds"""
+
+    def __init__(self, minimum=None, maximum=None, **kwargs):
+        super().__init__(**kwargs)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self, name):
+        minimum, maximum = self.minimum, self.maximum
+        not_integer = Invalid(f'{name} must be an integer')
+        too_small = Invalid(f'{name} must be at least {minimum}')
+        too_large = Invalid(f'{name} must be at most {maximum}')
+
+        def clean(value):
+            if value.__class__ is not int:
+                # bool is an int subclass and is rejected here too
+                # isdigit alone also accepts characters such as '²' that int() rejects
+                if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+                    value = int(value)
+                else:
+                    return not_integer
+            if minimum is not None and value < minimum:
+                return too_small
+            if maximum is not None and value > maximum:
+                return too_large
+            return value
+
+        return clean
+
+
+class Number(Field):
+    """A finite number, returned as a float, that must be above ``greater_than``"""
+
+    def __init__(self, greater_than=None, **kwargs):
+        super().__init__(**kwargs)
+        self.greater_than = greater_than
+
+    def compile(self, name):
+        greater_than = self.greater_than
+        not_number = Invalid(f'{name} must be a number')
+        not_finite = Invalid(f'{name} must be a finite number')
+        too_small = Invalid(f'{name} must be greater than {greater_than:g}' if greater_than is not None else '')
+
+        def clean(value):
+            if isinstance(value, bool):
+                return not_number
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return not_number
+            if not math.isfinite(value):
+                return not_finite
+            if greater_than is not None and value <= greater_than:
+                return too_small
+            return value
+
+        return clean
+
+
+class Mapping(Field):
+    """A JSON object; check its contents with a schema rule"""
+
+    def compile(self, name):
+        not_object = Invalid(f'{name} must be an object')
+        return lambda value: value if isinstance(value, dict) else not_object
+
+
+class Schema:
+    """A declarative request schema, compiled once at import time.
+
+    ``fields`` maps names to ``Field`` instances; ``rules`` are callables
+    taking the cleaned values that return a message for combinations the
+    fields cannot check alone, or None. Unknown keys are ignored.
+    ``validate`` returns ``(values, None)`` or ``(None, message)``.
+    """
+
+    def __init__(self, fields, rules=()):
+        self._fields = tuple((name, field.compile(name), field.required, field.default,
+                              field.message or f'{name} is required')
+                             for name, field in fields.items())
+        self._rules = tuple(rules)
+
+    def validate(self, data):
+        if not isinstance(data, dict):
+            return None, 'Request body must be a JSON object'
+        values = {}
+        get = data.get
+        for name, clean, required, default, missing in self._fields:
+            value = get(name)
+            if value is None or value == '':
+                if required:
+                    return None, missing
+                values[name] = default
+                continue
+            value = clean(value)
+            if value.__class__ is Invalid:
+                return None, value.message
+            values[name] = value
+        for rule in self._rules:
+            error = rule(values)
+            if error:
+                return None, error
+        return values, None
+
+
+# Auth
+
+REGISTER_SCHEMA = Schema({
+    'email': String(lower=True, max_length=254, pattern=EMAIL_PATTERN, pattern_message='Invalid email format'),
+    'password': String(strip=False, min_length=8, max_length=128, checks=(
+        (UPPERCASE, 'Password must contain at least one uppercase letter'),
+        (LOWERCASE, 'Password must contain at least one lowercase letter'),
+        (DIGIT, 'Password must contain at least one number'),
+    )),
+    'full_name': String(max_length=255),
+})
+
+_LOGIN_REQUIRED = 'Email and password are required'
+LOGIN_SCHEMA = Schema({
+    'email': String(lower=True, max_length=254, message=_LOGIN_REQUIRED),
+    'password': String(strip=False, max_length=128, message=_LOGIN_REQUIRED),
+})
+
+
+# Broker connect
+
+# Keys each broker's API login needs, checked before the credentials are stored
+CREDENTIAL_SCHEMAS = {
+    'tradovate': Schema({
+        'username': String(),
+        'password': String(strip=False),
+        'secret': String(strip=False),
+    }),
+    'topstep': Schema({
+        'api_token': String(strip=False),
+    }),
+}
+
+
+def _check_credentials(values):
+    _, error = CREDENTIAL_SCHEMAS[values['broker_type']].validate(values['credentials'])
+    if error:
+        return f'Invalid credentials: {error}'
+    return None
+
+
+CONNECT_SCHEMA = Schema({
+    'user_id': Integer(required=False, default=1, minimum=1),
+    'broker_type': String(lower=True, choices=BROKER_SERVICES),
+    'credentials': Mapping(),
+}, rules=(_check_credentials,))
+
+
+# Orders
+
+ORDER_SIDES = ('buy', 'sell')
+ORDER_TYPES = ('market', 'limit', 'stop')
+MAX_ORDER_QUANTITY = 1000
+
+
+def _check_order_prices(values):
+    order_type = values['order_type']
+    if order_type == 'limit' and values['price'] is None:
+        return 'price is required for limit orders'
+    if order_type == 'stop' and values['stop_price'] is None:
+        return 'stop_price is required for stop orders'
+
+    # Only contracts the catalog knows are checked against their tick size;
+    # anything else (e.g. TopStep symbols) is left for the broker to judge
+    catalog = get_contract_catalog()
+    symbol = values['symbol']
+    if catalog.get(symbol) is None:
+        return None
+    for name in ('price', 'stop_price'):
+        if values[name] is not None:
+            is_valid, message = catalog.validate_price(symbol, values[name])
+            if not is_valid:
+                return message
+    return None
+
+
+ORDER_SCHEMA = Schema({
+    'broker_account_id': Integer(minimum=1),
+    'symbol': String(upper=True, max_length=50),
+    'side': String(lower=True, choices=ORDER_SIDES),
+    'quantity': Integer(minimum=1, maximum=MAX_ORDER_QUANTITY),
+    'order_type': String(lower=True, choices=ORDER_TYPES),
+    'price': Number(required=False, greater_than=0),
+    'stop_price': Number(required=False, greater_than=0),
+}, rules=(_check_order_prices,))
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its storage locations at import time; keep them out of the tree
+_scratch = tempfile.mkdtemp(prefix='app-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch, 'app.db')}")
+os.environ.setdefault('RESPONSE_CACHE_PATH', os.path.join(_scratch, 'response_cache.db'))
+os.environ.setdefault('MARKET_DATA_DIR', os.path.join(_scratch, 'market_data'))
+os.environ.setdefault('CONTRACT_SNAPSHOT_PATH', os.path.join(_scratch, 'contracts.json'))
+os.environ.setdefault('SYNC_WRITE_BUFFER', 'off')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    from src.models.schema import init_schema
+    from src.models.user import db
+    with app.app_context():
+        init_schema(engine=db.engine)
+    return app
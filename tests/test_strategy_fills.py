@@ -0,0 +1,123 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.models.user import db, User, BrokerAccount, Order, TradingStrategy
+from src.services import order_service, strategy_engine
+from src.services.account_sync import apply_sync
+from src.utils.encryption import encrypt_data
+
+CREDENTIALS = {'username': 'trader', 'password': 'secret', 'secret': 'api-secret'}
+
+
+class FakeBroker:
+    def __init__(self):
+        self.orders = []
+
+    def place_order(self, credentials, order_data):
+        self.orders.append(order_data)
+        return {'success': True, 'order_id': str(9000 + len(self.orders))}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def runtime(app, monkeypatch):
+    # Run the strategy on a thread so the test can look at its positions
+    monkeypatch.setattr(strategy_engine.StrategyWorker, '_start_executor', lambda self: ThreadPoolExecutor(
+        max_workers=1, initializer=strategy_engine._init_worker, initargs=(self.config,)))
+    broker = FakeBroker()
+    monkeypatch.setattr(order_service, 'get_broker_service', lambda broker_type: broker)
+
+    with app.app_context():
+        user = User(email='flip@example.com', full_name='Flip Test', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        account = BrokerAccount(user_id=user.id, broker_type='tradovate', broker_account_id='7001',
+                                api_credentials=encrypt_data(json.dumps(CREDENTIALS)))
+        db.session.add(account)
+        db.session.flush()
+        strategy = TradingStrategy(user_id=user.id, broker_account_id=account.id, strategy_name='flip',
+                                   is_active=True, strategy_config=json.dumps({
+                                       'type': 'sma_cross', 'symbols': ['ESZ6'],
+                                       'params': {'fast': 2, 'slow': 3, 'quantity': 1}}))
+        db.session.add(strategy)
+        db.session.commit()
+        account_id, strategy_id = account.id, strategy.id
+
+    runtime = strategy_engine.StrategyRuntime()
+    monkeypatch.setattr(strategy_engine, '_runtime', runtime)
+    runtime.start(app)
+    yield runtime, broker, account_id, strategy_id
+    runtime.stop()
+
+
+def publish_closes(runtime, closes, start=0):
+    for index, close in enumerate(closes, start):
+        runtime.publish_bar({'symbol': 'ESZ6', 'ts': index, 'open': close, 'high': close,
+                             'low': close, 'close': close, 'volume': 1})
+
+
+def committed_orders(app, account_id):
+    with app.app_context():
+        try:
+            return Order.query.filter_by(broker_account_id=account_id).count()
+        finally:
+            db.session.remove()
+
+
+def sync_fills(app, account_id, placed):
+    """Have the broker report every order placed so far as filled"""
+    # The broker sees an order before place_order commits its row
+    assert wait_for(lambda: committed_orders(app, account_id) == placed)
+    with app.app_context():
+        account = db.session.get(BrokerAccount, account_id)
+        orders = [{'account_id': '7001', 'id': order.broker_order_id, 'symbol': order.symbol,
+                   'side': order.side, 'quantity': order.quantity, 'price': 4000.0, 'status': 'filled'}
+                  for order in Order.query.filter_by(broker_account_id=account_id).all()]
+        apply_sync(account, CREDENTIALS, [{'account_id': '7001', 'account_name': 'Flip'}], [], orders)
+
+
+def test_signal_flip_goes_short(app, runtime):
+    runtime, broker, account_id, strategy_id = runtime
+
+    # Rising closes: the fast average crosses above the slow one
+    publish_closes(runtime, [100.0, 101.0, 102.0])
+    assert wait_for(lambda: len(broker.orders) == 1)
+    assert broker.orders[0]['side'] == 'buy' and broker.orders[0]['quantity'] == 1
+
+    sync_fills(app, account_id, 1)
+    assert wait_for(lambda: strategy_engine._worker_strategy.positions.get('ESZ6') == 1)
+
+    # Falling closes flip the signal: sell the long and go short
+    publish_closes(runtime, [90.0, 80.0], start=3)
+    assert wait_for(lambda: len(broker.orders) == 2)
+    assert broker.orders[1]['side'] == 'sell' and broker.orders[1]['quantity'] == 2
+
+    sync_fills(app, account_id, 2)
+    assert wait_for(lambda: strategy_engine._worker_strategy.positions.get('ESZ6') == -1)
+
+    with app.app_context():
+        orders = Order.query.filter_by(strategy_id=strategy_id).all()
+        net = sum(order.filled_quantity if order.side == 'buy' else -order.filled_quantity for order in orders)
+    assert net == -1
+    assert all(order.status == 'filled' for order in orders)
+
+    # A replaced worker process starts fresh and is replayed its fills once
+    worker = runtime.workers[strategy_id]
+    worker.restart()
+    runtime.publish_bar({'symbol': 'ESZ6', 'ts': 5, 'open': 80.0, 'high': 80.0, 'low': 80.0,
+                         'close': 80.0, 'volume': 1})
+    assert wait_for(lambda: worker.restarts == 1 and worker.pending == 0 and not runtime._restarted)
+    assert wait_for(lambda: strategy_engine._worker_strategy.positions.get('ESZ6') == -1)
+    time.sleep(0.2)
+    assert strategy_engine._worker_strategy.positions.get('ESZ6') == -1